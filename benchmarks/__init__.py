@@ -0,0 +1,10 @@
+""" Throughput benchmarks for business_rules.
+
+    python -m benchmarks.run --rules 500 --records 200 --output results.json
+    python -m benchmarks.compare baseline.json results.json
+
+synthetic generates rulesets and records of configurable size, nesting
+depth, operator mix and variable cost; run times the engine on them and
+writes the results as JSON; compare reports the differences between two
+result files.
+"""
@@ -0,0 +1,70 @@
+""" Compares two benchmark result files written by benchmarks.run.
+
+    python -m benchmarks.compare baseline.json results.json [--threshold 0.1]
+
+For every benchmark in both files, prints the ratio of the new throughput to
+the old one. Exits with status 1 if any benchmark got slower by more than
+`threshold` (10% by default), so it can gate a CI job.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+from collections import OrderedDict
+
+
+def compare(old, new, threshold=0.1):
+    """ Returns a list of dicts, one per benchmark found in both `old` and
+    `new` results, with the old and new calls per second, their ratio and
+    whether it's a regression.
+    """
+    old_results = dict((result['name'], result) for result in old['results'])
+    comparison = []
+    for result in new['results']:
+        previous = old_results.get(result['name'])
+        if previous is None:
+            continue
+        old_rate, new_rate = previous['calls_per_sec'], result['calls_per_sec']
+        ratio = new_rate / old_rate if old_rate and new_rate else None
+        comparison.append(OrderedDict([
+            ('name', result['name']),
+            ('old_calls_per_sec', old_rate),
+            ('new_calls_per_sec', new_rate),
+            ('ratio', ratio),
+            ('regression', ratio is not None and ratio < 1 - threshold),
+        ]))
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.compare',
+        description='Compares two benchmark result files.')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown reported as a regression')
+    parser.add_argument('--json', action='store_true',
+                        help='print the comparison as JSON')
+    args = parser.parse_args(argv)
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    comparison = compare(old, new, args.threshold)
+    if args.json:
+        print(json.dumps(comparison, indent=2))
+    else:
+        for row in comparison:
+            print('{0:<32} {1:>10} {2}'.format(
+                row['name'],
+                'n/a' if row['ratio'] is None
+                else '{0:.2f}x'.format(row['ratio']),
+                'REGRESSION' if row['regression'] else ''))
+    return 1 if any(row['regression'] for row in comparison) else 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
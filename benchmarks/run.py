@@ -0,0 +1,228 @@
+""" Runs the benchmarks and writes their results as JSON.
+
+    python -m benchmarks.run [--rules N] [--records N] [--depth N] ...
+
+Each benchmark is timed `repeat` times and the best time is kept. Memory is
+measured in a separate, untimed pass with tracemalloc: peak_memory_bytes is
+the peak of memory allocated during the pass, and gc_collections the number
+of young generation collections it caused, which grows with the number of
+objects allocated. Both are null where the interpreter can't measure them.
+"""
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import platform
+import time
+from collections import OrderedDict
+
+import business_rules
+from business_rules import compile_rules, export_rule_data, run_all
+from business_rules.engine import check_conditions_recursively
+
+from .synthetic import (DEFAULT_OPERATOR_MIX, SyntheticActions,
+                        make_records, make_rules, make_variables_class)
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+
+
+class Workload(object):
+    """ The rules, records and variables class shared by the benchmarks. """
+    def __init__(self, rules=100, records=100, depth=2, width=3,
+                 operator_mix=None, variable_cost=0, seed=0):
+        self.config = OrderedDict([
+            ('rules', rules), ('records', records), ('depth', depth),
+            ('width', width),
+            ('operator_mix', dict(operator_mix or DEFAULT_OPERATOR_MIX)),
+            ('variable_cost', variable_cost), ('seed', seed)])
+        self.rules = make_rules(rules, depth, width, operator_mix, seed)
+        self.records = make_records(records, seed)
+        self.variables_cls = make_variables_class(variable_cost)
+
+
+def bench_run_all(workload):
+    rules, variables_cls = workload.rules, workload.variables_cls
+
+    def run():
+        for record in workload.records:
+            run_all(rules, variables_cls(record), SyntheticActions())
+    return run
+
+
+def bench_run_all_cached(workload):
+    rules, variables_cls = workload.rules, workload.variables_cls
+
+    def run():
+        for record in workload.records:
+            run_all(rules, variables_cls(record), SyntheticActions(),
+                    cache_variables=True)
+    return run
+
+
+def bench_check_conditions_recursively(workload):
+    conditions = [rule['conditions'] for rule in workload.rules]
+    variables_cls = workload.variables_cls
+
+    def run():
+        for record in workload.records:
+            variables = variables_cls(record)
+            for condition in conditions:
+                check_conditions_recursively(condition, variables)
+    return run
+
+
+def bench_compiled(workload):
+    variables_cls = workload.variables_cls
+    ruleset = compile_rules(workload.rules, variables_cls, SyntheticActions)
+
+    def run():
+        for record in workload.records:
+            ruleset.run(variables_cls(record), SyntheticActions(),
+                        cache_variables=True)
+    return run
+
+
+def bench_compile_rules(workload):
+    def run():
+        compile_rules(workload.rules, workload.variables_cls,
+                      SyntheticActions)
+    return run
+
+
+def bench_export_rule_data(workload):
+    def run():
+        export_rule_data(workload.variables_cls, SyntheticActions)
+    return run
+
+
+# name -> (function returning the callable to time, whether each call
+# evaluates every rule against every record)
+BENCHMARKS = OrderedDict([
+    ('run_all', (bench_run_all, True)),
+    ('run_all_cached', (bench_run_all_cached, True)),
+    ('check_conditions_recursively',
+     (bench_check_conditions_recursively, True)),
+    ('compiled', (bench_compiled, True)),
+    ('compile_rules', (bench_compile_rules, False)),
+    ('export_rule_data', (bench_export_rule_data, False)),
+])
+
+
+def run_benchmarks(workload, names=None, repeat=3):
+    """ Runs the benchmarks called `names` (by default, all of them) and
+    returns their results as a dict ready to be dumped as JSON.
+    """
+    results = []
+    for name in names or BENCHMARKS:
+        setup, per_record = BENCHMARKS[name]
+        run = setup(workload)
+        seconds = min(_time(run) for _ in range(repeat))
+        result = OrderedDict([('name', name), ('seconds', seconds),
+                              ('calls_per_sec', _rate(1, seconds))])
+        if per_record:
+            records = len(workload.records)
+            result['records_per_sec'] = _rate(records, seconds)
+            result['rules_per_sec'] = _rate(records * len(workload.rules),
+                                            seconds)
+        result.update(_measure_memory(run))
+        results.append(result)
+
+    return OrderedDict([
+        ('business_rules_version', business_rules.__version__),
+        ('python', platform.python_version()),
+        ('implementation', platform.python_implementation()),
+        ('platform', platform.platform()),
+        ('created', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())),
+        ('config', workload.config),
+        ('results', results),
+    ])
+
+
+def _time(run):
+    start = _clock()
+    run()
+    return _clock() - start
+
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+def _rate(count, seconds):
+    return count / seconds if seconds else None
+
+
+def _measure_memory(run):
+    collections = _young_collections()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else:  # pragma: no cover
+        run()
+        peak = None
+    after = _young_collections()
+    return OrderedDict([
+        ('peak_memory_bytes', peak),
+        ('gc_collections', None if collections is None
+            else after - collections),
+    ])
+
+
+def _young_collections():
+    if not hasattr(gc, 'get_stats'):  # pragma: no cover
+        return None
+    return gc.get_stats()[0]['collections']
+
+
+def parse_operator_mix(text):
+    """ Parses 'string=3,numeric=1' into {'string': 3, 'numeric': 1}. """
+    mix = {}
+    for item in text.split(','):
+        kind, _, weight = item.partition('=')
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.run',
+        description='Benchmarks business_rules on synthetic rulesets.')
+    parser.add_argument('--rules', type=int, default=100)
+    parser.add_argument('--records', type=int, default=100)
+    parser.add_argument('--depth', type=int, default=2,
+                        help='nesting depth of the conditions')
+    parser.add_argument('--width', type=int, default=3,
+                        help='number of children of each all/any')
+    parser.add_argument('--mix', type=parse_operator_mix, default=None,
+                        help='weights of the kinds of variables, e.g. '
+                             'string=3,numeric=2,boolean=1')
+    parser.add_argument('--variable-cost', type=int, default=0,
+                        help='iterations of busy work per variable call')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--benchmark', action='append',
+                        choices=list(BENCHMARKS),
+                        help='benchmark to run (repeatable), default all')
+    parser.add_argument('--output', default='-',
+                        help='file to write the JSON results to')
+    args = parser.parse_args(argv)
+
+    workload = Workload(args.rules, args.records, args.depth, args.width,
+                        args.mix, args.variable_cost, args.seed)
+    results = run_benchmarks(workload, args.benchmark, args.repeat)
+    text = json.dumps(results, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    return results
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,168 @@
+""" Synthetic rulesets and records for the benchmarks.
+
+The variables class has VARIABLES_PER_KIND variables of each kind (string,
+numeric, boolean, select and select_multiple), which read their value from a
+record dict. Every variable call also does `variable_cost` iterations of
+busy work, to stand in for the lookups real variables do.
+"""
+import random
+
+from business_rules.actions import BaseActions, rule_action
+from business_rules.fields import FIELD_TEXT
+from business_rules.operators import (BooleanType, NumericType,
+                                      SelectMultipleType, SelectType,
+                                      StringType)
+from business_rules.variables import BaseVariables, rule_variable
+
+VARIABLES_PER_KIND = 4
+
+WORDS = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf',
+         'hotel', 'india', 'juliett', 'kilo', 'lima', 'mike', 'november']
+
+# kind -> [(operator, function returning a comparison value)]
+OPERATORS = {
+    'string': [
+        ('equal_to', lambda rng: rng.choice(WORDS)),
+        ('equal_to_case_insensitive', lambda rng: rng.choice(WORDS).upper()),
+        ('starts_with', lambda rng: rng.choice(WORDS)[:2]),
+        ('ends_with', lambda rng: rng.choice(WORDS)[-2:]),
+        ('contains', lambda rng: rng.choice(WORDS)[1:3]),
+        ('matches_regex', lambda rng: '^{0}.*o$'.format(rng.choice(WORDS)[0])),
+        ('non_empty', lambda rng: None),
+    ],
+    'numeric': [
+        ('equal_to', lambda rng: rng.randint(0, 100)),
+        ('greater_than', lambda rng: rng.uniform(0, 100)),
+        ('greater_than_or_equal_to', lambda rng: rng.randint(0, 100)),
+        ('less_than', lambda rng: rng.uniform(0, 100)),
+        ('less_than_or_equal_to', lambda rng: rng.randint(0, 100)),
+    ],
+    'boolean': [
+        ('is_true', lambda rng: None),
+        ('is_false', lambda rng: None),
+    ],
+    'select': [
+        ('contains', lambda rng: rng.choice(WORDS)),
+        ('does_not_contain', lambda rng: rng.choice(WORDS)),
+    ],
+    'select_multiple': [
+        ('contains_all', lambda rng: rng.sample(WORDS, 2)),
+        ('is_contained_by', lambda rng: rng.sample(WORDS, 8)),
+        ('shares_at_least_one_element_with', lambda rng: rng.sample(WORDS, 3)),
+        ('shares_exactly_one_element_with', lambda rng: rng.sample(WORDS, 3)),
+        ('shares_no_elements_with', lambda rng: rng.sample(WORDS, 3)),
+    ],
+}
+
+DEFAULT_OPERATOR_MIX = {'string': 3, 'numeric': 3, 'boolean': 1, 'select': 1,
+                        'select_multiple': 1}
+
+FIELD_TYPES = {
+    'string': StringType,
+    'numeric': NumericType,
+    'boolean': BooleanType,
+    'select': SelectType,
+    'select_multiple': SelectMultipleType,
+}
+
+
+def variable_name(kind, number):
+    return '{0}_{1}'.format(kind, number)
+
+
+def make_variables_class(variable_cost=0):
+    """ Returns a BaseVariables subclass, instantiated with a record. """
+    def make_variable(name):
+        def variable(self):
+            for _ in range(variable_cost):
+                pass
+            return self.record[name]
+        variable.__name__ = name
+        return variable
+
+    attributes = {'__init__': _init_variables}
+    for kind, field_type in FIELD_TYPES.items():
+        for number in range(VARIABLES_PER_KIND):
+            name = variable_name(kind, number)
+            attributes[name] = rule_variable(field_type)(make_variable(name))
+    return type('SyntheticVariables', (BaseVariables,), attributes)
+
+
+def _init_variables(self, record):
+    self.record = record
+
+
+class SyntheticActions(BaseActions):
+
+    def __init__(self):
+        self.triggered = 0
+
+    @rule_action(params={'rule_id': FIELD_TEXT})
+    def trigger(self, rule_id):
+        self.triggered += 1
+
+
+def make_rules(count, depth=2, width=3, operator_mix=None, seed=0):
+    """ Returns `count` rules whose conditions are nested `depth` levels deep
+    (a depth of 1 is a single condition), alternating between 'all' and
+    'any', with `width` children per level. The kinds of variables are drawn
+    according to `operator_mix`, a dict of kind -> weight.
+    """
+    rng = random.Random(seed)
+    kinds, weights = _weighted(operator_mix or DEFAULT_OPERATOR_MIX)
+    return [{'conditions': _make_conditions(rng, depth, width, kinds, weights,
+                                            'all'),
+             'actions': [{'name': 'trigger',
+                          'params': {'rule_id': str(number)}}]}
+            for number in range(count)]
+
+
+def _weighted(operator_mix):
+    kinds = sorted(kind for kind, weight in operator_mix.items() if weight)
+    for kind in kinds:
+        assert kind in OPERATORS, "Unknown kind of variable {0}".format(kind)
+    return kinds, [operator_mix[kind] for kind in kinds]
+
+
+def _make_conditions(rng, depth, width, kinds, weights, kind_of_node):
+    if depth <= 1:
+        kind = _choose(rng, kinds, weights)
+        operator, make_value = rng.choice(OPERATORS[kind])
+        return {'name': variable_name(kind,
+                                      rng.randrange(VARIABLES_PER_KIND)),
+                'operator': operator,
+                'value': make_value(rng)}
+    other = 'any' if kind_of_node == 'all' else 'all'
+    return {kind_of_node: [_make_conditions(rng, depth - 1, width, kinds,
+                                            weights, other)
+                           for _ in range(width)]}
+
+
+def _choose(rng, kinds, weights):
+    point = rng.uniform(0, sum(weights))
+    for kind, weight in zip(kinds, weights):
+        point -= weight
+        if point <= 0:
+            return kind
+    return kinds[-1]
+
+
+def make_records(count, seed=0):
+    """ Returns `count` record dicts with a value for every variable. """
+    rng = random.Random(seed)
+    makers = {
+        'string': lambda: rng.choice(WORDS) + rng.choice(['', 'o', '-x']),
+        'numeric': lambda: rng.choice([rng.randint(0, 100),
+                                       rng.uniform(0, 100)]),
+        'boolean': lambda: rng.random() < 0.5,
+        'select': lambda: rng.sample(WORDS, 4),
+        'select_multiple': lambda: rng.sample(WORDS, 5),
+    }
+    records = []
+    for _ in range(count):
+        record = {}
+        for kind in sorted(makers):
+            for number in range(VARIABLES_PER_KIND):
+                record[variable_name(kind, number)] = makers[kind]()
+        records.append(record)
+    return records
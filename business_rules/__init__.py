@@ -1,8 +1,11 @@
 __version__ = '1.1.1'
 
-from .engine import run_all
+from .engine import run_all, run_batch
+from .compiler import compile_rules
 from .utils import export_rule_data
 
 # Appease pyflakes by "using" these exports
 assert run_all
+assert run_batch
+assert compile_rules
 assert export_rule_data
@@ -0,0 +1,159 @@
+""" An asyncio version of the engine, for variables and actions that do I/O.
+
+Rule variables and actions may be coroutine functions (or return any other
+awaitable); plain ones work too. The coroutine variables used by the
+conditions of an 'all' or 'any' are fetched concurrently before the
+conditions are checked in order, so slow lookups overlap instead of running
+one after another. Plain variables are only called when their condition is
+checked, and an error raised by a prefetched variable is only raised if its
+condition is checked, so short-circuiting still guards the later
+conditions.
+
+    await async_run_all(rules, ProfileVariables(profile), EmailActions())
+
+Requires Python 3.5+.
+"""
+import asyncio
+import inspect
+
+from .engine import _do_operator_comparison
+
+
+async def async_run_all(rule_list,
+                        defined_variables,
+                        defined_actions,
+                        stop_on_first_trigger=False,
+                        cache_variables=False):
+    """ Like engine.run_all. With cache_variables=True, each variable is
+    fetched at most once for this call instead of once per all/any.
+    """
+    values = {} if cache_variables else None
+    rule_was_triggered = False
+    for rule in rule_list:
+        result = await async_run(rule, defined_variables, defined_actions,
+                                 values)
+        if result:
+            rule_was_triggered = True
+            if stop_on_first_trigger:
+                return True
+    return rule_was_triggered
+
+
+async def async_run(rule, defined_variables, defined_actions, values=None):
+    """ Like engine.run. `values` is an optional dict used to share variable
+    values between calls.
+    """
+    conditions, actions = rule['conditions'], rule['actions']
+    rule_triggered = await async_check_conditions_recursively(
+        conditions, defined_variables, values)
+    if rule_triggered:
+        await async_do_actions(actions, defined_actions)
+        return True
+    return False
+
+
+async def async_check_conditions_recursively(conditions, defined_variables,
+                                             values=None):
+    keys = list(conditions.keys())
+    if keys == ['all'] or keys == ['any']:
+        kind = keys[0]
+        assert len(conditions[kind]) >= 1
+        node_values = {} if values is None else values
+        await _fetch_variables(conditions[kind], defined_variables,
+                               node_values)
+        for condition in conditions[kind]:
+            result = await async_check_conditions_recursively(
+                condition, defined_variables,
+                node_values if 'name' in condition else values)
+            if kind == 'all' and not result:
+                return False
+            if kind == 'any' and result:
+                return True
+        return kind == 'all'
+
+    else:
+        # help prevent errors - any and all can only be in the condition dict
+        # if they're the only item
+        assert not ('any' in keys or 'all' in keys)
+        return await async_check_condition(conditions, defined_variables,
+                                           values)
+
+
+async def async_check_condition(condition, defined_variables, values=None):
+    """ Like engine.check_condition, using the value of the variable from
+    `values` if it has already been fetched, else storing it there.
+    """
+    name, op, value = (condition['name'], condition['operator'],
+                       condition['value'])
+    method = _get_variable_method(defined_variables, name)
+    if values is not None and name in values:
+        val = values[name]
+        if isinstance(val, _FetchError):
+            raise val.error
+    else:
+        val = await _resolve(method())
+        if values is not None and getattr(method, 'cache', True):
+            values[name] = val
+    return _do_operator_comparison(method.field_type(val), op, value)
+
+
+async def async_do_actions(actions, defined_actions):
+    """ Like engine.do_actions, awaiting each action in turn. """
+    for action in actions:
+        method_name = action['name']
+
+        def fallback(*args, **kwargs):
+            raise AssertionError("Action {0} is not defined in class {1}"
+                                 .format(method_name,
+                                         defined_actions.__class__.__name__))
+        params = action.get('params') or {}
+        method = getattr(defined_actions, method_name, fallback)
+        await _resolve(method(**params))
+
+
+async def _fetch_variables(conditions, defined_variables, values):
+    """ Concurrently fetches, into `values`, the coroutine variables used by
+    the leaf conditions in `conditions`. Variables declared with
+    `cache=False` are left to be fetched by each condition, and so are plain
+    variables, which may depend on an earlier condition holding. A variable
+    that raises is stored as a _FetchError.
+    """
+    methods = {}
+    for condition in conditions:
+        name = condition.get('name')
+        if name is None or name in values or name in methods:
+            continue
+        method = _get_variable_method(defined_variables, name)
+        if getattr(method, 'cache', True) and \
+                asyncio.iscoroutinefunction(method):
+            methods[name] = method
+    if not methods:
+        return
+    names = list(methods)
+    results = await asyncio.gather(*[methods[name]() for name in names],
+                                   return_exceptions=True)
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            result = _FetchError(result)
+        values[name] = result
+
+
+class _FetchError(object):
+    """ The error raised by a prefetched variable, raised again when its
+    condition is checked.
+    """
+    def __init__(self, error):
+        self.error = error
+
+
+def _get_variable_method(defined_variables, name):
+    def fallback(*args, **kwargs):
+        raise AssertionError("Variable {0} is not defined in class {1}".format(
+                name, defined_variables.__class__.__name__))
+    return getattr(defined_variables, name, fallback)
+
+
+async def _resolve(value):
+    if inspect.isawaitable(value):
+        return await value
+    return value
@@ -0,0 +1,367 @@
+""" A binary file format for rulesets, loaded with mmap.
+
+Loading a large JSON rules file means parsing all of it in every worker
+process. write_bundle instead writes the rules once in a flat binary layout,
+and load_bundle maps the file into memory: loading only reads the header, a
+rule is decoded when it's accessed, and processes mapping the same file
+share its pages.
+
+    write_bundle(rules, 'rules.brb')
+
+    with load_bundle('rules.brb') as bundle:
+        ruleset = compile_rules(bundle, ProductVariables, ProductActions)
+
+The file is made of a header, followed by these sections:
+
+- strings - the distinct variable, operator and action names
+- values - the distinct condition values, action params and other rule
+  fields, each tagged with its encoding: UTF-8 for strings, decimal digits
+  for integers, an IEEE 754 double for floats and JSON for anything else
+- nodes - one record per all/any/condition node of every rule: a condition
+  references its name, operator and value by index, an all/any the range of
+  its children in the children section
+- children - the node indexes of the children of the all/any nodes
+- rules - the root node, actions range and other fields of each rule
+- actions - the name and params of each action
+
+The header holds the format version and a SHA-256 digest of the sections,
+which load_bundle checks unless told not to.
+"""
+import hashlib
+import json
+import mmap
+import struct
+
+from six import binary_type, integer_types, string_types
+
+MAGIC = b'BRB\x00'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<4sHH32s6I')
+_TABLE_OFFSET = struct.Struct('<I')
+_NODE = struct.Struct('<B3xIII')
+_CHILD = struct.Struct('<I')
+_RULE = struct.Struct('<IIII')
+_ACTION = struct.Struct('<II')
+_FLOAT = struct.Struct('<d')
+
+_ALL, _ANY, _CONDITION = 0, 1, 2
+_GROUP_KINDS = {'all': _ALL, 'any': _ANY}
+# index meaning "absent"
+_NONE = 0xFFFFFFFF
+_SCALARS = string_types + integer_types + (float, type(None))
+_DIGEST_CHUNK_SIZE = 1 << 20
+
+
+def dumps_bundle(rule_list):
+    """ Returns the bundle of `rule_list` as bytes. Raises AssertionError if
+    a rule's conditions aren't well formed.
+    """
+    writer = _BundleWriter()
+    for rule in rule_list:
+        writer.add_rule(rule)
+    return writer.dumps()
+
+
+def write_bundle(rule_list, path):
+    """ Writes the bundle of `rule_list` to `path`, and returns its
+    fingerprint - the hex digest in its header.
+    """
+    data = dumps_bundle(rule_list)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return _fingerprint(data)
+
+
+def load_bundle(path, verify=True):
+    """ Maps the bundle at `path` into memory and returns a RuleBundle.
+    Raises ValueError if it isn't a valid bundle, or if `verify` and its
+    digest doesn't match its content.
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return RuleBundle(buffer, verify)
+    except Exception:
+        buffer.close()
+        raise
+
+
+class RuleBundle(object):
+    """ A read-only sequence of the rules of a bundle, as the dicts they
+    were written from. Rules are decoded every time they're accessed, so
+    changing one doesn't change the bundle.
+
+    `buffer` is anything supporting the buffer protocol: an mmap, or the
+    bytes returned by dumps_bundle.
+    """
+    def __init__(self, buffer, verify=True):
+        self._buffer = buffer
+        if len(buffer) < _HEADER.size:
+            raise ValueError("Not a ruleset bundle")
+        (magic, version, _, digest, string_count, value_count, node_count,
+         child_count, rule_count, action_count) = \
+            _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a ruleset bundle")
+        if version != FORMAT_VERSION:
+            raise ValueError("Unsupported ruleset bundle version {0}".format(
+                version))
+        self.fingerprint = _hex(digest)
+
+        offset = _HEADER.size
+        self._strings, offset = _table_at(buffer, offset, string_count)
+        self._values, offset = _table_at(buffer, offset, value_count)
+        self._nodes = offset
+        offset += node_count * _NODE.size
+        self._children = offset
+        offset += child_count * _CHILD.size
+        self._rules = offset
+        offset += rule_count * _RULE.size
+        self._actions = offset
+        offset += action_count * _ACTION.size
+        if offset != len(buffer):
+            raise ValueError("Truncated or corrupt ruleset bundle")
+        self._rule_count = rule_count
+        self._string_cache = {}
+        # value index -> (decoded value, function returning a copy of it)
+        self._value_cache = {}
+
+        if verify and _digest(buffer, _HEADER.size) != digest:
+            raise ValueError("Ruleset bundle digest mismatch")
+
+    def __len__(self):
+        return self._rule_count
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += self._rule_count
+        if not 0 <= position < self._rule_count:
+            raise IndexError("rule index out of range")
+        root, first_action, action_count, fields = _RULE.unpack_from(
+            self._buffer, self._rules + position * _RULE.size)
+        rule = self._value(fields) if fields != _NONE else {}
+        rule['conditions'] = self._node(root)
+        rule['actions'] = [self._action(first_action + number)
+                           for number in range(action_count)]
+        return rule
+
+    def __iter__(self):
+        for position in range(self._rule_count):
+            yield self[position]
+
+    def close(self):
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _node(self, index):
+        kind, first, second, third = _NODE.unpack_from(
+            self._buffer, self._nodes + index * _NODE.size)
+        if kind == _CONDITION:
+            return {'name': self._string(first),
+                    'operator': self._string(second),
+                    'value': self._value(third)}
+        children = [self._node(_CHILD.unpack_from(
+                        self._buffer,
+                        self._children + (first + number) * _CHILD.size)[0])
+                    for number in range(second)]
+        return {'all' if kind == _ALL else 'any': children}
+
+    def _action(self, index):
+        name, params = _ACTION.unpack_from(
+            self._buffer, self._actions + index * _ACTION.size)
+        action = {'name': self._string(name)}
+        if params != _NONE:
+            action['params'] = self._value(params)
+        return action
+
+    def _string(self, index):
+        try:
+            return self._string_cache[index]
+        except KeyError:
+            string = self._string_cache[index] = \
+                _read_entry(self._buffer, self._strings, index).decode('utf-8')
+            return string
+
+    def _value(self, index):
+        try:
+            value, copy = self._value_cache[index]
+        except KeyError:
+            value = _decode_value(_read_entry(self._buffer, self._values,
+                                              index))
+            copy = _copier(value)
+            if copy is None:
+                return value
+            self._value_cache[index] = (value, copy)
+        return copy(value)
+
+
+class _BundleWriter(object):
+
+    def __init__(self):
+        self.strings = _Table()
+        self.values = _Table()
+        self.nodes = []
+        self.children = []
+        self.rules = []
+        self.actions = []
+
+    def add_rule(self, rule):
+        root = self.add_node(rule['conditions'])
+        first_action = len(self.actions)
+        for action in rule['actions']:
+            params = action.get('params')
+            self.actions.append(_ACTION.pack(
+                self.strings.add(action['name']),
+                _NONE if params is None else self.values.add_value(params)))
+        fields = dict((key, value) for key, value in rule.items()
+                      if key not in ('conditions', 'actions'))
+        self.rules.append(_RULE.pack(
+            root, first_action, len(rule['actions']),
+            self.values.add_value(fields) if fields else _NONE))
+
+    def add_node(self, conditions):
+        keys = list(conditions.keys())
+        if keys == ['all'] or keys == ['any']:
+            kind = keys[0]
+            assert len(conditions[kind]) >= 1
+            children = [self.add_node(condition)
+                        for condition in conditions[kind]]
+            first = len(self.children)
+            self.children.extend(_CHILD.pack(child) for child in children)
+            node = _NODE.pack(_GROUP_KINDS[kind], first, len(children), 0)
+        else:
+            # help prevent errors - any and all can only be in the condition
+            # dict if they're the only item
+            assert not ('any' in keys or 'all' in keys)
+            node = _NODE.pack(_CONDITION,
+                              self.strings.add(conditions['name']),
+                              self.strings.add(conditions['operator']),
+                              self.values.add_value(conditions['value']))
+        self.nodes.append(node)
+        return len(self.nodes) - 1
+
+    def dumps(self):
+        body = b''.join([self.strings.dumps(), self.values.dumps()] +
+                        self.nodes + self.children + self.rules +
+                        self.actions)
+        header = _HEADER.pack(MAGIC, FORMAT_VERSION, 0,
+                              hashlib.sha256(body).digest(),
+                              len(self.strings), len(self.values),
+                              len(self.nodes), len(self.children),
+                              len(self.rules), len(self.actions))
+        return header + body
+
+
+class _Table(object):
+    """ Interned byte strings: the offsets of the entries, followed by the
+    entries themselves.
+    """
+    def __init__(self):
+        self.indexes = {}
+        self.entries = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, text):
+        entry = text if isinstance(text, binary_type) \
+            else text.encode('utf-8')
+        try:
+            return self.indexes[entry]
+        except KeyError:
+            index = self.indexes[entry] = len(self.entries)
+            self.entries.append(entry)
+            return index
+
+    def add_value(self, value):
+        return self.add(_encode_value(value))
+
+    def dumps(self):
+        offsets = [0]
+        for entry in self.entries:
+            offsets.append(offsets[-1] + len(entry))
+        return b''.join([_TABLE_OFFSET.pack(offset) for offset in offsets] +
+                        self.entries)
+
+
+def _table_at(buffer, offset, count):
+    """ Returns the position of the table of `count` entries at `offset`,
+    and the offset following it.
+    """
+    end_of_offsets = offset + (count + 1) * _TABLE_OFFSET.size
+    if end_of_offsets > len(buffer):
+        raise ValueError("Truncated or corrupt ruleset bundle")
+    size = _TABLE_OFFSET.unpack_from(buffer,
+                                     offset + count * _TABLE_OFFSET.size)[0]
+    return (offset, end_of_offsets), end_of_offsets + size
+
+
+def _read_entry(buffer, table, index):
+    offsets, entries = table
+    start, end = struct.unpack_from(
+        '<II', buffer, offsets + index * _TABLE_OFFSET.size)
+    return bytes(buffer[entries + start:entries + end])
+
+
+def _encode_value(value):
+    if isinstance(value, string_types):
+        return b's' + value.encode('utf-8')
+    # bool is an int, but is encoded as JSON
+    if isinstance(value, integer_types) and not isinstance(value, bool):
+        return b'i' + str(value).encode('ascii')
+    if isinstance(value, float):
+        return b'f' + _FLOAT.pack(value)
+    return b'j' + json.dumps(value, sort_keys=True,
+                             separators=(',', ':')).encode('utf-8')
+
+
+def _decode_value(entry):
+    tag, data = entry[:1], entry[1:]
+    if tag == b's':
+        return data.decode('utf-8')
+    if tag == b'i':
+        return int(data)
+    if tag == b'f':
+        return _FLOAT.unpack(data)[0]
+    return json.loads(data.decode('utf-8'))
+
+
+def _copier(value):
+    """ Returns a function copying `value` if it's a scalar or a list of
+    scalars, else None.
+    """
+    if isinstance(value, _SCALARS):
+        return _same
+    if isinstance(value, list) and \
+            all(isinstance(item, _SCALARS) for item in value):
+        return list
+    return None
+
+
+def _same(value):
+    return value
+
+
+def _digest(buffer, start):
+    """ Returns the SHA-256 digest of `buffer` from `start`, hashed in chunks
+    so that a large mmap isn't copied as a whole.
+    """
+    digest = hashlib.sha256()
+    for offset in range(start, len(buffer), _DIGEST_CHUNK_SIZE):
+        digest.update(buffer[offset:offset + _DIGEST_CHUNK_SIZE])
+    return digest.digest()
+
+
+def _fingerprint(data):
+    return _hex(_HEADER.unpack_from(data, 0)[3])
+
+
+def _hex(digest):
+    return ''.join('{0:02x}'.format(byte) for byte in bytearray(digest))
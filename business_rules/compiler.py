@@ -0,0 +1,869 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque, namedtuple
+from heapq import merge
+from threading import Lock
+
+from .deferred import DeferredActions
+from .fields import FIELD_NO_INPUT
+from .operators import (VALUE_TYPES, FloatNumericType, NumericType,
+                        SelectMultipleType, SelectType, StringType, fold_item,
+                        fold_items, get_value_operator)
+from .utils import regex_cache, ruleset_fingerprint
+
+
+def compile_rules(rule_list, variables_cls, actions_cls, use_index=False,
+                  group_patterns=False, group_ranges=False,
+                  float_numbers=False):
+    """ Compiles `rule_list` into a CompiledRuleSet. Every variable, operator
+    and action named in the rules is resolved once against `variables_cls`,
+    the variables' field types and `actions_cls`, and the conditions are
+    turned into a tree of closures, so running the ruleset doesn't need to
+    re-interpret the rule dicts.
+
+    - use_index - if True, also build a RuleIndex so that each run only
+      evaluates the rules that can possibly be triggered.
+    - group_patterns - if True, literal string conditions on the same
+      variable are answered by a PatternMatcher, with a single scan of the
+      variable's value per run.
+    - group_ranges - if True, numeric comparisons on the same variable are
+      answered by a RangeMatcher, with two bisections per run.
+
+    The groups are only used when running with cache_variables=True.
+
+    - float_numbers - if True, numeric variables are compared as native
+      floats and ints with operators.FloatNumericType, rather than as
+      Decimals.
+
+    Raises AssertionError if a rule references a variable, operator or action
+    that doesn't exist.
+    """
+    field_types = {NumericType: FloatNumericType} if float_numbers else None
+    matchers = []
+    if group_patterns:
+        matchers.append(PatternMatcher(rule_list, variables_cls, field_types))
+    if group_ranges:
+        matchers.append(RangeMatcher(rule_list, variables_cls, field_types))
+    rules = [compile_rule(rule, variables_cls, actions_cls, matchers,
+                          field_types)
+             for rule in rule_list]
+    index = RuleIndex(rule_list, variables_cls) if use_index else None
+    return CompiledRuleSet(rules, index)
+
+
+RulesetCacheInfo = namedtuple('RulesetCacheInfo',
+                              ['hits', 'misses', 'evictions', 'maxsize',
+                               'currsize'])
+
+
+class RulesetCache(object):
+    """ A bounded LRU cache of compiled rulesets, keyed by the fingerprint
+    of the rule list (see utils.ruleset_fingerprint), the classes and the
+    compile options. Reloading an unchanged rule list then only costs
+    fingerprinting it.
+    """
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._rulesets = OrderedDict()
+        self._lock = Lock()
+
+    def compile(self, rule_list, variables_cls, actions_cls,
+                compiler=compile_rules, fingerprint=None, **options):
+        """ Returns compiler(rule_list, variables_cls, actions_cls,
+        **options), compiling only if it isn't cached yet.
+
+        - compiler - compile_rules, or another function with the same
+          arguments such as network.compile_network.
+        - fingerprint - the fingerprint of `rule_list`, if already known.
+        """
+        if fingerprint is None:
+            fingerprint = ruleset_fingerprint(rule_list)
+        key = (fingerprint, variables_cls, actions_cls, compiler,
+               tuple(sorted(options.items())))
+        with self._lock:
+            ruleset = self._rulesets.pop(key, None)
+            if ruleset is not None:
+                self.hits += 1
+                self._rulesets[key] = ruleset
+                return ruleset
+        ruleset = compiler(rule_list, variables_cls, actions_cls, **options)
+        with self._lock:
+            self.misses += 1
+            self._rulesets[key] = ruleset
+            while len(self._rulesets) > self.maxsize:
+                self._rulesets.popitem(last=False)
+                self.evictions += 1
+        return ruleset
+
+    def info(self):
+        """ Returns a RulesetCacheInfo(hits, misses, evictions, maxsize,
+        currsize).
+        """
+        return RulesetCacheInfo(self.hits, self.misses, self.evictions,
+                                self.maxsize, len(self._rulesets))
+
+    def hit_rate(self):
+        """ Returns the fraction of compile calls served from the cache. """
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+    def clear(self):
+        """ Empties the cache and resets the statistics. """
+        with self._lock:
+            self._rulesets.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+# Process-wide cache of compiled rulesets
+ruleset_cache = RulesetCache()
+
+
+def compile_rule(rule, variables_cls, actions_cls, matchers=(),
+                 field_types=None):
+    """ Compiles a single rule dict into a CompiledRule. """
+    check = compile_conditions(rule['conditions'], variables_cls, matchers,
+                               field_types)
+    actions = [compile_action(action, actions_cls)
+               for action in rule['actions']]
+    return CompiledRule(rule, check, actions)
+
+
+class CompiledRuleSet(object):
+    """ A list of compiled rules that can be run against any number of
+    variables/actions instances, with the same semantics as engine.run_all.
+
+    Variables and actions are looked up on the classes given to
+    compile_rules, so attributes set on individual instances are not seen.
+    """
+    def __init__(self, rules, index=None):
+        self.rules = rules
+        self.index = index
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def run(self, defined_variables, defined_actions,
+            stop_on_first_trigger=False, cache_variables=False):
+        """ Runs every rule against the given instances. Returns True if any
+        rule was triggered.
+
+        - cache_variables - if True, each rule variable is computed (and cast
+          to its field type) at most once for this call.
+        """
+        values = {} if cache_variables else None
+        rules = self.rules
+        if self.index is not None:
+            rules = self.index.candidates(rules, defined_variables, values)
+        rule_was_triggered = False
+        for rule in rules:
+            if rule.run(defined_variables, defined_actions, values):
+                rule_was_triggered = True
+                if stop_on_first_trigger:
+                    return True
+        return rule_was_triggered
+
+    def triggered_rules(self, defined_variables, stop_on_first_trigger=False,
+                        cache_variables=False):
+        """ Returns the positions of the rules whose conditions hold, without
+        running any action. Unlike run, actions can't affect the variables
+        seen by later rules.
+        """
+        values = {} if cache_variables else None
+        rules = self.rules
+        if self.index is None:
+            positions = range(len(rules))
+        else:
+            positions = self.index.candidate_positions(defined_variables,
+                                                       values)
+        triggered = []
+        for position in positions:
+            if rules[position].check(defined_variables, values):
+                triggered.append(position)
+                if stop_on_first_trigger:
+                    break
+        return triggered
+
+
+class RuleIndex(object):
+    """ Maps variable values to the rules that can possibly be triggered for
+    them, so that rules whose gating condition can't hold are skipped without
+    being evaluated.
+
+    A rule is gated by the first condition it checks - either the rule's
+    only condition, or the first child of its top level 'all' - if it is one
+    of:
+
+    - string equal_to, equal_to_case_insensitive or starts_with
+    - select contains
+
+    Later conditions may depend on earlier ones, e.g. on a variable only
+    being defined when another one is true, so they never gate the rule.
+    Rules without such a condition, and conditions on variables declared with
+    `cache=False`, are never skipped. The candidates are computed before any
+    rule runs, so they are not affected by actions that change the variables.
+
+    Each indexed variable is fetched once to compute the candidates. Unless
+    the ruleset runs with cache_variables=True, that fetch isn't shared with
+    the conditions, so indexed variables are called once more per run. If the
+    fetch raises, the rules gated by the variable are all candidates, and
+    raise the error if they're run.
+    """
+    def __init__(self, rule_list, variables_cls):
+        self.unindexed = []
+        # (variable name, lookup class) -> lookup
+        self.lookups = {}
+        for position, rule in enumerate(rule_list):
+            if not self._add(position, rule['conditions'], variables_cls):
+                self.unindexed.append(position)
+
+    def _add(self, position, conditions, variables_cls):
+        keys = list(conditions.keys())
+        if keys == ['all']:
+            condition = conditions['all'][0]
+        elif keys == ['any']:
+            return False
+        else:
+            condition = conditions
+        if 'name' not in condition:
+            return False
+
+        variable = get_variable_method(variables_cls, condition['name'])
+        lookup_cls = _find_lookup_class(variable.field_type,
+                                        condition['operator'])
+        if lookup_cls is None or not getattr(variable, 'cache', True):
+            return False
+        key = lookup_cls.rule_key(variable.field_type, condition['value'])
+        try:
+            hash(key)
+        except TypeError:
+            return False
+        lookup_key = (condition['name'], lookup_cls)
+        if lookup_key not in self.lookups:
+            self.lookups[lookup_key] = lookup_cls(
+                _compile_value_fetch(condition['name'], variable,
+                                     variable.field_type))
+        self.lookups[lookup_key].add(key, position)
+        return True
+
+    def candidate_positions(self, defined_variables, values=None):
+        """ Returns the sorted positions, in the original rule list, of the
+        rules that can be triggered for these variables.
+        """
+        if values is None:
+            # still fetch each variable once, whatever its number of lookups
+            values = {}
+        matched = set()
+        for lookup in self.lookups.values():
+            try:
+                matched.update(lookup.match(defined_variables, values))
+            except Exception:
+                # left for the rules to raise, if they get to check it
+                matched.update(lookup.positions)
+        matched = sorted(matched)
+        if not self.unindexed:
+            return matched
+        return list(merge(self.unindexed, matched))
+
+    def candidates(self, rules, defined_variables, values=None):
+        """ Returns the items of `rules` at the candidate positions. """
+        return [rules[position] for position in
+                self.candidate_positions(defined_variables, values)]
+
+
+class _Lookup(object):
+
+    def __init__(self, fetch_value):
+        self.fetch_value = fetch_value
+        self.table = {}
+        self.positions = []
+
+    def add(self, key, position):
+        self.table.setdefault(key, []).append(position)
+        self.positions.append(position)
+
+    def match(self, defined_variables, values):
+        value = self.fetch_value(defined_variables, values)
+        table = self.table
+        for key in self.record_keys(value):
+            try:
+                positions = table.get(key)
+            except TypeError:
+                # unhashable item of a select variable
+                continue
+            if positions:
+                for position in positions:
+                    yield position
+
+    @staticmethod
+    def rule_key(field_type, value):
+        return field_type(value).value
+
+    def record_keys(self, value):
+        return [value]
+
+
+class _EqualToLookup(_Lookup):
+    pass
+
+
+class _CaseInsensitiveLookup(_Lookup):
+
+    @staticmethod
+    def rule_key(field_type, value):
+        return field_type(value).value.lower()
+
+    def record_keys(self, value):
+        return [value.lower()]
+
+
+class _PrefixLookup(_Lookup):
+
+    def __init__(self, fetch_value):
+        super(_PrefixLookup, self).__init__(fetch_value)
+        self._lengths = set()
+        # sorted self._lengths, computed on the first match
+        self.lengths = None
+
+    def add(self, key, position):
+        super(_PrefixLookup, self).add(key, position)
+        if len(key) not in self._lengths:
+            self._lengths.add(len(key))
+            self.lengths = None
+
+    def record_keys(self, value):
+        lengths = self.lengths
+        if lengths is None:
+            lengths = self.lengths = sorted(self._lengths)
+        return [value[:length] for length in lengths
+                if length <= len(value)]
+
+
+class _SelectContainsLookup(_Lookup):
+
+    @staticmethod
+    def rule_key(field_type, value):
+        return fold_item(value)
+
+    def record_keys(self, value):
+        return [fold_item(item) for item in value]
+
+
+_LOOKUP_CLASSES = [
+    (StringType, 'equal_to', _EqualToLookup),
+    (StringType, 'equal_to_case_insensitive', _CaseInsensitiveLookup),
+    (StringType, 'starts_with', _PrefixLookup),
+    (SelectType, 'contains', _SelectContainsLookup),
+]
+
+
+def _find_lookup_class(field_type, operator_name,
+                       lookup_classes=_LOOKUP_CLASSES):
+    for base, name, lookup_cls in lookup_classes:
+        # subclasses may have overridden the operator with other semantics
+        if operator_name == name and issubclass(field_type, base) and \
+                getattr(field_type, name) == getattr(base, name):
+            return lookup_cls
+    return None
+
+
+class _PatternGroup(object):
+
+    OPERATORS = ('contains', 'starts_with', 'ends_with', 'equal_to')
+
+    def __init__(self, name, field_type, keys):
+        self.memo_key = ('patterns', name)
+        self.field_type = field_type
+        self.keys = frozenset(keys)
+        by_operator = dict((op, set()) for op in self.OPERATORS)
+        for op, literal in keys:
+            by_operator[op].add(literal)
+        self.automaton = _Automaton(by_operator['contains']) \
+            if by_operator['contains'] else None
+        self.prefixes = by_operator['starts_with']
+        self.prefix_lengths = sorted(set(len(p) for p in self.prefixes))
+        self.suffixes = by_operator['ends_with']
+        self.suffix_lengths = sorted(set(len(p) for p in self.suffixes))
+        self.equals = by_operator['equal_to']
+
+    def scan(self, value):
+        """ Returns the set of (operator, literal) pairs that hold for the
+        string `value`.
+        """
+        matched = set()
+        if self.automaton is not None:
+            for literal in self.automaton.search(value):
+                matched.add(('contains', literal))
+        size = len(value)
+        for length in self.prefix_lengths:
+            if length > size:
+                break
+            if value[:length] in self.prefixes:
+                matched.add(('starts_with', value[:length]))
+        for length in self.suffix_lengths:
+            if length > size:
+                break
+            if value[size - length:] in self.suffixes:
+                matched.add(('ends_with', value[size - length:]))
+        if value in self.equals:
+            matched.add(('equal_to', value))
+        return matched
+
+    def compile_check(self, op, value, fetch_value, check):
+        """ Returns a check for one condition of the group, or None if it
+        isn't part of it. The scan is memoized in the values dict; without one
+        the condition's own `check` is used.
+        """
+        if op not in self.OPERATORS:
+            return None
+        key = (op, self.field_type(value).value)
+        if key not in self.keys:
+            return None
+        memo_key = self.memo_key
+        scan = self.scan
+
+        def check_pattern(defined_variables, values):
+            if values is None:
+                return check(defined_variables, values)
+            try:
+                matched = values[memo_key]
+            except KeyError:
+                matched = values[memo_key] = scan(
+                    fetch_value(defined_variables, values))
+            return key in matched
+        return check_pattern
+
+
+class _Automaton(object):
+    """ An Aho-Corasick automaton finding which of a set of literals occur in
+    a string, in a single pass over it.
+    """
+    def __init__(self, literals):
+        # state -> {character: state}, with the root as state 0
+        self.goto = [{}]
+        self.fail = [0]
+        # literals ending at each state, including via the fail links
+        self.out = [()]
+        for literal in literals:
+            state = 0
+            for character in literal:
+                next_state = self.goto[state].get(character)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][character] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(())
+                state = next_state
+            self.out[state] += (literal,)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for character, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and character not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(character, 0)
+                self.fail[next_state] = target
+                self.out[next_state] += self.out[target]
+
+    def search(self, text):
+        goto, fail, out = self.goto, self.fail, self.out
+        found = set(out[0])
+        state = 0
+        for character in text:
+            while state and character not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(character, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class _RangeGroup(object):
+
+    OPERATORS = ('equal_to', 'greater_than', 'greater_than_or_equal_to',
+                 'less_than', 'less_than_or_equal_to')
+
+    def __init__(self, name, field_type, keys):
+        self.memo_key = ('ranges', name)
+        self.field_type = field_type
+        self.epsilon = field_type.EPSILON
+        self.keys = frozenset(keys)
+        self.bounds = sorted(set(bound for _, bound in keys))
+
+    def locate(self, value):
+        """ Returns the positions in self.bounds of the first bound not below
+        value - epsilon, and of the first bound above value + epsilon.
+        """
+        return (bisect_left(self.bounds, value - self.epsilon),
+                bisect_right(self.bounds, value + self.epsilon))
+
+    def compile_check(self, op, value, fetch_value, check):
+        """ Returns a check for one condition of the group, or None if it
+        isn't part of it. The located positions are memoized in the values
+        dict; without one the condition's own `check` is used.
+        """
+        if op not in self.OPERATORS:
+            return None
+        bound = self.field_type(value).value
+        if (op, bound) not in self.keys:
+            return None
+        position = bisect_left(self.bounds, bound)
+        holds = _RANGE_TESTS[op]
+        memo_key = self.memo_key
+        locate = self.locate
+
+        def check_range(defined_variables, values):
+            if values is None:
+                return check(defined_variables, values)
+            try:
+                low, high = values[memo_key]
+            except KeyError:
+                low, high = values[memo_key] = locate(
+                    fetch_value(defined_variables, values))
+            return holds(position, low, high)
+        return check_range
+
+
+# Whether the condition whose bound is at `position` holds, given the
+# positions returned by _RangeGroup.locate for the variable's value
+_RANGE_TESTS = {
+    'equal_to': lambda position, low, high: low <= position < high,
+    'greater_than': lambda position, low, high: position < low,
+    'greater_than_or_equal_to': lambda position, low, high: position < high,
+    'less_than': lambda position, low, high: position >= high,
+    'less_than_or_equal_to': lambda position, low, high: position >= low,
+}
+
+
+class _ConditionGroups(object):
+    """ Groups the conditions of a rule list that use one of OPERATORS, a
+    list of (field type, operator name, group class), by variable. Only
+    variables with at least two such conditions are grouped. Like the
+    RuleIndex, operators overridden by a subclass of the field type and
+    variables declared with `cache=False` are left alone.
+    """
+    OPERATORS = []
+
+    def __init__(self, rule_list, variables_cls, field_types=None):
+        keys = {}
+        group_classes = {}
+        for rule in rule_list:
+            for condition in _iter_leaf_conditions(rule['conditions']):
+                name, op = condition['name'], condition['operator']
+                variable = get_variable_method(variables_cls, name)
+                field_type = get_field_type(variable, field_types)
+                group_cls = _find_lookup_class(field_type, op, self.OPERATORS)
+                if group_cls is None or not getattr(variable, 'cache', True):
+                    continue
+                value = field_type(condition['value']).value
+                keys.setdefault(name, set()).add((op, value))
+                group_classes[name] = group_cls, field_type
+        # name -> group
+        self.groups = {}
+        for name, group_keys in keys.items():
+            if len(group_keys) > 1:
+                group_cls, field_type = group_classes[name]
+                self.groups[name] = group_cls(name, field_type, group_keys)
+
+    def compile_check(self, condition, fetch_value, check):
+        """ Returns a check for `condition` if it belongs to a group, and
+        None otherwise. `fetch_value` returns the variable's cast value, and
+        `check` is the condition compiled on its own.
+        """
+        group = self.groups.get(condition['name'])
+        if group is None:
+            return None
+        return group.compile_check(condition['operator'], condition['value'],
+                                   fetch_value, check)
+
+
+class PatternMatcher(_ConditionGroups):
+    """ Groups the literal string conditions of a rule list by variable, so
+    that all of them can be answered with one scan of the variable's value:
+
+    - contains - an Aho-Corasick automaton finds every literal in the value
+    - starts_with, ends_with - the value's prefixes and suffixes of the
+      literals' lengths are looked up in a set
+    - equal_to - the value is looked up in a set
+    """
+    OPERATORS = [(StringType, name, _PatternGroup)
+                 for name in _PatternGroup.OPERATORS]
+
+
+class RangeMatcher(_ConditionGroups):
+    """ Groups the numeric comparisons of a rule list by variable, so that
+    all of them can be answered with two bisections of the sorted bounds:
+    the bounds below value - epsilon are less than the value, the bounds
+    above value + epsilon are greater, and the ones in between are equal to
+    it. Up to the rounding of Decimal arithmetic, this is what the NumericType
+    operators compute one condition at a time.
+    """
+    OPERATORS = [(NumericType, name, _RangeGroup)
+                 for name in _RangeGroup.OPERATORS]
+
+
+def _iter_leaf_conditions(conditions):
+    keys = list(conditions.keys())
+    if keys == ['all'] or keys == ['any']:
+        for condition in conditions[keys[0]]:
+            for leaf in _iter_leaf_conditions(condition):
+                yield leaf
+    elif 'name' in conditions:
+        yield conditions
+
+
+class CompiledRule(object):
+    """ A rule whose conditions have been compiled into a single `check`
+    callable, and whose actions have been resolved to (method, params) pairs.
+
+    `check` takes a variables instance and a dict used to memoize variable
+    values for the current evaluation, or None to disable memoization.
+    """
+    def __init__(self, rule, check, actions):
+        self.rule = rule
+        self.check = check
+        self.actions = actions
+
+    def run(self, defined_variables, defined_actions, values=None):
+        if self.check(defined_variables, values):
+            run_actions(self.actions, defined_actions)
+            return True
+        return False
+
+
+def compile_conditions(conditions, variables_cls, matchers=(),
+                       field_types=None):
+    """ Compiles a (possibly nested) conditions dict into a callable that
+    takes a variables instance and a memoized values dict (or None), and
+    returns whether the conditions hold.
+
+    - matchers - PatternMatcher or RangeMatcher instances answering the
+      conditions they have grouped.
+    - field_types - an optional dict mapping field types to the ones to use
+      instead, see get_field_type.
+    """
+    keys = list(conditions.keys())
+    if keys == ['all']:
+        assert len(conditions['all']) >= 1
+        checks = [compile_conditions(condition, variables_cls, matchers,
+                                     field_types)
+                  for condition in conditions['all']]
+        if len(checks) == 1:
+            return checks[0]
+
+        def check_all(defined_variables, values):
+            for check in checks:
+                if not check(defined_variables, values):
+                    return False
+            return True
+        return check_all
+
+    elif keys == ['any']:
+        assert len(conditions['any']) >= 1
+        checks = [compile_conditions(condition, variables_cls, matchers,
+                                     field_types)
+                  for condition in conditions['any']]
+        if len(checks) == 1:
+            return checks[0]
+
+        def check_any(defined_variables, values):
+            for check in checks:
+                if check(defined_variables, values):
+                    return True
+            return False
+        return check_any
+
+    else:
+        # help prevent errors - any and all can only be in the condition dict
+        # if they're the only item
+        assert not ('any' in keys or 'all' in keys)
+        return compile_condition(conditions, variables_cls, matchers,
+                                 field_types)
+
+
+def compile_condition(condition, variables_cls, matchers=(),
+                      field_types=None):
+    """ Compiles a single condition into a callable taking a variables
+    instance and a memoized values dict (or None).
+    """
+    name, op, value = (condition['name'], condition['operator'],
+                       condition['value'])
+    variable = get_variable_method(variables_cls, name)
+    field_type = get_field_type(variable, field_types)
+    operator = get_operator_method(field_type, op)
+    fetch = _compile_variable_fetch(name, variable, field_type)
+    no_input = getattr(operator, 'input_type', '') == FIELD_NO_INPUT
+    if not no_input:
+        value = prepare_value(field_type, operator, value)
+
+    value_operator = get_value_operator(field_type, op)
+    if value_operator is not None:
+        # fetch returns the cast value, no field type instance is needed
+        if no_input:
+            def check_condition(defined_variables, values):
+                return value_operator(fetch(defined_variables, values))
+        else:
+            if value_operator.prepare is not None:
+                value = value_operator.prepare(value)
+
+            def check_condition(defined_variables, values):
+                return value_operator(fetch(defined_variables, values), value)
+    else:
+        # operators made with type_operator can be called without their
+        # wrapper once the value is cast
+        raw_operator = getattr(operator, 'raw_operator', operator)
+        if no_input:
+            def check_condition(defined_variables, values):
+                return raw_operator(fetch(defined_variables, values))
+        else:
+            def check_condition(defined_variables, values):
+                return raw_operator(fetch(defined_variables, values), value)
+
+    if matchers:
+        fetch_value = _compile_value_fetch(name, variable, field_type)
+        for matcher in matchers:
+            check = matcher.compile_check(condition, fetch_value,
+                                          check_condition)
+            if check is not None:
+                return check
+    return check_condition
+
+
+def prepare_value(field_type, operator, value):
+    """ Validates and casts a comparison value for `operator`, an operator of
+    `field_type`, once, so that it can be given to the operator's
+    raw_operator. Raises AssertionError if the value isn't valid.
+    """
+    if getattr(operator, 'cast_arguments', False):
+        value = field_type(value).value
+    if operator.__name__ == 'matches_regex' and \
+            issubclass(field_type, StringType):
+        # compile the pattern now, so bad patterns fail early and the
+        # first evaluation doesn't pay for it
+        regex_cache.compile(value)
+    prepare = _PREPARE_VALUE.get(field_type)
+    if prepare is not None:
+        value = prepare(operator.__name__, value)
+    return value
+
+
+def _fold_select_items(op, value):
+    if op == 'shares_exactly_one_element_with':
+        # counts repeated items, which a set would merge
+        return value
+    folded = fold_items(value)
+    return value if folded is None else folded
+
+
+def _fold_select_item(op, value):
+    return fold_item(value)
+
+
+# Field type -> function further preparing its comparison values
+_PREPARE_VALUE = {
+    SelectType: _fold_select_item,
+    SelectMultipleType: _fold_select_items,
+}
+
+
+def _compile_variable_fetch(name, variable, field_type):
+    """ Returns a callable computing the variable's value, cast to
+    `field_type`: a `field_type` instance, or just the cast value for the
+    operators.VALUE_TYPES, whose operators have value versions. When given a
+    values dict the result is memoized in it, unless the variable was
+    declared with `cache=False`.
+    """
+    if field_type in VALUE_TYPES:
+        cast = field_type._assert_valid_value_and_cast
+    else:
+        cast = field_type
+
+    if not getattr(variable, 'cache', True):
+        def fetch_uncached(defined_variables, values):
+            return cast(variable(defined_variables))
+        return fetch_uncached
+
+    def fetch(defined_variables, values):
+        if values is None:
+            return cast(variable(defined_variables))
+        try:
+            return values[name]
+        except KeyError:
+            value = values[name] = cast(variable(defined_variables))
+            return value
+    return fetch
+
+
+def _compile_value_fetch(name, variable, field_type):
+    """ Like _compile_variable_fetch, but always returns the cast value. """
+    fetch = _compile_variable_fetch(name, variable, field_type)
+    if field_type in VALUE_TYPES:
+        return fetch
+
+    def fetch_value(defined_variables, values):
+        return fetch(defined_variables, values).value
+    return fetch_value
+
+
+def get_field_type(variable, field_types=None):
+    """ Returns the field type to evaluate `variable` with: its own, unless
+    `field_types` maps it to another one.
+    """
+    if field_types:
+        return field_types.get(variable.field_type, variable.field_type)
+    return variable.field_type
+
+
+def get_variable_method(variables_cls, name):
+    """ Returns the rule variable `name` from `variables_cls`, to be called
+    with a variables instance as its only argument.
+    """
+    method = getattr(variables_cls, name, None)
+    if not getattr(method, 'is_rule_variable', False):
+        raise AssertionError("Variable {0} is not defined in class {1}".format(
+            name, variables_cls.__name__))
+    return method
+
+
+def get_operator_method(field_type, operator_name):
+    """ Returns the operator `operator_name` from the BaseType subclass
+    `field_type`, to be called with an instance of that type.
+    """
+    method = getattr(field_type, operator_name, None)
+    if not getattr(method, 'is_operator', False):
+        raise AssertionError("Operator {0} does not exist for type {1}".format(
+            operator_name, field_type.__name__))
+    return method
+
+
+def compile_action(action, actions_cls):
+    """ Resolves an action dict to a (method, params) pair. The method is
+    called with an actions instance and the params as keyword arguments.
+    """
+    method_name = action['name']
+    method = getattr(actions_cls, method_name, None)
+    if not getattr(method, 'is_rule_action', False):
+        raise AssertionError("Action {0} is not defined in class {1}".format(
+            method_name, actions_cls.__name__))
+    params = action.get('params') or {}
+    return method, params
+
+
+def run_actions(actions, defined_actions):
+    """ Runs actions resolved by compile_action on `defined_actions`. If it's
+    a deferred.DeferredActions, the actions are recorded instead.
+    """
+    if isinstance(defined_actions, DeferredActions):
+        for method, params in actions:
+            defined_actions.defer(method.__name__, params)
+    else:
+        for method, params in actions:
+            method(defined_actions, **params)
@@ -0,0 +1,121 @@
+""" Deferred, batched execution of rule actions.
+
+Instead of running each action as soon as its rule is triggered, the actions
+can be recorded in an ActionBuffer, as (action_name, params, record_key)
+entries, and handed over in batches to a sink - any callable taking a list of
+entries. BatchActionSink calls a bulk variant of each action when there is
+one:
+
+    class EmailActions(BaseActions):
+
+        @rule_action(params={"recipient_email": FIELD_TEXT})
+        def send_email(self, recipient_email):
+            ...
+
+        def send_email_batch(self, list_of_params):
+            # one bulk call for many emails
+            ...
+
+    with ActionBuffer(BatchActionSink(EmailActions()), batch_size=1000,
+                      actions_cls=EmailActions) as buffer:
+        for profile in profiles:
+            run_all(rules, ProfileVariables(profile),
+                    buffer.actions_for(profile['id']))
+"""
+
+
+class ActionBuffer(object):
+    """ Collects deferred actions and passes them to `sink` whenever
+    `batch_size` of them have been collected, and when flushed. Used as a
+    context manager, it's flushed on exit.
+
+    - actions_cls - if given, recording an action that isn't a rule action
+      of this class raises an AssertionError, like engine.do_actions would.
+    """
+    def __init__(self, sink, batch_size=1000, actions_cls=None):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.actions_cls = actions_cls
+        self.entries = []
+
+    def actions_for(self, record_key):
+        """ Returns a DeferredActions for the record identified by
+        `record_key`, to use instead of an actions instance.
+        """
+        return DeferredActions(self, record_key)
+
+    def add(self, action_name, params, record_key):
+        self.entries.append((action_name, params, record_key))
+        if len(self.entries) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.entries:
+            entries, self.entries = self.entries, []
+            self.sink(entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+
+class DeferredActions(object):
+    """ Stands in for an actions instance: calling any of its actions records
+    it in the ActionBuffer instead of running it. Works with run_all as well
+    as with compiled rulesets.
+    """
+    def __init__(self, buffer, record_key):
+        self._buffer = buffer
+        self._record_key = record_key
+
+    def defer(self, action_name, params):
+        self._buffer.add(action_name, dict(params), self._record_key)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        actions_cls = self._buffer.actions_cls
+        if actions_cls is not None and \
+                not getattr(getattr(actions_cls, name, None),
+                            'is_rule_action', False):
+            raise AssertionError("Action {0} is not defined in class {1}"
+                                 .format(name, actions_cls.__name__))
+
+        def deferred_action(**params):
+            self.defer(name, params)
+        return deferred_action
+
+
+class BatchActionSink(object):
+    """ A sink running batches of deferred actions on `defined_actions`.
+
+    The entries of a batch are grouped by action. If `defined_actions` has a
+    method named after the action plus `suffix` (e.g. send_email_batch), it is
+    called once per group with the list of params; otherwise the action itself
+    is called once per entry.
+    """
+    def __init__(self, defined_actions, suffix='_batch'):
+        self.defined_actions = defined_actions
+        self.suffix = suffix
+
+    def __call__(self, entries):
+        groups = {}
+        order = []
+        for action_name, params, _ in entries:
+            if action_name not in groups:
+                groups[action_name] = []
+                order.append(action_name)
+            groups[action_name].append(params)
+
+        for action_name in order:
+            bulk_method = getattr(self.defined_actions,
+                                  action_name + self.suffix, None)
+            if bulk_method is not None:
+                bulk_method(groups[action_name])
+                continue
+            method = getattr(self.defined_actions, action_name)
+            for params in groups[action_name]:
+                method(**params)
@@ -1,41 +1,108 @@
+from .compiler import CompiledRuleSet, compile_rules
+from .explain import Explanation
 from .fields import FIELD_NO_INPUT
+from .profiling import Tracer, clock
 
 def run_all(rule_list,
             defined_variables,
             defined_actions,
-            stop_on_first_trigger=False):
+            stop_on_first_trigger=False,
+            cache_variables=False,
+            tracer=None):
+    """ Runs every rule in `rule_list`. Returns True if any rule was triggered.
+
+    - cache_variables - if True, each rule variable is computed at most once
+      for this call and its value is shared by every condition and rule that
+      uses it. Variables declared with `cache=False` are computed every time.
+    - tracer - a profiling.Tracer told the outcome and duration of every rule,
+      condition, variable fetch and action.
+    """
+    values = {} if cache_variables else None
 
     rule_was_triggered = False
     for rule in rule_list:
-        result = run(rule, defined_variables, defined_actions)
+        result = run(rule, defined_variables, defined_actions, tracer=tracer,
+                     values=values)
         if result:
             rule_was_triggered = True
             if stop_on_first_trigger:
                 return True
     return rule_was_triggered
 
-def run(rule, defined_variables, defined_actions):
+
+def run_batch(rule_list,
+              records,
+              variables_factory,
+              actions_factory,
+              stop_on_first_trigger=False,
+              cache_variables=False):
+    """ Runs the rules against every record in `records`, lazily yielding a
+    (record, rule_was_triggered) tuple per record.
+
+    `variables_factory` and `actions_factory` are called with each record and
+    return the variables and actions instances to run against - often they are
+    just the BaseVariables and BaseActions subclasses themselves.
+
+    The rules are compiled once (see compiler.compile_rules) against the
+    classes of the first record's instances, so an invalid rule raises when the
+    first record is evaluated. `rule_list` may also be an already compiled
+    ruleset.
+    """
+    ruleset = rule_list if isinstance(rule_list, CompiledRuleSet) else None
+    for record in records:
+        defined_variables = variables_factory(record)
+        defined_actions = actions_factory(record)
+        if ruleset is None:
+            ruleset = compile_rules(rule_list,
+                                    defined_variables.__class__,
+                                    defined_actions.__class__)
+        yield record, ruleset.run(defined_variables, defined_actions,
+                                  stop_on_first_trigger=stop_on_first_trigger,
+                                  cache_variables=cache_variables)
+
+
+def run(rule, defined_variables, defined_actions, tracer=None, explain=False,
+        values=None):
+    """ Runs a single rule. Returns True if it was triggered.
+
+    - tracer - a profiling.Tracer told the outcome and duration of every
+      condition, variable fetch and action.
+    - explain - if True, returns an explain.Explanation of the outcome of
+      every condition instead, which is truthy if the rule was triggered.
+    - values - a dict the values of the rule variables are memoized in, by
+      name. Pass the same dict to several runs to share them.
+    """
+    if tracer is not None or explain:
+        explanation = _run_traced(rule, defined_variables, defined_actions,
+                                  tracer or _NO_TRACER, values)
+        return explanation if explain else explanation.triggered
     conditions, actions = rule['conditions'], rule['actions']
-    rule_triggered = check_conditions_recursively(conditions, defined_variables)
+    rule_triggered = check_conditions_recursively(conditions,
+                                                  defined_variables, values)
     if rule_triggered:
         do_actions(actions, defined_actions)
         return True
     return False
 
 
-def check_conditions_recursively(conditions, defined_variables):
+_NO_TRACER = Tracer()
+
+
+def check_conditions_recursively(conditions, defined_variables, values=None):
     keys = list(conditions.keys())
     if keys == ['all']:
         assert len(conditions['all']) >= 1
         for condition in conditions['all']:
-            if not check_conditions_recursively(condition, defined_variables):
+            if not check_conditions_recursively(condition, defined_variables,
+                                                values):
                 return False
         return True
 
     elif keys == ['any']:
         assert len(conditions['any']) >= 1
         for condition in conditions['any']:
-            if check_conditions_recursively(condition, defined_variables):
+            if check_conditions_recursively(condition, defined_variables,
+                                            values):
                 return True
         return False
 
@@ -43,30 +110,38 @@ def check_conditions_recursively(conditions, defined_variables):
         # help prevent errors - any and all can only be in the condition dict
         # if they're the only item
         assert not ('any' in keys or 'all' in keys)
-        return check_condition(conditions, defined_variables)
+        return check_condition(conditions, defined_variables, values)
+
 
-def check_condition(condition, defined_variables):
+def check_condition(condition, defined_variables, values=None):
     """ Checks a single rule condition - the condition will be made up of
     variables, values, and the comparison operator. The defined_variables
     object must have a variable defined for any variables in this condition.
     """
     name, op, value = condition['name'], condition['operator'], condition['value']
-    operator_type = _get_variable_value(defined_variables, name)
+    operator_type = _get_variable_value(defined_variables, name, values)
     return _do_operator_comparison(operator_type, op, value)
 
-def _get_variable_value(defined_variables, name):
+
+def _get_variable_value(defined_variables, name, values=None):
     """ Call the function provided on the defined_variables object with the
     given name (raise exception if that doesn't exist) and casts it to the
-    specified type.
+    specified type. If `values` is a dict, the result is memoized in it,
+    unless the variable was declared with `cache=False`.
 
     Returns an instance of operators.BaseType
     """
+    if values is not None and name in values:
+        return values[name]
     def fallback(*args, **kwargs):
         raise AssertionError("Variable {0} is not defined in class {1}".format(
                 name, defined_variables.__class__.__name__))
     method = getattr(defined_variables, name, fallback)
     val = method()
-    return method.field_type(val)
+    operator_type = method.field_type(val)
+    if values is not None and getattr(method, 'cache', True):
+        values[name] = operator_type
+    return operator_type
 
 def _do_operator_comparison(operator_type, operator_name, comparison_value):
     """ Finds the method on the given operator_type and compares it to the
@@ -94,3 +169,58 @@ def do_actions(actions, defined_actions):
         params = action.get('params') or {}
         method = getattr(defined_actions, method_name, fallback)
         method(**params)
+
+
+def _run_traced(rule, defined_variables, defined_actions, tracer, values):
+    """ run, reporting every step to `tracer`. Returns an Explanation. """
+    start = clock()
+    conditions = _check_conditions_traced(rule['conditions'],
+                                          defined_variables, tracer, values)
+    rule_triggered = conditions['result']
+    if rule_triggered:
+        for action in rule['actions']:
+            action_start = clock()
+            do_actions([action], defined_actions)
+            tracer.action_run(action['name'], action.get('params') or {},
+                              clock() - action_start)
+    tracer.rule_checked(rule, rule_triggered, clock() - start)
+    return Explanation(rule, rule_triggered, conditions)
+
+
+def _check_conditions_traced(conditions, defined_variables, tracer, values):
+    """ check_conditions_recursively, reporting every step to `tracer`.
+    Returns the node of the explanation (see explain) of `conditions`.
+    """
+    keys = list(conditions.keys())
+    if keys == ['all'] or keys == ['any']:
+        key = keys[0]
+        assert len(conditions[key]) >= 1
+        # the outcome that short-circuits this node
+        decisive = key == 'any'
+        children = []
+        for number, condition in enumerate(conditions[key]):
+            child = _check_conditions_traced(condition, defined_variables,
+                                             tracer, values)
+            children.append(child)
+            if child['result'] == decisive:
+                children.extend({'skipped': skipped}
+                                for skipped in conditions[key][number + 1:])
+                return {key: children, 'result': decisive}
+        return {key: children, 'result': not decisive}
+    assert not ('any' in keys or 'all' in keys)
+
+    start = clock()
+    operator_type = _get_variable_value(defined_variables, conditions['name'],
+                                        values)
+    fetched = clock()
+    tracer.variable_fetched(conditions['name'], operator_type.value,
+                            fetched - start)
+    # operators like matches_regex return a match object rather than a bool
+    result = bool(_do_operator_comparison(operator_type,
+                                          conditions['operator'],
+                                          conditions['value']))
+    tracer.condition_checked(conditions, result, clock() - fetched)
+    node = dict(conditions)
+    node['variable_value'] = operator_type.value
+    node['result'] = result
+    return node
@@ -0,0 +1,95 @@
+""" Explanations of why a rule was, or wasn't, triggered.
+
+engine.run(rule, variables, actions, explain=True) returns an Explanation
+instead of a bool. Its `conditions` mirror the rule's conditions, as nested
+dicts:
+
+- a checked condition is a copy of it with the value its variable returned
+  and its outcome, e.g. {'name': 'total', 'operator': 'greater_than',
+  'value': 100, 'variable_value': 150, 'result': True}
+- an all/any has its children and its outcome, e.g.
+  {'all': [...], 'result': False}
+- a condition skipped by short-circuiting is {'skipped': condition}, where
+  condition is the original condition, not a copy
+
+Only what was evaluated anyway is recorded, so it's cheap enough to explain
+a sample of the production traffic:
+
+    explain = random.random() < 0.01
+    result = run(rule, variables, actions, explain=explain)
+    if explain:
+        log.info('%s', result.to_dict())
+"""
+from six import string_types
+
+
+class Explanation(object):
+    """ The outcome of a rule and of each of its conditions. It's truthy if
+    the rule was triggered, like the result of engine.run.
+    """
+    __slots__ = ('rule', 'triggered', 'conditions')
+
+    def __init__(self, rule, triggered, conditions):
+        self.rule = rule
+        self.triggered = triggered
+        self.conditions = conditions
+
+    def __bool__(self):
+        return self.triggered
+    __nonzero__ = __bool__
+
+    def to_dict(self):
+        return {'triggered': self.triggered, 'conditions': self.conditions}
+
+    def failed_conditions(self):
+        """ Returns the checked conditions that were false. """
+        return [node for node in _iter_checked(self.conditions)
+                if not node['result']]
+
+    def __str__(self):
+        lines = ['{0}: {1}'.format(self.rule.get('name', 'rule'),
+                                   'triggered' if self.triggered
+                                   else 'not triggered')]
+        _format(self.conditions, 1, lines)
+        return '\n'.join(lines)
+
+
+def _iter_checked(node):
+    for key in ('all', 'any'):
+        if key in node:
+            for child in node[key]:
+                for checked in _iter_checked(child):
+                    yield checked
+            return
+    if 'skipped' not in node:
+        yield node
+
+
+def _format(node, depth, lines):
+    indent = '  ' * depth
+    if 'skipped' in node:
+        lines.append('{0}skipped {1}'.format(indent,
+                                             _describe(node['skipped'])))
+        return
+    for key in ('all', 'any'):
+        if key in node:
+            lines.append('{0}{1} -> {2}'.format(indent, key, node['result']))
+            for child in node[key]:
+                _format(child, depth + 1, lines)
+            return
+    lines.append('{0}{1}, variable was {2} -> {3}'.format(
+        indent, _describe(node), _show(node['variable_value']),
+        node['result']))
+
+
+def _describe(condition):
+    for key in ('all', 'any'):
+        if key in condition:
+            return '{0} of {1} conditions'.format(key, len(condition[key]))
+    return '{0} {1} {2}'.format(condition['name'], condition['operator'],
+                                _show(condition['value']))
+
+
+def _show(value):
+    # quote strings, but show Decimals as numbers
+    return repr(value) if isinstance(value, string_types) else str(value)
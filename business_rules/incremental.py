@@ -0,0 +1,149 @@
+""" Incremental re-evaluation of a ruleset as records change.
+
+compile_incremental builds the same shared condition graph as
+network.compile_network, and an IncrementalEvaluator remembers the outcome
+of every node, and whether each rule was triggered, per record key. When
+told which variables of a record changed, it only forgets the outcomes of
+the conditions that use them and of the all/any nodes above those, and only
+re-checks the rules depending on them:
+
+    evaluator = compile_incremental(rules, ProfileVariables, ProfileActions)
+    evaluator.update(profile['id'], ProfileVariables(profile))
+    ...
+    profile['job_title'] = 'CTO'
+    for rule, triggered in evaluator.update(profile['id'],
+                                            ProfileVariables(profile),
+                                            changed=['job_title']):
+        ...
+
+Every other outcome is trusted to be unchanged, so `changed` must name every
+variable whose value may have changed - including variables computed from
+the changed fields.
+"""
+from .compiler import compile_action, get_variable_method, run_actions
+from .network import _NetworkBuilder
+
+
+def compile_incremental(rule_list, variables_cls, actions_cls):
+    """ Compiles `rule_list` into an IncrementalEvaluator. Raises
+    AssertionError if a rule references a variable, operator or action that
+    doesn't exist.
+    """
+    builder = _NetworkBuilder(variables_cls)
+    rules = []
+    for rule in rule_list:
+        root, check = builder._add(rule['conditions'])
+        actions = [compile_action(action, actions_cls)
+                   for action in rule['actions']]
+        rules.append((rule, root, check, actions))
+    return IncrementalEvaluator(rules, builder, variables_cls)
+
+
+class IncrementalEvaluator(object):
+    """ Keeps the state of a ruleset built by compile_incremental for any
+    number of records, identified by hashable keys.
+    """
+    def __init__(self, rules, builder, variables_cls):
+        self.rules = rules
+        self.node_count = builder.node_count
+        self.variables_cls = variables_cls
+        self._dependents = _dependents(rules, builder)
+        # record key -> (node outcomes, whether each rule is triggered)
+        self._states = {}
+
+    def update(self, record_key, defined_variables, changed=None,
+               defined_actions=None):
+        """ Re-evaluates the rules for the record identified by `record_key`
+        and returns a (rule, triggered) tuple for each rule whose triggered
+        state flipped, in rule order.
+
+        - changed - names of the variables that changed since the last
+          update of this record. Every rule is re-evaluated if it's None, or
+          if the record wasn't seen before; a new record has no rule
+          triggered.
+        - defined_actions - if given, the actions of the rules that became
+          triggered are run on it.
+        """
+        state = self._states.get(record_key)
+        if state is None or changed is None:
+            outcomes = [None] * self.node_count
+            triggered = state[1] if state else [False] * len(self.rules)
+            numbers = range(len(self.rules))
+        else:
+            outcomes, triggered = state
+            nodes, numbers = self._affected(changed)
+            for index in nodes:
+                outcomes[index] = None
+        self._states[record_key] = (outcomes, triggered)
+
+        values = {}
+        flipped = []
+        try:
+            for number in numbers:
+                rule, _, check, actions = self.rules[number]
+                result = check(defined_variables, values, outcomes)
+                if result != triggered[number]:
+                    triggered[number] = result
+                    flipped.append((rule, result))
+                    if result and defined_actions is not None:
+                        run_actions(actions, defined_actions)
+        except Exception:
+            # some rules weren't re-checked, start over on the next update
+            del self._states[record_key]
+            raise
+        return flipped
+
+    def triggered_rules(self, record_key):
+        """ Returns the rules triggered for the record, as of its last
+        update.
+        """
+        state = self._states.get(record_key)
+        if state is None:
+            return []
+        return [rule for (rule, _, _, _), triggered
+                in zip(self.rules, state[1]) if triggered]
+
+    def forget(self, record_key):
+        """ Drops the state kept for the record, if any. """
+        self._states.pop(record_key, None)
+
+    def __len__(self):
+        return len(self._states)
+
+    def _affected(self, changed):
+        nodes, numbers = set(), set()
+        for name in changed:
+            if name not in self._dependents:
+                # raises if it isn't a variable at all
+                get_variable_method(self.variables_cls, name)
+                continue
+            variable_nodes, variable_numbers = self._dependents[name]
+            nodes.update(variable_nodes)
+            numbers.update(variable_numbers)
+        return nodes, sorted(numbers)
+
+
+def _dependents(rules, builder):
+    """ Returns a dict of variable name -> (indexes of the nodes depending on
+    it, numbers of the rules depending on it).
+    """
+    parents = {}
+    for index, children in builder.children.items():
+        for child in children:
+            parents.setdefault(child, set()).add(index)
+
+    roots = {}
+    for number, (_, root, _, _) in enumerate(rules):
+        roots.setdefault(root, []).append(number)
+
+    dependents = {}
+    for index, name in builder.variable_names.items():
+        nodes, numbers = dependents.setdefault(name, (set(), set()))
+        pending = [index]
+        while pending:
+            node = pending.pop()
+            if node not in nodes:
+                nodes.add(node)
+                numbers.update(roots.get(node, ()))
+                pending.extend(parents.get(node, ()))
+    return dependents
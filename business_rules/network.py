@@ -0,0 +1,143 @@
+""" A condition network shared by all the rules of a ruleset.
+
+compile_network builds a single graph out of every rule's conditions, where
+identical conditions - the same (name, operator, value) - and identical
+all/any nodes are merged into one node, no matter how many rules use them.
+While running, each node's outcome is remembered for the current record and
+handed to every rule that depends on it, so a condition shared by many rules
+is only evaluated once per record.
+
+Nodes are still evaluated lazily, in rule order and with the usual
+short-circuiting, so the rules trigger exactly as with run_all. As with
+cache_variables, outcomes are not recomputed if an action changes the record
+during the run.
+"""
+from .compiler import compile_action, compile_condition, run_actions
+from .utils import condition_key
+
+
+def compile_network(rule_list, variables_cls, actions_cls):
+    """ Compiles `rule_list` into a RuleNetwork. Raises AssertionError if a
+    rule references a variable, operator or action that doesn't exist.
+    """
+    builder = _NetworkBuilder(variables_cls)
+    rules = []
+    for rule in rule_list:
+        check = builder.add(rule['conditions'])
+        actions = [compile_action(action, actions_cls)
+                   for action in rule['actions']]
+        rules.append((check, actions))
+    return RuleNetwork(rules, builder.node_count, builder.condition_count)
+
+
+class RuleNetwork(object):
+    """ Runs a ruleset built by compile_network, with the same semantics as
+    engine.run_all.
+
+    - node_count - the number of distinct all/any/condition nodes
+    - condition_count - the number of distinct conditions
+    """
+    def __init__(self, rules, node_count, condition_count):
+        self.rules = rules
+        self.node_count = node_count
+        self.condition_count = condition_count
+
+    def run(self, defined_variables, defined_actions,
+            stop_on_first_trigger=False, cache_variables=False):
+        outcomes = [None] * self.node_count
+        values = {} if cache_variables else None
+        rule_was_triggered = False
+        for check, actions in self.rules:
+            if check(defined_variables, values, outcomes):
+                run_actions(actions, defined_actions)
+                rule_was_triggered = True
+                if stop_on_first_trigger:
+                    return True
+        return rule_was_triggered
+
+
+class _NetworkBuilder(object):
+
+    def __init__(self, variables_cls):
+        self.variables_cls = variables_cls
+        # node key -> (node index, node)
+        self.nodes = {}
+        self.condition_count = 0
+        # node index -> indexes of its children, for all/any nodes
+        self.children = {}
+        # node index -> name of its variable, for condition nodes
+        self.variable_names = {}
+
+    @property
+    def node_count(self):
+        return len(self.nodes)
+
+    def add(self, conditions):
+        return self._add(conditions)[1]
+
+    def _add(self, conditions):
+        keys = list(conditions.keys())
+        if keys == ['all'] or keys == ['any']:
+            kind = keys[0]
+            assert len(conditions[kind]) >= 1
+            children = [self._add(condition) for condition in conditions[kind]]
+            key = (kind, tuple(index for index, _ in children))
+            if key not in self.nodes:
+                checks = [check for _, check in children]
+                if kind == 'all':
+                    evaluate = _all_node(checks)
+                else:
+                    evaluate = _any_node(checks)
+                index = self._register(key, evaluate)
+                self.children[index] = [child for child, _ in children]
+            return self.nodes[key]
+
+        # help prevent errors - any and all can only be in the condition dict
+        # if they're the only item
+        assert not ('any' in keys or 'all' in keys)
+        key = ('condition',) + condition_key(conditions)
+        if key not in self.nodes:
+            check = compile_condition(conditions, self.variables_cls)
+            index = self._register(key, _condition_node(check))
+            self.variable_names[index] = conditions['name']
+            self.condition_count += 1
+        return self.nodes[key]
+
+    def _register(self, key, evaluate):
+        index = len(self.nodes)
+        self.nodes[key] = (index, _memoized(index, evaluate))
+        return index
+
+
+def _memoized(index, evaluate):
+    def node(defined_variables, values, outcomes):
+        outcome = outcomes[index]
+        if outcome is None:
+            outcome = outcomes[index] = evaluate(defined_variables, values,
+                                                 outcomes)
+        return outcome
+    return node
+
+
+def _condition_node(check):
+    def evaluate(defined_variables, values, outcomes):
+        return bool(check(defined_variables, values))
+    return evaluate
+
+
+def _all_node(checks):
+    def evaluate(defined_variables, values, outcomes):
+        for check in checks:
+            if not check(defined_variables, values, outcomes):
+                return False
+        return True
+    return evaluate
+
+
+def _any_node(checks):
+    def evaluate(defined_variables, values, outcomes):
+        for check in checks:
+            if check(defined_variables, values, outcomes):
+                return True
+        return False
+    return evaluate
@@ -1,14 +1,17 @@
 import inspect
-import re
-from functools import wraps
+from functools import partial, wraps
 from six import string_types, integer_types
 
 from .fields import (FIELD_TEXT, FIELD_NUMERIC, FIELD_NO_INPUT,
                      FIELD_SELECT, FIELD_SELECT_MULTIPLE)
-from .utils import fn_name_to_pretty_label, float_to_decimal
+from .utils import fn_name_to_pretty_label, float_to_decimal, regex_cache
 from decimal import Decimal, Inexact, Context
 
 class BaseType(object):
+    # subclasses should declare __slots__ too, so that their instances, of
+    # which there is one per evaluated variable, stay small
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = self._assert_valid_value_and_cast(value)
 
@@ -37,6 +40,11 @@ def type_operator(input_type, label=None,
     - assert_type_for_arguments - if True this patches the operator function
       so that arguments passed to it will have _assert_valid_value_and_cast
       called on them to make type errors explicit.
+
+    The original function is kept as the operator's `raw_operator`, and
+    `cast_arguments` tells whether its arguments need casting first. Callers
+    comparing against the same value many times, like the rule compiler, can
+    cast it once and call raw_operator directly.
     """
     def wrapper(func):
         func.is_operator = True
@@ -44,13 +52,17 @@ def type_operator(input_type, label=None,
             or fn_name_to_pretty_label(func.__name__)
         func.input_type = input_type
 
-        @wraps(func)
-        def inner(self, *args, **kwargs):
-            if assert_type_for_arguments:
-                args = [self._assert_valid_value_and_cast(arg) for arg in args]
-                kwargs = dict((k, self._assert_valid_value_and_cast(v))
-                              for k, v in kwargs.items())
-            return func(self, *args, **kwargs)
+        if assert_type_for_arguments:
+            @wraps(func)
+            def inner(self, *args, **kwargs):
+                cast = self._assert_valid_value_and_cast
+                if kwargs:
+                    kwargs = dict((k, cast(v)) for k, v in kwargs.items())
+                return func(self, *[cast(arg) for arg in args], **kwargs)
+        else:
+            inner = func
+        inner.raw_operator = func
+        inner.cast_arguments = assert_type_for_arguments
         return inner
     return wrapper
 
@@ -59,8 +71,10 @@ def type_operator(input_type, label=None,
 class StringType(BaseType):
 
     name = "string"
+    __slots__ = ()
 
-    def _assert_valid_value_and_cast(self, value):
+    @staticmethod
+    def _assert_valid_value_and_cast(value):
         value = value or ""
         if not isinstance(value, string_types):
             raise AssertionError("{0} is not a valid string type.".
@@ -69,31 +83,31 @@ class StringType(BaseType):
 
     @type_operator(FIELD_TEXT)
     def equal_to(self, other_string):
-        return self.value == other_string
+        return _string_equal_to(self.value, other_string)
 
     @type_operator(FIELD_TEXT, label="Equal To (case insensitive)")
     def equal_to_case_insensitive(self, other_string):
-        return self.value.lower() == other_string.lower()
+        return _string_equal_to_case_insensitive(self.value, other_string)
 
     @type_operator(FIELD_TEXT)
     def starts_with(self, other_string):
-        return self.value.startswith(other_string)
+        return _string_starts_with(self.value, other_string)
 
     @type_operator(FIELD_TEXT)
     def ends_with(self, other_string):
-        return self.value.endswith(other_string)
+        return _string_ends_with(self.value, other_string)
 
     @type_operator(FIELD_TEXT)
     def contains(self, other_string):
-        return other_string in self.value
+        return _string_contains(self.value, other_string)
 
     @type_operator(FIELD_TEXT)
     def matches_regex(self, regex):
-        return re.search(regex, self.value)
+        return _string_matches_regex(self.value, regex_cache.compile(regex))
 
     @type_operator(FIELD_NO_INPUT)
     def non_empty(self):
-        return bool(self.value)
+        return _string_non_empty(self.value)
 
 
 @export_type
@@ -101,6 +115,7 @@ class NumericType(BaseType):
     EPSILON = Decimal('0.000001')
 
     name = "numeric"
+    __slots__ = ()
 
     @staticmethod
     def _assert_valid_value_and_cast(value):
@@ -117,31 +132,54 @@ class NumericType(BaseType):
 
     @type_operator(FIELD_NUMERIC)
     def equal_to(self, other_numeric):
-        return abs(self.value - other_numeric) <= self.EPSILON
+        return _numeric_equal_to(self.EPSILON, self.value, other_numeric)
 
     @type_operator(FIELD_NUMERIC)
     def greater_than(self, other_numeric):
-        return (self.value - other_numeric) > self.EPSILON
+        return _numeric_greater_than(self.EPSILON, self.value, other_numeric)
 
     @type_operator(FIELD_NUMERIC)
     def greater_than_or_equal_to(self, other_numeric):
-        return self.greater_than(other_numeric) or self.equal_to(other_numeric)
+        return _numeric_greater_than_or_equal_to(self.EPSILON, self.value,
+                                                 other_numeric)
 
     @type_operator(FIELD_NUMERIC)
     def less_than(self, other_numeric):
-        return (other_numeric - self.value) > self.EPSILON
+        return _numeric_less_than(self.EPSILON, self.value, other_numeric)
 
     @type_operator(FIELD_NUMERIC)
     def less_than_or_equal_to(self, other_numeric):
-        return self.less_than(other_numeric) or self.equal_to(other_numeric)
+        return _numeric_less_than_or_equal_to(self.EPSILON, self.value,
+                                              other_numeric)
+
+
+class FloatNumericType(NumericType):
+    """ A NumericType comparing native floats and ints instead of Decimals,
+    with the same epsilon. Faster, at the cost of float rounding; used by
+    rulesets compiled with float_numbers=True.
+    """
+    EPSILON = float(NumericType.EPSILON)
+    __slots__ = ()
+
+    @staticmethod
+    def _assert_valid_value_and_cast(value):
+        if isinstance(value, (float, integer_types)):
+            return value
+        if isinstance(value, Decimal):
+            return float(value)
+        else:
+            raise AssertionError("{0} is not a valid numeric type.".
+                                 format(value))
 
 
 @export_type
 class BooleanType(BaseType):
 
     name = "boolean"
+    __slots__ = ()
 
-    def _assert_valid_value_and_cast(self, value):
+    @staticmethod
+    def _assert_valid_value_and_cast(value):
         if type(value) != bool:
             raise AssertionError("{0} is not a valid boolean type".
                                  format(value))
@@ -149,16 +187,69 @@ class BooleanType(BaseType):
 
     @type_operator(FIELD_NO_INPUT)
     def is_true(self):
-        return self.value
+        return _boolean_is_true(self.value)
 
     @type_operator(FIELD_NO_INPUT)
     def is_false(self):
-        return not self.value
+        return _boolean_is_false(self.value)
+
+
+def fold_item(value):
+    """ Returns `value` as select types compare it: lowercased if it's a
+    string.
+    """
+    if isinstance(value, string_types):
+        return value.lower()
+    return value
+
+
+class FoldedSet(frozenset):
+    """ A frozenset of select items passed through fold_item. The select
+    operators accept it wherever they take several items, and don't fold it
+    again.
+    """
+
+
+def fold_items(items):
+    """ Returns `items` as a FoldedSet, or None if some of them aren't
+    hashable.
+    """
+    if isinstance(items, FoldedSet):
+        return items
+    try:
+        return FoldedSet(fold_item(item) for item in items)
+    except TypeError:
+        return None
+
+
+def _folded_value(select):
+    # computed once per instance, i.e. once per evaluated variable
+    try:
+        return select._folded
+    except AttributeError:
+        select._folded = fold_items(select.value)
+        return select._folded
+
+
+def _select_contains(items, folded, item):
+    """ Whether `item` is one of `items`, `folded` being fold_items(items). """
+    if folded is not None:
+        try:
+            return fold_item(item) in folded
+        except TypeError:
+            # unhashable item
+            pass
+    for val in items:
+        if SelectType._case_insensitive_equal_to(val, item):
+            return True
+    return False
+
 
 @export_type
 class SelectType(BaseType):
 
     name = "select"
+    __slots__ = ('_folded',)
 
     def _assert_valid_value_and_cast(self, value):
         if not hasattr(value, '__iter__'):
@@ -176,23 +267,19 @@ class SelectType(BaseType):
 
     @type_operator(FIELD_SELECT, assert_type_for_arguments=False)
     def contains(self, other_value):
-        for val in self.value:
-            if self._case_insensitive_equal_to(val, other_value):
-                return True
-        return False
+        return _select_contains(self.value, _folded_value(self), other_value)
 
     @type_operator(FIELD_SELECT, assert_type_for_arguments=False)
     def does_not_contain(self, other_value):
-        for val in self.value:
-            if self._case_insensitive_equal_to(val, other_value):
-                return False
-        return True
+        return not _select_contains(self.value, _folded_value(self),
+                                    other_value)
 
 
 @export_type
 class SelectMultipleType(BaseType):
 
     name = "select_multiple"
+    __slots__ = ('_folded',)
 
     def _assert_valid_value_and_cast(self, value):
         if not hasattr(value, '__iter__'):
@@ -202,31 +289,40 @@ class SelectMultipleType(BaseType):
 
     @type_operator(FIELD_SELECT_MULTIPLE)
     def contains_all(self, other_value):
-        select = SelectType(self.value)
+        folded, other_folded = _folded_value(self), fold_items(other_value)
+        if folded is not None and other_folded is not None:
+            return other_folded <= folded
         for other_val in other_value:
-            if not select.contains(other_val):
+            if not _select_contains(self.value, folded, other_val):
                 return False
         return True
 
     @type_operator(FIELD_SELECT_MULTIPLE)
     def is_contained_by(self, other_value):
-        other_select_multiple = SelectMultipleType(other_value)
-        return other_select_multiple.contains_all(self.value)
+        folded, other_folded = _folded_value(self), fold_items(other_value)
+        if folded is not None and other_folded is not None:
+            return folded <= other_folded
+        for val in self.value:
+            if not _select_contains(other_value, other_folded, val):
+                return False
+        return True
 
     @type_operator(FIELD_SELECT_MULTIPLE)
     def shares_at_least_one_element_with(self, other_value):
-        select = SelectType(self.value)
+        folded, other_folded = _folded_value(self), fold_items(other_value)
+        if folded is not None and other_folded is not None:
+            return not folded.isdisjoint(other_folded)
         for other_val in other_value:
-            if select.contains(other_val):
+            if _select_contains(self.value, folded, other_val):
                 return True
         return False
 
     @type_operator(FIELD_SELECT_MULTIPLE)
     def shares_exactly_one_element_with(self, other_value):
         found_one = False
-        select = SelectType(self.value)
+        folded = _folded_value(self)
         for other_val in other_value:
-            if select.contains(other_val):
+            if _select_contains(self.value, folded, other_val):
                 if found_one:
                     return False
                 found_one = True
@@ -235,3 +331,121 @@ class SelectMultipleType(BaseType):
     @type_operator(FIELD_SELECT_MULTIPLE)
     def shares_no_elements_with(self, other_value):
         return not self.shares_at_least_one_element_with(other_value)
+
+
+# The operators of the built-in scalar types, as functions of cast values:
+# the types' operators call them, and they're registered as value operators
+# so that evaluating a condition doesn't need a field type instance.
+# Subclasses aren't included, as they may override the operators or the
+# casting.
+VALUE_TYPES = (StringType, NumericType, FloatNumericType, BooleanType)
+
+_VALUE_OPERATORS = {}
+
+
+def value_operator(field_type, name, prepare=None):
+    """ Registers a function taking a value cast by `field_type` (and the
+    cast comparison value, unless the operator has no input) as the value
+    version of operator `name` of `field_type`. `prepare`, if given, turns
+    the cast comparison value into the one passed to the function.
+    """
+    def wrapper(func):
+        func.prepare = prepare
+        _VALUE_OPERATORS[(field_type, name)] = func
+        return func
+    return wrapper
+
+
+def get_value_operator(field_type, name):
+    """ Returns the value version of operator `name` of `field_type`, or None
+    if there isn't one.
+    """
+    return _VALUE_OPERATORS.get((field_type, name))
+
+
+@value_operator(StringType, 'equal_to')
+def _string_equal_to(value, other_string):
+    return value == other_string
+
+
+@value_operator(StringType, 'equal_to_case_insensitive')
+def _string_equal_to_case_insensitive(value, other_string):
+    return value.lower() == other_string.lower()
+
+
+@value_operator(StringType, 'starts_with')
+def _string_starts_with(value, other_string):
+    return value.startswith(other_string)
+
+
+@value_operator(StringType, 'ends_with')
+def _string_ends_with(value, other_string):
+    return value.endswith(other_string)
+
+
+@value_operator(StringType, 'contains')
+def _string_contains(value, other_string):
+    return other_string in value
+
+
+@value_operator(StringType, 'matches_regex', prepare=regex_cache.compile)
+def _string_matches_regex(value, regex):
+    return regex.search(value)
+
+
+@value_operator(StringType, 'non_empty')
+def _string_non_empty(value):
+    return bool(value)
+
+
+def _numeric_equal_to(epsilon, value, other_numeric):
+    return abs(value - other_numeric) <= epsilon
+
+
+def _numeric_greater_than(epsilon, value, other_numeric):
+    return (value - other_numeric) > epsilon
+
+
+def _numeric_greater_than_or_equal_to(epsilon, value, other_numeric):
+    # greater_than or equal_to, without casting other_numeric again
+    return (value - other_numeric) >= -epsilon
+
+
+def _numeric_less_than(epsilon, value, other_numeric):
+    return (other_numeric - value) > epsilon
+
+
+def _numeric_less_than_or_equal_to(epsilon, value, other_numeric):
+    # less_than or equal_to, without casting other_numeric again
+    return (other_numeric - value) >= -epsilon
+
+
+# The numeric comparisons by operator name. They take the epsilon first, and
+# only use arithmetic and comparisons, so they also work on NumPy arrays.
+NUMERIC_COMPARISONS = {
+    'equal_to': _numeric_equal_to,
+    'greater_than': _numeric_greater_than,
+    'greater_than_or_equal_to': _numeric_greater_than_or_equal_to,
+    'less_than': _numeric_less_than,
+    'less_than_or_equal_to': _numeric_less_than_or_equal_to,
+}
+
+
+def _numeric_value_operators(field_type):
+    for name, comparison in NUMERIC_COMPARISONS.items():
+        value_operator(field_type, name)(partial(comparison,
+                                                 field_type.EPSILON))
+
+
+_numeric_value_operators(NumericType)
+_numeric_value_operators(FloatNumericType)
+
+
+@value_operator(BooleanType, 'is_true')
+def _boolean_is_true(value):
+    return value
+
+
+@value_operator(BooleanType, 'is_false')
+def _boolean_is_false(value):
+    return not value
@@ -0,0 +1,165 @@
+""" Reordering of 'all'/'any' conditions so cheap, selective conditions are
+evaluated first.
+
+The children of an 'all' are evaluated until one fails and the children of an
+'any' until one holds, so the order doesn't change the outcome - only how many
+conditions (and variables) need to be evaluated to reach it. optimize_rules
+sorts the children by expected cost, using each variable's declared `cost`
+(see variables.rule_variable) and, when given ConditionStats, how often each
+condition held for the records observed so far:
+
+    stats = ConditionStats()
+    for profile in sample_of_profiles:
+        stats.observe(rules, ProfileVariables(profile))
+    rules = optimize_rules(rules, ProfileVariables, stats)
+
+The result is a new rule list, which can be run with run_all or compiled.
+
+This assumes the conditions are independent and free of side effects. A
+condition that only works when an earlier sibling holds - like `city` when
+`has_address` is true - must stay behind it: ConditionStats records the
+conditions that raised while observed, and those are never moved ahead of
+their earlier siblings, nor are later siblings moved ahead of them. Without
+stats, or if the records observed never made it raise, nothing keeps such a
+condition in place.
+"""
+from .compiler import get_variable_method
+from .engine import check_condition
+from .utils import condition_key
+
+# Probability that a condition holds when nothing has been observed for it
+DEFAULT_PROBABILITY = 0.5
+
+
+class ConditionStats(object):
+    """ Counts how often each distinct condition - by (name, operator, value)
+    - was evaluated and how often it held.
+    """
+    def __init__(self):
+        # condition key -> [times evaluated, times held]
+        self.counts = {}
+        # condition key -> times it raised
+        self.errors = {}
+
+    def record(self, condition, outcome):
+        counts = self.counts.setdefault(condition_key(condition), [0, 0])
+        counts[0] += 1
+        if outcome:
+            counts[1] += 1
+
+    def record_error(self, condition):
+        key = condition_key(condition)
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def raised(self, condition):
+        """ Returns whether `condition` raised when it was observed. """
+        return condition_key(condition) in self.errors
+
+    def probability(self, condition):
+        """ Returns the estimated probability that `condition` holds. """
+        evaluated, held = self.counts.get(condition_key(condition), (0, 0))
+        # Laplace smoothing, so it tends to DEFAULT_PROBABILITY when unobserved
+        return (held + 1.0) / (evaluated + 2.0)
+
+    def observe(self, rule_list, defined_variables):
+        """ Evaluates every distinct condition of `rule_list` against
+        `defined_variables`, without short-circuiting, and records the
+        outcomes. A condition that raises, e.g. because it relies on an
+        earlier one holding, is recorded as such instead. Meant to be called
+        on a sample of records.
+        """
+        seen = set()
+        for rule in rule_list:
+            for condition in _iter_conditions(rule['conditions']):
+                key = condition_key(condition)
+                if key in seen:
+                    continue
+                seen.add(key)
+                try:
+                    outcome = check_condition(condition, defined_variables)
+                except Exception:
+                    self.record_error(condition)
+                else:
+                    self.record(condition, outcome)
+
+
+def optimize_rules(rule_list, variables_cls, stats=None):
+    """ Returns a copy of `rule_list` in which the children of every 'all'
+    and 'any' are sorted so that the conditions most likely to decide the
+    outcome cheaply are evaluated first. Rules keep their order, and so do
+    the conditions `stats` saw raise (see the module docstring).
+    """
+    return [dict(rule, conditions=optimize_conditions(rule['conditions'],
+                                                      variables_cls, stats))
+            for rule in rule_list]
+
+
+def optimize_conditions(conditions, variables_cls, stats=None):
+    """ Returns a reordered copy of a (possibly nested) conditions dict. """
+    return _optimize(conditions, variables_cls, stats)[0]
+
+
+def _optimize(conditions, variables_cls, stats):
+    """ Returns the reordered conditions, their expected cost, the
+    probability that they hold, assuming conditions are independent, and
+    whether some of them raised when observed.
+    """
+    keys = list(conditions.keys())
+    if keys == ['all'] or keys == ['any']:
+        kind = keys[0]
+        assert len(conditions[kind]) >= 1
+        children = [_optimize(condition, variables_cls, stats)
+                    for condition in conditions[kind]]
+
+        # An 'all' stops at the first child that fails, an 'any' at the first
+        # that holds: evaluate first the children with the lowest cost per
+        # chance of stopping. The sort is stable, so ties keep their order.
+        def sort_key(child):
+            stop_probability = child[2] if kind == 'any' else 1 - child[2]
+            return _ratio(child[1], stop_probability)
+        # children that raised stay in place, and only the children between
+        # them are sorted
+        ordered, run = [], []
+        for child in children:
+            if child[3]:
+                ordered.extend(sorted(run, key=sort_key))
+                ordered.append(child)
+                run = []
+            else:
+                run.append(child)
+        ordered.extend(sorted(run, key=sort_key))
+
+        cost, carry_on = 0.0, 1.0
+        for _, child_cost, probability, _ in ordered:
+            cost += carry_on * child_cost
+            carry_on *= probability if kind == 'all' else 1 - probability
+        probability = carry_on if kind == 'all' else 1 - carry_on
+        return ({kind: [child[0] for child in ordered]}, cost, probability,
+                any(child[3] for child in ordered))
+
+    # help prevent errors - any and all can only be in the condition dict
+    # if they're the only item
+    assert not ('any' in keys or 'all' in keys)
+    variable = get_variable_method(variables_cls, conditions['name'])
+    if stats is None:
+        probability, raised = DEFAULT_PROBABILITY, False
+    else:
+        probability = stats.probability(conditions)
+        raised = stats.raised(conditions)
+    return conditions, getattr(variable, 'cost', 1), probability, raised
+
+
+def _ratio(cost, stop_probability):
+    if stop_probability <= 0:
+        return float('inf')
+    return cost / stop_probability
+
+
+def _iter_conditions(conditions):
+    keys = list(conditions.keys())
+    if keys == ['all'] or keys == ['any']:
+        for condition in conditions[keys[0]]:
+            for leaf in _iter_conditions(condition):
+                yield leaf
+    else:
+        yield conditions
@@ -0,0 +1,138 @@
+""" Running a ruleset over a stream of records with a pool of processes.
+
+The engine is pure Python, so a single process only ever uses one core.
+run_parallel sends the rule list to each worker process once, where it is
+compiled, and then hands out the records in chunks. The rule list, the
+factories and the records must be picklable - in practice the factories
+should be classes or functions defined at module level.
+"""
+import multiprocessing
+from collections import deque
+from itertools import chain, islice
+
+from .compiler import compile_rules, run_actions
+
+# State of the current worker process, set by _init_worker
+_worker = {}
+
+
+def run_parallel(rule_list,
+                 records,
+                 variables_factory,
+                 actions_factory,
+                 workers=None,
+                 chunk_size=256,
+                 actions_on_workers=False,
+                 stop_on_first_trigger=False,
+                 cache_variables=False):
+    """ Runs the rules against every record in `records` using `workers`
+    processes (by default, one per CPU), and lazily yields a
+    (record, rule_was_triggered) tuple per record, in the order of `records`.
+
+    `variables_factory` and `actions_factory` are called with each record, as
+    with engine.run_batch, and the rules are compiled against the classes of
+    the first record's instances before any worker is started. By default the
+    workers only evaluate the conditions, and the actions of the triggered
+    rules are run in this process; with `actions_on_workers=True` the workers
+    run them instead. Either way, actions can't affect the conditions of the
+    later rules for the same record as they can with run_all.
+
+    At most two chunks per worker are in flight at any time, so `records` can
+    be an unbounded iterator.
+    """
+    records = iter(records)
+    for first in records:
+        records = chain([first], records)
+        break
+    else:
+        return
+
+    variables_cls = variables_factory(first).__class__
+    actions_cls = actions_factory(first).__class__
+    ruleset = compile_rules(rule_list, variables_cls, actions_cls)
+
+    workers = workers or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(
+        workers, initializer=_init_worker,
+        initargs=(rule_list, variables_cls, actions_cls,
+                  variables_factory, actions_factory,
+                  stop_on_first_trigger, cache_variables))
+    run_chunk = _run_chunk_with_actions if actions_on_workers else _run_chunk
+    pending = deque()
+    try:
+        for chunk in _chunks(records, chunk_size):
+            pending.append((chunk, pool.apply_async(run_chunk, (chunk,))))
+            while len(pending) >= 2 * workers or \
+                    (pending and pending[0][1].ready()):
+                for result in _chunk_results(pending.popleft(), ruleset,
+                                             actions_factory,
+                                             actions_on_workers):
+                    yield result
+        while pending:
+            for result in _chunk_results(pending.popleft(), ruleset,
+                                         actions_factory, actions_on_workers):
+                yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _chunk_results(pending_chunk, ruleset, actions_factory,
+                   actions_on_workers):
+    chunk, async_result = pending_chunk
+    for record, result in zip(chunk, async_result.get()):
+        if actions_on_workers:
+            yield record, result
+            continue
+        # result holds the positions of the triggered rules
+        if result:
+            defined_actions = actions_factory(record)
+            for position in result:
+                run_actions(ruleset.rules[position].actions, defined_actions)
+        yield record, bool(result)
+
+
+def _chunks(records, chunk_size):
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _init_worker(rule_list, variables_cls, actions_cls,
+                 variables_factory, actions_factory,
+                 stop_on_first_trigger, cache_variables):
+    _worker.clear()
+    _worker.update(ruleset=compile_rules(rule_list, variables_cls,
+                                         actions_cls),
+                   variables_factory=variables_factory,
+                   actions_factory=actions_factory,
+                   stop_on_first_trigger=stop_on_first_trigger,
+                   cache_variables=cache_variables)
+
+
+def _run_chunk(chunk):
+    """ Returns the positions of the triggered rules for each record. """
+    ruleset = _worker['ruleset']
+    variables_factory = _worker['variables_factory']
+    return [ruleset.triggered_rules(
+                variables_factory(record),
+                stop_on_first_trigger=_worker['stop_on_first_trigger'],
+                cache_variables=_worker['cache_variables'])
+            for record in chunk]
+
+
+def _run_chunk_with_actions(chunk):
+    """ Runs the rules, with their actions, and returns whether any rule was
+    triggered for each record.
+    """
+    ruleset = _worker['ruleset']
+    variables_factory = _worker['variables_factory']
+    actions_factory = _worker['actions_factory']
+    return [ruleset.run(
+                variables_factory(record), actions_factory(record),
+                stop_on_first_trigger=_worker['stop_on_first_trigger'],
+                cache_variables=_worker['cache_variables'])
+            for record in chunk]
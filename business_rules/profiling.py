@@ -0,0 +1,173 @@
+""" Instrumentation of rule evaluation.
+
+Pass a tracer to engine.run_all or engine.run and it's told how long every
+rule, condition, variable fetch and action took, and what it resulted in:
+
+    profiler = Profiler()
+    for product in products:
+        run_all(rules, ProductVariables(product), ProductActions(product),
+                tracer=profiler)
+    print(profiler.report())
+
+Tracer is the no-op base class to subclass for custom instrumentation, and
+Profiler aggregates the timings into the hottest variables, the slowest
+operators and the hit ratio of each rule.
+"""
+import time
+from collections import OrderedDict
+
+clock = getattr(time, 'perf_counter', time.time)
+
+
+class Tracer(object):
+    """ Receives the outcome and duration, in seconds, of each step of rule
+    evaluation. Every method does nothing - override the ones you need.
+    """
+    def variable_fetched(self, name, value, seconds):
+        """ The rule variable `name` returned `value`. """
+
+    def condition_checked(self, condition, result, seconds):
+        """ The operator of the single `condition` returned `result`. The time
+        spent fetching its variable is reported to variable_fetched, and
+        isn't included in `seconds`.
+        """
+
+    def action_run(self, name, params, seconds):
+        """ The action `name` ran with `params`. """
+
+    def rule_checked(self, rule, triggered, seconds):
+        """ `rule` was checked, and its actions run if it was `triggered`;
+        `seconds` covers both.
+        """
+
+
+class Timing(object):
+    """ Number of calls and the total time they took. """
+    __slots__ = ('calls', 'seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+
+    def add(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+
+    @property
+    def mean(self):
+        return self.seconds / self.calls if self.calls else 0.0
+
+    def __repr__(self):
+        return 'Timing(calls={0}, seconds={1!r})'.format(self.calls,
+                                                         self.seconds)
+
+
+class RuleStats(Timing):
+    """ Timing of the checks of a rule, and how many of them triggered it. """
+    __slots__ = ('hits',)
+
+    def __init__(self):
+        super(RuleStats, self).__init__()
+        self.hits = 0
+
+    @property
+    def hit_ratio(self):
+        return self.hits / float(self.calls) if self.calls else 0.0
+
+
+class Profiler(Tracer):
+    """ A tracer aggregating timings per variable name, operator name, action
+    name and rule. Rules are told apart by identity, so keep passing the same
+    rule dicts.
+    """
+    def __init__(self):
+        self.variables = {}
+        self.operators = {}
+        self.actions = {}
+        self._rules = OrderedDict()
+
+    def variable_fetched(self, name, value, seconds):
+        _timing(self.variables, name).add(seconds)
+
+    def condition_checked(self, condition, result, seconds):
+        _timing(self.operators, condition['operator']).add(seconds)
+
+    def action_run(self, name, params, seconds):
+        _timing(self.actions, name).add(seconds)
+
+    def rule_checked(self, rule, triggered, seconds):
+        try:
+            stats = self._rules[id(rule)][1]
+        except KeyError:
+            # keep a reference to the rule so its id isn't reused
+            stats = RuleStats()
+            self._rules[id(rule)] = (rule, stats)
+        stats.add(seconds)
+        if triggered:
+            stats.hits += 1
+
+    @property
+    def rules(self):
+        """ A list of (rule, RuleStats) tuples, in the order the rules were
+        first checked.
+        """
+        return list(self._rules.values())
+
+    def hottest_variables(self, count=10):
+        """ Returns the `count` (name, Timing) tuples of the variables that
+        took the most time overall.
+        """
+        return _slowest(self.variables, count)
+
+    def slowest_operators(self, count=10):
+        """ Returns the `count` (operator name, Timing) tuples of the
+        operators that took the most time overall.
+        """
+        return _slowest(self.operators, count)
+
+    def rule_hit_ratios(self):
+        """ Returns a (rule, hit ratio) tuple per rule checked. """
+        return [(rule, stats.hit_ratio) for rule, stats in self.rules]
+
+    def reset(self):
+        self.__init__()
+
+    def report(self, count=10):
+        """ Returns the hottest variables, the slowest operators and the
+        rules that took the most time, with their hit ratios, as text.
+        """
+        lines = ['Hottest variables:']
+        lines.extend(_timing_line(name, timing)
+                     for name, timing in self.hottest_variables(count))
+        lines.append('Slowest operators:')
+        lines.extend(_timing_line(name, timing)
+                     for name, timing in self.slowest_operators(count))
+        lines.append('Slowest rules:')
+        rules = sorted(enumerate(self.rules),
+                       key=lambda item: -item[1][1].seconds)[:count]
+        for number, (rule, stats) in rules:
+            lines.append('{0} hit ratio {1:.1%}'.format(
+                _timing_line(_rule_name(rule, number), stats),
+                stats.hit_ratio))
+        return '\n'.join(lines)
+
+
+def _timing(timings, key):
+    try:
+        return timings[key]
+    except KeyError:
+        timing = timings[key] = Timing()
+        return timing
+
+
+def _slowest(timings, count):
+    return sorted(timings.items(), key=lambda item: -item[1].seconds)[:count]
+
+
+def _timing_line(name, timing):
+    return '  {0:<40} {1:>8} calls {2:>10.6f}s total {3:>10.6f}s mean'.format(
+        name, timing.calls, timing.seconds, timing.mean)
+
+
+def _rule_name(rule, number):
+    return rule.get('name') or 'rule #{0}'.format(number)
@@ -0,0 +1,125 @@
+""" A compiled ruleset that can be replaced while it's being run.
+
+RuleSet holds the current version of a ruleset. Any number of threads can
+run it while a new rule list is validated and compiled, by reload in the
+caller's thread or by reload_in_background; the new version then replaces
+the old one with a single attribute assignment. Running never takes a lock:
+a run reads the current version once, and only ever sees that version, so
+it's never interrupted nor sees a half-updated ruleset.
+
+    rules = RuleSet(load_rules(), ProductVariables, ProductActions)
+
+    # request threads
+    rules.run(ProductVariables(product), ProductActions(product))
+
+    # a timer thread
+    rules.reload_in_background(load_rules())
+
+If the new rule list is invalid, the current version is kept.
+"""
+import threading
+from collections import namedtuple
+
+from .compiler import compile_rules, ruleset_cache
+from .utils import ruleset_fingerprint
+
+RuleSetVersion = namedtuple('RuleSetVersion',
+                            ['number', 'fingerprint', 'rule_list', 'compiled'])
+
+
+class RuleSet(object):
+    """ Holds the current RuleSetVersion of a ruleset compiled from a rule
+    list with `compiler`, against `variables_cls` and `actions_cls`, with
+    the compile `options`. The first version is compiled by the
+    constructor, and raises AssertionError if the rule list is invalid.
+
+    - cache - a compiler.RulesetCache the rulesets are compiled through, by
+      default the process-wide one. None compiles every version anew.
+    """
+    def __init__(self, rule_list, variables_cls, actions_cls,
+                 compiler=compile_rules, cache=ruleset_cache, **options):
+        self.variables_cls = variables_cls
+        self.actions_cls = actions_cls
+        self.compiler = compiler
+        self.cache = cache
+        self.options = options
+        # serializes reloads, never taken by run
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._applied = 0
+        self._current = None
+        self.reload(rule_list)
+
+    @property
+    def current(self):
+        """ The current RuleSetVersion. Keep it to run several records
+        against the same version.
+        """
+        return self._current
+
+    @property
+    def version(self):
+        return self._current.number
+
+    @property
+    def fingerprint(self):
+        return self._current.fingerprint
+
+    def run(self, defined_variables, defined_actions, **kwargs):
+        """ Runs the current version. Takes the same keyword arguments as
+        CompiledRuleSet.run.
+        """
+        return self._current.compiled.run(defined_variables, defined_actions,
+                                          **kwargs)
+
+    def reload(self, rule_list):
+        """ Compiles `rule_list` in this thread and makes it the current
+        version, unless it has the same fingerprint as the current one.
+        Returns the current version. Raises AssertionError, and keeps the
+        current version, if `rule_list` is invalid.
+
+        If several reloads overlap, the one requested last wins.
+        """
+        fingerprint = ruleset_fingerprint(rule_list)
+        with self._lock:
+            self._requests += 1
+            request = self._requests
+            current = self._current
+
+        if current is not None and current.fingerprint == fingerprint:
+            compiled = current.compiled
+        elif self.cache is None:
+            compiled = self.compiler(rule_list, self.variables_cls,
+                                     self.actions_cls, **self.options)
+        else:
+            compiled = self.cache.compile(rule_list, self.variables_cls,
+                                          self.actions_cls, self.compiler,
+                                          fingerprint, **self.options)
+
+        with self._lock:
+            # a reload requested later already finished
+            if request < self._applied:
+                return self._current
+            self._applied = request
+            current = self._current
+            if current is None or current.fingerprint != fingerprint:
+                number = current.number + 1 if current is not None else 1
+                self._current = RuleSetVersion(number, fingerprint, rule_list,
+                                               compiled)
+            return self._current
+
+    def reload_in_background(self, rule_list, on_error=None):
+        """ Runs reload(rule_list) in a new daemon thread, and returns the
+        thread. If the reload fails, `on_error` is called with the exception
+        in that thread.
+        """
+        def reload():
+            try:
+                self.reload(rule_list)
+            except Exception as error:
+                if on_error is not None:
+                    on_error(error)
+        thread = threading.Thread(target=reload, name='RuleSet reload')
+        thread.daemon = True
+        thread.start()
+        return thread
@@ -0,0 +1,177 @@
+""" Running a ruleset over newline-delimited JSON (NDJSON) records.
+
+run_ndjson reads one JSON record per line, evaluates the rules against it
+and writes one JSON line per record with the actions its triggered rules
+fired - the actions are recorded (see deferred), not run:
+
+    {"key": 1, "triggered": true,
+     "actions": [{"name": "send_email", "params": {"campaign_id": "cto"}}]}
+
+Records are read, evaluated and written one at a time, so memory use doesn't
+depend on the size of the input, and a slow consumer of the output slows
+down the reading of the input rather than filling up memory. It also runs
+from the command line, reading stdin and writing stdout by default:
+
+    python -m business_rules.stream --rules rules.json \\
+        --variables myapp.rules:ProfileVariables \\
+        --actions myapp.rules:ProfileActions < profiles.ndjson > fired.ndjson
+
+where the variables class is instantiated with each record.
+"""
+import argparse
+import importlib
+import io
+import json
+import sys
+from decimal import Decimal
+
+from six import text_type
+
+from .compiler import compile_rules
+from .deferred import ActionBuffer
+
+
+def read_ndjson(lines):
+    """ Lazily yields the JSON value of each non-blank line of `lines`, an
+    open file or any iterable of lines. Raises ValueError, with the line
+    number, on invalid JSON.
+    """
+    for _, value in _numbered_values(lines):
+        yield value
+
+
+def _numbered_values(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as error:
+            raise ValueError("Invalid JSON on line {0}: {1}".format(number,
+                                                                    error))
+
+
+def _evaluate_records(rule_list, numbered_records, variables_factory,
+                      actions_cls, record_key, stop_on_first_trigger,
+                      cache_variables):
+    """ Lazily yields a result dict - the record's key, whether a rule was
+    triggered and the actions fired - per (line number, record) tuple.
+    """
+    ruleset = None
+    fired = []
+    buffer = ActionBuffer(fired.extend, actions_cls=actions_cls)
+    for number, record in numbered_records:
+        defined_variables = variables_factory(record)
+        if ruleset is None:
+            ruleset = compile_rules(rule_list, defined_variables.__class__,
+                                    actions_cls)
+        key = number if record_key is None else record_key(record)
+        triggered = ruleset.run(defined_variables, buffer.actions_for(key),
+                                stop_on_first_trigger=stop_on_first_trigger,
+                                cache_variables=cache_variables)
+        buffer.flush()
+        yield {'key': key, 'triggered': triggered,
+               'actions': [{'name': name, 'params': params}
+                           for name, params, _ in fired]}
+        del fired[:]
+
+
+def run_ndjson(rule_list, input_file, output_file, variables_factory,
+               actions_cls, record_key=None, only_triggered=False,
+               stop_on_first_trigger=False, cache_variables=False):
+    """ Evaluates the rules against every record of the NDJSON `input_file`
+    and writes a result line per record to `output_file`, or only for the
+    records that triggered a rule if `only_triggered`. Returns the number of
+    records read.
+
+    `variables_factory` is called with each record, and the rules are
+    compiled against the class of the first record's variables and
+    `actions_cls`. The key of a record is `record_key(record)`, by default
+    its line number.
+    """
+    count = 0
+    for result in _evaluate_records(rule_list, _numbered_values(input_file),
+                                    variables_factory, actions_cls,
+                                    record_key, stop_on_first_trigger,
+                                    cache_variables):
+        count += 1
+        if result['triggered'] or not only_triggered:
+            output_file.write(text_type(json.dumps(result,
+                                                   default=_json_default)))
+            output_file.write(u'\n')
+    output_file.flush()
+    return count
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return str(value)
+
+
+def _import(path):
+    """ Imports 'package.module:name'. """
+    module_name, _, name = path.partition(':')
+    assert name, "{0} should look like package.module:name".format(path)
+    return getattr(importlib.import_module(module_name), name)
+
+
+def main(argv=None, stdin=None, stdout=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m business_rules.stream',
+        description='Runs a ruleset over newline-delimited JSON records.')
+    parser.add_argument('--rules', required=True,
+                        help='JSON file holding the list of rules')
+    parser.add_argument('--variables', required=True,
+                        help='package.module:VariablesClass, instantiated '
+                             'with each record')
+    parser.add_argument('--actions', required=True,
+                        help='package.module:ActionsClass')
+    parser.add_argument('--input', default='-',
+                        help='NDJSON file of records, default stdin')
+    parser.add_argument('--output', default='-',
+                        help='file to write the results to, default stdout')
+    parser.add_argument('--key', default=None,
+                        help='field of the records used as their key, '
+                             'default their line number')
+    parser.add_argument('--only-triggered', action='store_true',
+                        help='only write the records that triggered a rule')
+    parser.add_argument('--stop-on-first-trigger', action='store_true')
+    parser.add_argument('--cache-variables', action='store_true')
+    args = parser.parse_args(argv)
+
+    with io.open(args.rules, encoding='utf-8') as f:
+        rule_list = json.load(f)
+    record_key = None
+    if args.key is not None:
+        def record_key(record):
+            return record.get(args.key)
+
+    variables_cls, actions_cls = (_import(args.variables),
+                                  _import(args.actions))
+    input_file = _open(args.input, 'r', stdin or sys.stdin)
+    try:
+        output_file = _open(args.output, 'w', stdout or sys.stdout)
+        try:
+            return run_ndjson(rule_list, input_file, output_file,
+                              variables_cls, actions_cls, record_key,
+                              args.only_triggered, args.stop_on_first_trigger,
+                              args.cache_variables)
+        finally:
+            if args.output != '-':
+                output_file.close()
+    finally:
+        if args.input != '-':
+            input_file.close()
+
+
+def _open(path, mode, standard_stream):
+    if path == '-':
+        return standard_stream
+    return io.open(path, mode, encoding='utf-8')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
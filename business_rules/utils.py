@@ -1,5 +1,10 @@
+from collections import OrderedDict, namedtuple
 from decimal import Decimal, Inexact, Context
+from threading import Lock
+import hashlib
 import inspect
+import json
+import re
 
 def fn_name_to_pretty_label(name):
     return ' '.join([w.title() for w in name.split('_')])
@@ -40,3 +45,115 @@ def float_to_decimal(f):
         result = ctx.divide(numerator, denominator)
     return result
 
+
+def condition_key(condition):
+    """ Returns a hashable (name, operator, value) tuple identifying a single
+    rule condition, so identical conditions can be found across rules.
+    """
+    return (condition['name'], condition['operator'],
+            _hashable(condition['value']))
+
+
+def ruleset_fingerprint(rule_list):
+    """ Returns a hex SHA-256 digest of `rule_list`, the same for rule lists
+    that only differ by the order of the keys of their dicts, or by the
+    whitespace of the JSON they were loaded from. Values JSON can't encode,
+    like Decimals, are fingerprinted by their type and repr.
+    """
+    canonical = json.dumps(list(rule_list), sort_keys=True,
+                           separators=(',', ':'), default=_tagged_value)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _tagged_value(value):
+    # tagged with the type, so that e.g. Decimal('5') and '5' don't collide
+    kind = type(value)
+    if isinstance(value, (set, frozenset)):
+        # repr would depend on the iteration order
+        text = sorted(repr(item) for item in value)
+    else:
+        text = repr(value)
+    return {'__type__': '{0}.{1}'.format(kind.__module__, kind.__name__),
+            '__repr__': text}
+
+
+def _hashable(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    return value
+
+
+RegexCacheInfo = namedtuple('RegexCacheInfo',
+                            ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class RegexCache(object):
+    """ A bounded cache of compiled regular expressions, keyed by pattern and
+    flags. `re` keeps its own cache, but it's small and cleared as a whole
+    when full, so rule sets with many distinct patterns keep recompiling them.
+
+    Hits don't take the lock, they only mark the pattern as used: a full
+    cache evicts the oldest pattern that wasn't used since it was last
+    considered for eviction (the "second chance" approximation of LRU). The
+    statistics are approximate when several threads compile at once.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # (pattern, flags) -> [compiled pattern, used since last considered]
+        self._patterns = OrderedDict()
+        self._lock = Lock()
+
+    def compile(self, pattern, flags=0):
+        """ Returns `pattern` compiled with `flags`, compiling it only if it
+        isn't cached yet. Raises re.error for invalid patterns.
+        """
+        key = (pattern, flags)
+        entry = self._patterns.get(key)
+        if entry is not None:
+            entry[1] = True
+            self.hits += 1
+            return entry[0]
+        compiled = re.compile(pattern, flags)
+        with self._lock:
+            self.misses += 1
+            if key not in self._patterns:
+                self._evict(len(self._patterns) + 1 - self.maxsize)
+                self._patterns[key] = [compiled, False]
+        return compiled
+
+    def _evict(self, count):
+        patterns = self._patterns
+        while count > 0 and patterns:
+            key = next(iter(patterns))
+            entry = patterns[key]
+            if entry[1]:
+                # give it a second chance, at the end of the queue
+                entry[1] = False
+                patterns[key] = patterns.pop(key)
+            else:
+                del patterns[key]
+                count -= 1
+
+    def info(self):
+        """ Returns a RegexCacheInfo(hits, misses, maxsize, currsize). """
+        return RegexCacheInfo(self.hits, self.misses, self.maxsize,
+                              len(self._patterns))
+
+    def hit_rate(self):
+        """ Returns the fraction of compile calls served from the cache. """
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+    def clear(self):
+        """ Empties the cache and resets the statistics. """
+        with self._lock:
+            self._patterns.clear()
+            self.hits = self.misses = 0
+
+
+# Shared by StringType.matches_regex and the rule compilers
+regex_cache = RegexCache()
@@ -22,40 +22,60 @@ class BaseVariables(object):
                 } for m in methods if getattr(m[1], 'is_rule_variable', False)]
 
 
-def rule_variable(field_type, label=None, options=None):
+def rule_variable(field_type, label=None, options=None, cache=True, cost=1):
     """ Decorator to make a function into a rule variable
+
+    - cache - if False, the variable is computed again every time a condition
+      uses it, even when the engine is run with cache_variables=True. Use it
+      for variables whose value is volatile.
+    - cost - how expensive the variable is to compute, relative to the
+      default of 1 (e.g. 100 for a database query). Used by
+      optimizer.optimize_rules to evaluate cheap conditions first.
     """
     options = options or []
     def wrapper(func):
         if not (type(field_type) == type and issubclass(field_type, BaseType)):
             raise AssertionError("{0} is not instance of BaseType in"\
                     " rule_variable field_type".format(field_type))
+        if not cost > 0:
+            raise AssertionError("{0} is not a valid cost for rule_variable"
+                                 " {1}".format(cost, func.__name__))
         func.field_type = field_type
         func.is_rule_variable = True
         func.label = label \
                 or fn_name_to_pretty_label(func.__name__)
         func.options = options
+        func.cache = cache
+        func.cost = cost
         return func
     return wrapper
 
 
-def _rule_variable_wrapper(field_type, label):
+def _rule_variable_wrapper(field_type, label, cache=True, cost=1):
     if callable(label):
         # Decorator is being called with no args, label is actually the decorated func
         return rule_variable(field_type)(label)
-    return rule_variable(field_type, label=label)
+    return rule_variable(field_type, label=label, cache=cache, cost=cost)
+
+
+def numeric_rule_variable(label=None, cache=True, cost=1):
+    return _rule_variable_wrapper(NumericType, label, cache=cache, cost=cost)
+
+
+def string_rule_variable(label=None, cache=True, cost=1):
+    return _rule_variable_wrapper(StringType, label, cache=cache, cost=cost)
+
 
-def numeric_rule_variable(label=None):
-    return _rule_variable_wrapper(NumericType, label)
+def boolean_rule_variable(label=None, cache=True, cost=1):
+    return _rule_variable_wrapper(BooleanType, label, cache=cache, cost=cost)
 
-def string_rule_variable(label=None):
-    return _rule_variable_wrapper(StringType, label)
 
-def boolean_rule_variable(label=None):
-    return _rule_variable_wrapper(BooleanType, label)
+def select_rule_variable(label=None, options=None, cache=True, cost=1):
+    return rule_variable(SelectType, label=label, options=options, cache=cache,
+                         cost=cost)
 
-def select_rule_variable(label=None, options=None):
-    return rule_variable(SelectType, label=label, options=options)
 
-def select_multiple_rule_variable(label=None, options=None):
-    return rule_variable(SelectMultipleType, label=label, options=options)
+def select_multiple_rule_variable(label=None, options=None, cache=True,
+                                  cost=1):
+    return rule_variable(SelectMultipleType, label=label, options=options,
+                         cache=cache, cost=cost)
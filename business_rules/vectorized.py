@@ -0,0 +1,239 @@
+""" Columnar evaluation of rules with NumPy.
+
+Instead of one record at a time, the variables instance returns whole columns
+(one value per row) for every rule variable, and each condition is evaluated
+as a boolean mask over all rows at once:
+
+    ruleset = compile_vectorized(rules, ProductColumns)
+    masks = ruleset.evaluate(ProductColumns(products))
+    # masks[i][j] is True if rule i is triggered for row j
+
+Only numeric, string and boolean variables are supported. Numeric columns are
+compared as float64 with the same epsilon as NumericType, rather than with
+Decimal arithmetic. Requires numpy (`pip install business-rules[vectorized]`).
+"""
+from functools import partial
+
+from .compiler import get_operator_method, get_variable_method
+from .operators import (NUMERIC_COMPARISONS, BooleanType, NumericType,
+                        StringType)
+from .utils import regex_cache
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+def compile_vectorized(rule_list, variables_cls):
+    """ Compiles the conditions of `rule_list` into a VectorizedRuleSet.
+
+    Raises AssertionError if a rule references a variable or operator that
+    doesn't exist, or an operator that can't be vectorized.
+    """
+    if np is None:  # pragma: no cover
+        raise ImportError("numpy is required for vectorized rule evaluation")
+    return VectorizedRuleSet(
+        [_compile_conditions(rule['conditions'], variables_cls)
+         for rule in rule_list])
+
+
+class VectorizedRuleSet(object):
+
+    def __init__(self, checks):
+        self.checks = checks
+
+    def evaluate(self, defined_variables):
+        """ Returns a 2d boolean array with one row per rule and one column
+        per record, True where the rule's conditions hold. Each variable is
+        called once.
+        """
+        columns = {}
+        masks = [check(defined_variables, columns) for check in self.checks]
+        return np.array(masks, dtype=bool)
+
+
+def _compile_conditions(conditions, variables_cls):
+    keys = list(conditions.keys())
+    if keys == ['all']:
+        assert len(conditions['all']) >= 1
+        checks = [_compile_conditions(condition, variables_cls)
+                  for condition in conditions['all']]
+
+        def check_all(defined_variables, columns):
+            mask = checks[0](defined_variables, columns)
+            for check in checks[1:]:
+                if not mask.any():
+                    break
+                mask = mask & check(defined_variables, columns)
+            return mask
+        return check_all
+
+    elif keys == ['any']:
+        assert len(conditions['any']) >= 1
+        checks = [_compile_conditions(condition, variables_cls)
+                  for condition in conditions['any']]
+
+        def check_any(defined_variables, columns):
+            mask = checks[0](defined_variables, columns)
+            for check in checks[1:]:
+                if mask.all():
+                    break
+                mask = mask | check(defined_variables, columns)
+            return mask
+        return check_any
+
+    else:
+        # help prevent errors - any and all can only be in the condition dict
+        # if they're the only item
+        assert not ('any' in keys or 'all' in keys)
+        return _compile_condition(conditions, variables_cls)
+
+
+def _compile_condition(condition, variables_cls):
+    name, op, value = (condition['name'], condition['operator'],
+                       condition['value'])
+    variable = get_variable_method(variables_cls, name)
+    field_type = variable.field_type
+    get_operator_method(field_type, op)
+
+    operator = _get_vectorized_operator(field_type, op)
+    cast_column = _COLUMN_CASTS[operator.field_type]
+    value = operator.prepare(field_type, value)
+
+    def check_condition(defined_variables, columns):
+        try:
+            column = columns[name]
+        except KeyError:
+            column = columns[name] = cast_column(variable(defined_variables))
+        return operator(column, value)
+    return check_condition
+
+
+def _get_vectorized_operator(field_type, operator_name):
+    for base in field_type.__mro__:
+        operator = _VECTORIZED_OPERATORS.get((base, operator_name))
+        if operator is not None:
+            # subclasses may have overridden the operator with other semantics
+            if getattr(field_type, operator_name) == \
+                    getattr(base, operator_name):
+                return operator
+            break
+    raise AssertionError("Operator {0} for type {1} can't be vectorized"
+                         .format(operator_name, field_type.__name__))
+
+
+def _numeric_column(column):
+    return np.asarray(column, dtype=float)
+
+
+def _string_column(column):
+    column = np.asarray(column)
+    if column.dtype == object:
+        # StringType treats None as an empty string
+        column = np.where(np.equal(column, None), '', column).astype(str)
+    elif column.dtype.kind not in 'US':
+        # e.g. an empty list, which numpy makes a float64 array
+        column = column.astype(str)
+    return column
+
+
+def _boolean_column(column):
+    return np.asarray(column, dtype=bool)
+
+
+_COLUMN_CASTS = {
+    NumericType: _numeric_column,
+    StringType: _string_column,
+    BooleanType: _boolean_column,
+}
+
+_VECTORIZED_OPERATORS = {}
+
+
+def _vectorized_operator(field_type, name, prepare=None):
+    """ Registers a function taking a column and the prepared comparison
+    value as the vectorized version of operator `name` of `field_type`.
+    `prepare` turns the rule's comparison value into the one passed to the
+    function; by default it's validated and cast by `field_type`.
+    """
+    def wrapper(func):
+        func.field_type = field_type
+        func.prepare = prepare or _cast_value
+        _VECTORIZED_OPERATORS[(field_type, name)] = func
+        return func
+    return wrapper
+
+
+def _cast_value(field_type, value):
+    return field_type(value).value
+
+
+def _cast_float(field_type, value):
+    return float(field_type(value).value)
+
+
+def _compile_regex(field_type, value):
+    return regex_cache.compile(field_type(value).value)
+
+
+def _no_input(field_type, value):
+    return None
+
+
+_EPSILON = float(NumericType.EPSILON)
+
+
+def _numeric_vectorized_operators():
+    for name, comparison in NUMERIC_COMPARISONS.items():
+        _vectorized_operator(NumericType, name, prepare=_cast_float)(
+            partial(comparison, _EPSILON))
+
+
+_numeric_vectorized_operators()
+
+
+@_vectorized_operator(StringType, 'equal_to')
+def _string_equal_to(column, other):
+    return column == other
+
+
+@_vectorized_operator(StringType, 'equal_to_case_insensitive')
+def _string_equal_to_case_insensitive(column, other):
+    return np.char.lower(column) == other.lower()
+
+
+@_vectorized_operator(StringType, 'starts_with')
+def _string_starts_with(column, other):
+    return np.char.startswith(column, other)
+
+
+@_vectorized_operator(StringType, 'ends_with')
+def _string_ends_with(column, other):
+    return np.char.endswith(column, other)
+
+
+@_vectorized_operator(StringType, 'contains')
+def _string_contains(column, other):
+    return np.char.find(column, other) >= 0
+
+
+@_vectorized_operator(StringType, 'matches_regex', prepare=_compile_regex)
+def _string_matches_regex(column, regex):
+    return np.fromiter((regex.search(s) is not None for s in column),
+                       dtype=bool, count=len(column))
+
+
+@_vectorized_operator(StringType, 'non_empty', prepare=_no_input)
+def _string_non_empty(column, other):
+    return np.char.str_len(column) > 0
+
+
+@_vectorized_operator(BooleanType, 'is_true', prepare=_no_input)
+def _boolean_is_true(column, other):
+    return column
+
+
+@_vectorized_operator(BooleanType, 'is_false', prepare=_no_input)
+def _boolean_is_false(column, other):
+    return ~column
@@ -33,4 +33,7 @@ setup(
     install_requires=[
         "six>=1.16.0",
     ],
+    extras_require={
+        "vectorized": ["numpy"],
+    },
 )
@@ -0,0 +1,226 @@
+import asyncio
+
+from business_rules.actions import BaseActions, rule_action
+from business_rules.async_engine import (async_check_conditions_recursively,
+                                         async_run, async_run_all)
+from business_rules.fields import FIELD_TEXT
+from business_rules.variables import (BaseVariables, boolean_rule_variable,
+                                      numeric_rule_variable,
+                                      string_rule_variable)
+
+from unittest import TestCase
+
+
+class ProfileVariables(BaseVariables):
+
+    def __init__(self, job_title='Engineer', age=30):
+        self._job_title = job_title
+        self._age = age
+        self.log = []
+
+    @string_rule_variable
+    async def job_title(self):
+        self.log.append('job_title start')
+        await asyncio.sleep(0.01)
+        self.log.append('job_title end')
+        return self._job_title
+
+    @numeric_rule_variable
+    async def age(self):
+        self.log.append('age start')
+        await asyncio.sleep(0)
+        self.log.append('age end')
+        return self._age
+
+    @string_rule_variable(cache=False)
+    def business_unit(self):
+        self.log.append('business_unit')
+        return 'Marketing'
+
+    @numeric_rule_variable
+    def seniority(self):
+        self.log.append('seniority')
+        return 5
+
+
+class EmailActions(BaseActions):
+
+    def __init__(self):
+        self.sent = []
+
+    @rule_action(params={'campaign_id': FIELD_TEXT})
+    async def send_email(self, campaign_id):
+        await asyncio.sleep(0)
+        self.sent.append(campaign_id)
+
+    @rule_action()
+    def log_match(self):
+        self.sent.append('logged')
+
+
+ENGINEER = {'name': 'job_title', 'operator': 'equal_to', 'value': 'Engineer'}
+OVER_40 = {'name': 'age', 'operator': 'greater_than', 'value': 40}
+MARKETING = {'name': 'business_unit', 'operator': 'equal_to',
+             'value': 'Marketing'}
+SENIOR = {'name': 'seniority', 'operator': 'greater_than', 'value': 3}
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class AsyncEngineTests(TestCase):
+
+    def test_variables_are_fetched_concurrently(self):
+        variables = ProfileVariables()
+        result = _run(async_check_conditions_recursively(
+            {'all': [ENGINEER, MARKETING, OVER_40]}, variables))
+        self.assertFalse(result)
+        self.assertEqual(variables.log, ['job_title start', 'age start',
+                                         'age end', 'job_title end',
+                                         'business_unit'])
+
+    def test_any(self):
+        self.assertTrue(_run(async_check_conditions_recursively(
+            {'any': [OVER_40, {'all': [ENGINEER, MARKETING]}]},
+            ProfileVariables())))
+        self.assertFalse(_run(async_check_conditions_recursively(
+            {'any': [OVER_40, {'all': [ENGINEER, OVER_40]}]},
+            ProfileVariables())))
+
+    def test_run_awaits_actions(self):
+        rule = {'conditions': ENGINEER,
+                'actions': [{'name': 'send_email',
+                             'params': {'campaign_id': 'eng'}},
+                            {'name': 'log_match'}]}
+        actions = EmailActions()
+        self.assertTrue(_run(async_run(rule, ProfileVariables(), actions)))
+        self.assertEqual(actions.sent, ['eng', 'logged'])
+
+        actions = EmailActions()
+        self.assertFalse(_run(async_run(rule, ProfileVariables('CEO'),
+                                        actions)))
+        self.assertEqual(actions.sent, [])
+
+    def test_run_all(self):
+        rules = [{'conditions': {'all': [ENGINEER, OVER_40]},
+                  'actions': [{'name': 'send_email',
+                               'params': {'campaign_id': 'senior-eng'}}]},
+                 {'conditions': {'any': [ENGINEER, MARKETING]},
+                  'actions': [{'name': 'send_email',
+                               'params': {'campaign_id': 'eng'}}]},
+                 {'conditions': {'all': [MARKETING, ENGINEER]},
+                  'actions': [{'name': 'log_match'}]}]
+        actions = EmailActions()
+        self.assertTrue(_run(async_run_all(rules, ProfileVariables(age=50),
+                                           actions)))
+        self.assertEqual(actions.sent, ['senior-eng', 'eng', 'logged'])
+
+        actions = EmailActions()
+        self.assertTrue(_run(async_run_all(rules, ProfileVariables(), actions,
+                                           stop_on_first_trigger=True)))
+        self.assertEqual(actions.sent, ['eng'])
+
+        actions = EmailActions()
+        self.assertFalse(_run(async_run_all(rules[:1], ProfileVariables(),
+                                            actions)))
+
+    def test_cache_variables(self):
+        rules = [{'conditions': {'all': [ENGINEER, OVER_40]}, 'actions': []},
+                 {'conditions': {'any': [OVER_40, MARKETING, ENGINEER]},
+                  'actions': []},
+                 {'conditions': MARKETING, 'actions': []}]
+        variables = ProfileVariables()
+        _run(async_run_all(rules, variables, EmailActions()))
+        self.assertEqual(variables.log.count('job_title start'), 2)
+
+        variables = ProfileVariables()
+        _run(async_run_all(rules, variables, EmailActions(),
+                           cache_variables=True))
+        self.assertEqual(variables.log.count('job_title start'), 1)
+        self.assertEqual(variables.log.count('business_unit'), 2)
+
+        # plain variables, and variables of single condition rules
+        rules = [{'conditions': SENIOR, 'actions': []},
+                 {'conditions': {'all': [SENIOR, OVER_40]}, 'actions': []},
+                 {'conditions': {'any': [OVER_40, SENIOR]}, 'actions': []},
+                 {'conditions': ENGINEER, 'actions': []},
+                 {'conditions': ENGINEER, 'actions': []}]
+        variables = ProfileVariables()
+        _run(async_run_all(rules, variables, EmailActions(),
+                           cache_variables=True))
+        self.assertEqual(variables.log.count('seniority'), 1)
+        self.assertEqual(variables.log.count('age start'), 1)
+        self.assertEqual(variables.log.count('job_title start'), 1)
+
+    def test_errors(self):
+        with self.assertRaisesRegex(AssertionError, 'Variable food is not '
+                                    'defined in class ProfileVariables'):
+            _run(async_check_conditions_recursively(
+                {'all': [{'name': 'food', 'operator': 'equal_to',
+                          'value': 'm'}]}, ProfileVariables()))
+        with self.assertRaises(AssertionError):
+            _run(async_check_conditions_recursively({'any': []},
+                                                    ProfileVariables()))
+        with self.assertRaises(AssertionError):
+            _run(async_check_conditions_recursively({'any': [], 'all': []},
+                                                    ProfileVariables()))
+        with self.assertRaisesRegex(AssertionError, 'Action fakeone is not '
+                                    'defined in class EmailActions'):
+            _run(async_run({'conditions': ENGINEER,
+                            'actions': [{'name': 'fakeone'}]},
+                           ProfileVariables(), EmailActions()))
+
+
+class AddressVariables(BaseVariables):
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    @boolean_rule_variable
+    def has_address(self):
+        return 'address' in self.profile
+
+    @string_rule_variable
+    def city(self):
+        return self.profile['address']['city']
+
+    @string_rule_variable
+    async def country(self):
+        return self.profile['address']['country']
+
+
+class GuardedVariableTests(TestCase):
+
+    def test_plain_variable_is_guarded(self):
+        rule = {'conditions': {'all': [
+                    {'name': 'has_address', 'operator': 'is_true',
+                     'value': None},
+                    {'name': 'city', 'operator': 'equal_to',
+                     'value': 'Paris'}]},
+                'actions': []}
+        self.assertFalse(_run(async_run_all([rule], AddressVariables({}),
+                                            EmailActions())))
+        self.assertTrue(_run(async_run_all(
+            [rule], AddressVariables({'address': {'city': 'Paris'}}),
+            EmailActions())))
+
+    def test_coroutine_variable_error_is_deferred(self):
+        rule = {'conditions': {'all': [
+                    {'name': 'has_address', 'operator': 'is_true',
+                     'value': None},
+                    {'name': 'country', 'operator': 'equal_to',
+                     'value': 'FR'}]},
+                'actions': []}
+        for cache_variables in (False, True):
+            self.assertFalse(_run(async_run_all(
+                [rule], AddressVariables({}), EmailActions(),
+                cache_variables=cache_variables)))
+        # raised when the condition is checked
+        rule['conditions']['all'].reverse()
+        with self.assertRaises(KeyError):
+            _run(async_run_all([rule], AddressVariables({}), EmailActions()))
@@ -0,0 +1,89 @@
+from business_rules import compile_rules, run_batch
+from business_rules.actions import BaseActions, rule_action
+from business_rules.fields import FIELD_TEXT
+from business_rules.variables import (BaseVariables, numeric_rule_variable,
+                                      string_rule_variable)
+
+from unittest import TestCase
+
+
+class ProfileVariables(BaseVariables):
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    @string_rule_variable
+    def job_title(self):
+        return self.profile.get('job_title')
+
+    @numeric_rule_variable
+    def age(self):
+        return self.profile.get('age', 0)
+
+
+class ProfileActions(BaseActions):
+
+    sent = []
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    @rule_action(params={'campaign_id': FIELD_TEXT})
+    def send_email(self, campaign_id):
+        self.sent.append((self.profile['name'], campaign_id))
+
+
+RULES = [
+    {'conditions': {'name': 'job_title', 'operator': 'contains',
+                    'value': 'Engineer'},
+     'actions': [{'name': 'send_email', 'params': {'campaign_id': 'eng'}}]},
+    {'conditions': {'name': 'age', 'operator': 'greater_than', 'value': 40},
+     'actions': [{'name': 'send_email', 'params': {'campaign_id': 'senior'}}]},
+]
+
+PROFILES = [
+    {'name': 'ann', 'job_title': 'Software Engineer', 'age': 45},
+    {'name': 'bob', 'job_title': 'Designer', 'age': 30},
+    {'name': 'cat', 'job_title': 'Designer', 'age': 50},
+]
+
+
+class RunBatchTests(TestCase):
+
+    def setUp(self):
+        ProfileActions.sent = []
+
+    def test_run_batch(self):
+        results = list(run_batch(RULES, PROFILES,
+                                 ProfileVariables, ProfileActions))
+        self.assertEqual(results, [(PROFILES[0], True),
+                                   (PROFILES[1], False),
+                                   (PROFILES[2], True)])
+        self.assertEqual(ProfileActions.sent, [('ann', 'eng'),
+                                               ('ann', 'senior'),
+                                               ('cat', 'senior')])
+
+    def test_run_batch_is_lazy(self):
+        results = run_batch(RULES, iter(PROFILES),
+                            ProfileVariables, ProfileActions,
+                            stop_on_first_trigger=True)
+        self.assertEqual(ProfileActions.sent, [])
+        self.assertEqual(next(results), (PROFILES[0], True))
+        self.assertEqual(ProfileActions.sent, [('ann', 'eng')])
+
+    def test_run_batch_with_compiled_ruleset(self):
+        ruleset = compile_rules(RULES, ProfileVariables, ProfileActions)
+        results = list(run_batch(ruleset, PROFILES,
+                                 ProfileVariables, ProfileActions,
+                                 cache_variables=True))
+        self.assertEqual([triggered for _, triggered in results],
+                         [True, False, True])
+
+    def test_run_batch_with_invalid_rule(self):
+        rules = [{'conditions': {'name': 'food', 'operator': 'equal_to',
+                                 'value': 'm'},
+                  'actions': []}]
+        results = run_batch(rules, PROFILES, ProfileVariables, ProfileActions)
+        err_string = 'Variable food is not defined in class ProfileVariables'
+        with self.assertRaisesRegex(AssertionError, err_string):
+            next(results)
@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import tempfile
+
+from benchmarks.compare import compare
+from benchmarks.compare import main as compare_main
+from benchmarks.run import BENCHMARKS, Workload, main, parse_operator_mix
+from benchmarks.run import run_benchmarks
+from benchmarks.synthetic import SyntheticActions, make_rules
+from business_rules import run_all
+from business_rules.engine import check_conditions_recursively
+
+from unittest import TestCase
+
+
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+        self.workload = Workload(rules=10, records=5, depth=3, width=2)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_make_rules_nesting(self):
+        rules = make_rules(2, depth=3, width=2, operator_mix={'boolean': 1})
+        self.assertEqual(len(rules), 2)
+        conditions = rules[0]['conditions']
+        self.assertEqual(len(conditions['all']), 2)
+        self.assertEqual(len(conditions['all'][0]['any']), 2)
+        self.assertTrue(conditions['all'][0]['any'][0]['name']
+                        .startswith('boolean_'))
+
+    def test_rules_run(self):
+        variables = self.workload.variables_cls(self.workload.records[0])
+        for rule in self.workload.rules:
+            check_conditions_recursively(rule['conditions'], variables)
+        actions = SyntheticActions()
+        run_all(self.workload.rules, variables, actions)
+        self.assertGreaterEqual(actions.triggered, 0)
+
+    def test_run_benchmarks(self):
+        results = run_benchmarks(self.workload, repeat=1)
+        self.assertEqual([result['name'] for result in results['results']],
+                         list(BENCHMARKS))
+        self.assertEqual(results['config']['rules'], 10)
+        run_all_result = results['results'][0]
+        self.assertGreater(run_all_result['rules_per_sec'], 0)
+        self.assertGreater(run_all_result['peak_memory_bytes'], 0)
+        self.assertNotIn('rules_per_sec', results['results'][-1])
+        # machine readable
+        json.loads(json.dumps(results))
+
+    def test_main_and_compare(self):
+        output = os.path.join(self.directory, 'results.json')
+        main(['--rules', '5', '--records', '2', '--repeat', '1',
+              '--benchmark', 'compiled', '--mix', 'string=2,numeric',
+              '--output', output])
+        with open(output) as f:
+            results = json.load(f)
+        self.assertEqual(results['config']['operator_mix'],
+                         {'string': 2, 'numeric': 1})
+        self.assertEqual(compare_main([output, output, '--json']), 0)
+
+        slower = json.loads(json.dumps(results))
+        slower['results'][0]['calls_per_sec'] /= 2
+        comparison = compare(results, slower)
+        self.assertEqual(comparison[0]['name'], 'compiled')
+        self.assertAlmostEqual(comparison[0]['ratio'], 0.5)
+        self.assertTrue(comparison[0]['regression'])
+
+    def test_parse_operator_mix(self):
+        self.assertEqual(parse_operator_mix('string=3, boolean'),
+                         {'string': 3, 'boolean': 1})
@@ -0,0 +1,170 @@
+import os
+import shutil
+import tempfile
+
+from mock import patch
+
+from business_rules import bundle, compile_rules, run_all
+from business_rules.actions import BaseActions, rule_action
+from business_rules.bundle import (FORMAT_VERSION, RuleBundle, dumps_bundle,
+                                   load_bundle, write_bundle)
+from business_rules.fields import FIELD_TEXT
+from business_rules.variables import (BaseVariables, numeric_rule_variable,
+                                      select_multiple_rule_variable,
+                                      string_rule_variable)
+
+from unittest import TestCase
+
+
+class ProfileVariables(BaseVariables):
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    @string_rule_variable
+    def job_title(self):
+        return self.profile['job_title']
+
+    @numeric_rule_variable
+    def age(self):
+        return self.profile['age']
+
+    @select_multiple_rule_variable()
+    def tags(self):
+        return self.profile['tags']
+
+
+class ProfileActions(BaseActions):
+
+    def __init__(self):
+        self.campaigns = []
+
+    @rule_action(params={'campaign_id': FIELD_TEXT})
+    def send_email(self, campaign_id):
+        self.campaigns.append(campaign_id)
+
+    @rule_action()
+    def flag(self):
+        self.campaigns.append('flagged')
+
+
+RULES = [
+    {'name': u'senior CTO ☃',
+     'conditions': {'all': [
+         {'name': 'job_title', 'operator': 'equal_to', 'value': 'CTO'},
+         {'any': [
+             {'name': 'age', 'operator': 'greater_than', 'value': 40},
+             {'name': 'tags', 'operator': 'shares_at_least_one_element_with',
+              'value': ['golf', 'tennis']}]}]},
+     'actions': [{'name': 'send_email', 'params': {'campaign_id': 'cto'}},
+                 {'name': 'flag'}]},
+    {'conditions': {'name': 'age', 'operator': 'greater_than', 'value': 40},
+     'actions': [{'name': 'send_email', 'params': {'campaign_id': 'senior'}}]},
+    {'conditions': {'name': 'job_title', 'operator': 'equal_to',
+                    'value': 'CTO'},
+     'actions': []},
+]
+
+
+class BundleTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'rules.brb')
+
+    def test_round_trip(self):
+        fingerprint = write_bundle(RULES, self.path)
+        with load_bundle(self.path) as bundle:
+            self.assertEqual(len(bundle), 3)
+            self.assertEqual(list(bundle), RULES)
+            self.assertEqual(bundle[-1], RULES[2])
+            self.assertEqual(bundle.fingerprint, fingerprint)
+            self.assertEqual(len(fingerprint), 64)
+            with self.assertRaises(IndexError):
+                bundle[3]
+
+    def test_values_are_interned(self):
+        data = dumps_bundle(RULES)
+        # 'job_title', 'equal_to' and 'CTO' are stored once
+        self.assertEqual(data.count(b'job_title'), 1)
+        self.assertEqual(data.count(b'sCTO'), 1)
+
+    def test_value_types(self):
+        values = [u'', u'caf\xe9', 0, -7, 2 ** 70, 1.5, float('inf'), True,
+                  False, None, [], [1, u'a', None], {'a': [{'b': 1.25}]}]
+        rules = [{'conditions': {'name': 'age', 'operator': 'equal_to',
+                                 'value': value},
+                  'actions': []} for value in values]
+        bundle = RuleBundle(dumps_bundle(rules))
+        decoded = [rule['conditions']['value'] for rule in bundle]
+        self.assertEqual(decoded, values)
+        self.assertEqual([type(value) for value in decoded],
+                         [type(value) for value in values])
+        # cached values are decoded again the same way
+        self.assertEqual([rule['conditions']['value'] for rule in bundle],
+                         values)
+
+    def test_rules_are_decoded_on_access(self):
+        bundle = RuleBundle(dumps_bundle(RULES))
+        bundle[0]['conditions']['all'][1]['any'][1]['value'].append('chess')
+        self.assertEqual(bundle[0], RULES[0])
+
+    def test_compile_and_run(self):
+        write_bundle(RULES, self.path)
+        profile = {'job_title': 'CTO', 'age': 30, 'tags': ['golf']}
+        with load_bundle(self.path) as bundle:
+            ruleset = compile_rules(bundle, ProfileVariables, ProfileActions)
+            actions = ProfileActions()
+            ruleset.run(ProfileVariables(profile), actions)
+            self.assertEqual(actions.campaigns, ['cto', 'flagged'])
+            actions = ProfileActions()
+            run_all(bundle, ProfileVariables(profile), actions)
+            self.assertEqual(actions.campaigns, ['cto', 'flagged'])
+
+    def test_fingerprint_depends_on_content(self):
+        bundle = RuleBundle(dumps_bundle(RULES))
+        self.assertEqual(RuleBundle(dumps_bundle(RULES)).fingerprint,
+                         bundle.fingerprint)
+        self.assertNotEqual(RuleBundle(dumps_bundle(RULES[:2])).fingerprint,
+                            bundle.fingerprint)
+
+    def test_invalid_conditions(self):
+        with self.assertRaises(AssertionError):
+            dumps_bundle([{'conditions': {'all': []}, 'actions': []}])
+        with self.assertRaises(AssertionError):
+            dumps_bundle([{'conditions': {'all': [], 'name': 'age'},
+                           'actions': []}])
+
+    def test_corrupt_bundles(self):
+        data = dumps_bundle(RULES)
+        with self.assertRaisesRegex(ValueError, 'Not a ruleset bundle'):
+            RuleBundle(b'BRB')
+        with self.assertRaisesRegex(ValueError, 'Not a ruleset bundle'):
+            RuleBundle(b'JSON' + data[4:])
+        with self.assertRaisesRegex(ValueError, 'version 2'):
+            RuleBundle(data[:4] + bytearray([FORMAT_VERSION + 1, 0]) +
+                       data[6:])
+        with self.assertRaisesRegex(ValueError, 'Truncated'):
+            RuleBundle(data[:-1])
+        with self.assertRaisesRegex(ValueError, 'Truncated'):
+            RuleBundle(data[:100])
+        tampered = data.replace(b'sCTO', b'sCEO')
+        with self.assertRaisesRegex(ValueError, 'digest mismatch'):
+            RuleBundle(tampered)
+        self.assertEqual(RuleBundle(tampered, verify=False)[2]['conditions'],
+                         {'name': 'job_title', 'operator': 'equal_to',
+                          'value': 'CEO'})
+
+    @patch.object(bundle, '_DIGEST_CHUNK_SIZE', 7)
+    def test_digest_is_checked_in_chunks(self):
+        data = dumps_bundle(RULES)
+        self.assertEqual(len(RuleBundle(data)), len(RULES))
+        with self.assertRaisesRegex(ValueError, 'digest mismatch'):
+            RuleBundle(data.replace(b'sCTO', b'sCEO'))
+
+    def test_load_invalid_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'[' * 200)
+        with self.assertRaisesRegex(ValueError, 'Not a ruleset bundle'):
+            load_bundle(self.path)
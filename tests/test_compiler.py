@@ -0,0 +1,789 @@
+from business_rules import compile_rules, run_all
+from business_rules.engine import check_condition
+from business_rules.actions import BaseActions, rule_action
+from business_rules.compiler import (PatternMatcher, RangeMatcher, RuleIndex,
+                                     RulesetCache, RulesetCacheInfo,
+                                     _Automaton, compile_conditions)
+from business_rules.fields import FIELD_NO_INPUT, FIELD_TEXT
+from business_rules.operators import NumericType, StringType, type_operator
+from business_rules.network import RuleNetwork, compile_network
+from business_rules.utils import regex_cache, ruleset_fingerprint
+from business_rules.variables import (BaseVariables, boolean_rule_variable,
+                                      numeric_rule_variable, rule_variable,
+                                      select_multiple_rule_variable,
+                                      select_rule_variable,
+                                      string_rule_variable)
+
+import json
+import re
+from decimal import Decimal
+from unittest import TestCase
+
+
+class SomeVariables(BaseVariables):
+
+    def __init__(self, foo='foo', ten=10, true_bool=True):
+        self._foo = foo
+        self._ten = ten
+        self._true_bool = true_bool
+        self.calls = {'foo': 0, 'ten': 0}
+
+    @string_rule_variable(cache=False)
+    def foo(self):
+        self.calls['foo'] += 1
+        return self._foo
+
+    @numeric_rule_variable
+    def ten(self):
+        self.calls['ten'] += 1
+        return self._ten
+
+    @boolean_rule_variable
+    def true_bool(self):
+        return self._true_bool
+
+    def not_a_variable(self):
+        return 'nope'
+
+
+class SomeActions(BaseActions):
+
+    def __init__(self):
+        self.calls = []
+
+    @rule_action(params={'bar': FIELD_TEXT})
+    def some_action(self, bar):
+        self.calls.append(('some_action', bar))
+
+    @rule_action()
+    def other_action(self):
+        self.calls.append(('other_action',))
+
+
+RULES = [
+    {'conditions': {'all': [
+        {'name': 'foo', 'operator': 'contains', 'value': 'o'},
+        {'any': [
+            {'name': 'ten', 'operator': 'greater_than', 'value': 20},
+            {'name': 'true_bool', 'operator': 'is_true', 'value': ''}]}]},
+     'actions': [{'name': 'some_action', 'params': {'bar': 'first'}}]},
+    {'conditions': {'any': [
+        {'name': 'ten', 'operator': 'less_than', 'value': 5}]},
+     'actions': [{'name': 'other_action'}]},
+]
+
+
+class CompilerTests(TestCase):
+
+    def test_run_matches_run_all(self):
+        compiled = compile_rules(RULES, SomeVariables, SomeActions)
+        for variables in [SomeVariables(),
+                          SomeVariables(true_bool=False),
+                          SomeVariables(foo='bar', ten=1),
+                          SomeVariables(ten=30, true_bool=False)]:
+            compiled_actions, actions = SomeActions(), SomeActions()
+            self.assertEqual(compiled.run(variables, compiled_actions),
+                             run_all(RULES, variables, actions))
+            self.assertEqual(compiled_actions.calls, actions.calls)
+
+    def test_run_triggers_actions_with_params(self):
+        compiled = compile_rules(RULES, SomeVariables, SomeActions)
+        actions = SomeActions()
+        self.assertTrue(compiled.run(SomeVariables(ten=1), actions))
+        self.assertEqual(actions.calls,
+                         [('some_action', 'first'), ('other_action',)])
+
+    def test_run_stop_on_first_trigger(self):
+        compiled = compile_rules(RULES, SomeVariables, SomeActions)
+        actions = SomeActions()
+        self.assertTrue(compiled.run(SomeVariables(ten=1), actions,
+                                     stop_on_first_trigger=True))
+        self.assertEqual(actions.calls, [('some_action', 'first')])
+
+    def test_run_nothing_triggered(self):
+        compiled = compile_rules(RULES, SomeVariables, SomeActions)
+        actions = SomeActions()
+        self.assertFalse(compiled.run(SomeVariables(foo='bar'), actions))
+        self.assertEqual(actions.calls, [])
+
+    def test_compiled_ruleset_is_a_sequence_of_rules(self):
+        compiled = compile_rules(RULES, SomeVariables, SomeActions)
+        self.assertEqual(len(compiled), 2)
+        self.assertEqual([rule.rule for rule in compiled], RULES)
+
+    def test_compile_unknown_variable(self):
+        rules = [{'conditions': {'name': 'food', 'operator': 'equal_to',
+                                 'value': 'm'},
+                  'actions': []}]
+        err_string = 'Variable food is not defined in class SomeVariables'
+        with self.assertRaisesRegex(AssertionError, err_string):
+            compile_rules(rules, SomeVariables, SomeActions)
+
+    def test_compile_method_that_is_not_a_variable(self):
+        conditions = {'name': 'not_a_variable', 'operator': 'equal_to',
+                      'value': 'm'}
+        with self.assertRaises(AssertionError):
+            compile_conditions(conditions, SomeVariables)
+
+    def test_compile_unknown_operator(self):
+        conditions = {'name': 'foo', 'operator': 'equal_tooooze',
+                      'value': 'foo'}
+        err_string = ('Operator equal_tooooze does not exist for type '
+                      'StringType')
+        with self.assertRaisesRegex(AssertionError, err_string):
+            compile_conditions(conditions, SomeVariables)
+
+    def test_compile_unknown_action(self):
+        rules = [{'conditions': {'name': 'foo', 'operator': 'equal_to',
+                                 'value': 'm'},
+                  'actions': [{'name': 'fakeone'}]}]
+        err_string = 'Action fakeone is not defined in class SomeActions'
+        with self.assertRaisesRegex(AssertionError, err_string):
+            compile_rules(rules, SomeVariables, SomeActions)
+
+    def test_compile_precompiles_regex(self):
+        regex_cache.clear()
+        check = compile_conditions({'name': 'foo', 'operator': 'matches_regex',
+                                    'value': r'^f\w+'}, SomeVariables)
+        self.assertEqual(regex_cache.info().misses, 1)
+        self.assertTrue(check(SomeVariables(), None))
+        self.assertEqual(regex_cache.info().hits, 1)
+
+        with self.assertRaises(re.error):
+            compile_conditions({'name': 'foo', 'operator': 'matches_regex',
+                                'value': '(unclosed'}, SomeVariables)
+
+    def test_select_values_are_folded_at_compile_time(self):
+        class TagVariables(BaseVariables):
+            @select_multiple_rule_variable()
+            def tags(self):
+                return ['Golf', 'Tennis', 'golf']
+
+        for op, value, expected in [
+                ('contains_all', ['GOLF', 'tennis'], True),
+                ('is_contained_by', ['golf', 'tennis', 'chess'], True),
+                ('shares_at_least_one_element_with', ['Chess', 'GOLF'], True),
+                ('shares_exactly_one_element_with', ['chess', 'golf'], True),
+                ('shares_exactly_one_element_with', ['golf', 'Golf'], False),
+                ('shares_no_elements_with', ['chess'], True),
+                ('contains_all', [['golf']], False)]:
+            conditions = {'name': 'tags', 'operator': op, 'value': value}
+            check = compile_conditions(conditions, TagVariables)
+            self.assertEqual(check(TagVariables(), {}), expected, op)
+            self.assertEqual(check(TagVariables(), {}),
+                             check_condition(conditions, TagVariables()), op)
+
+    def test_compile_casts_values_once(self):
+        casts = []
+
+        class CountingType(NumericType):
+            @staticmethod
+            def _assert_valid_value_and_cast(value):
+                casts.append(value)
+                return NumericType._assert_valid_value_and_cast(value)
+
+        class CountingVariables(BaseVariables):
+            @rule_variable(CountingType)
+            def ten(self):
+                return 10
+
+        check = compile_conditions({'all': [
+            {'name': 'ten', 'operator': 'greater_than_or_equal_to',
+             'value': 10.0},
+            {'name': 'ten', 'operator': 'less_than', 'value': 11}]},
+            CountingVariables)
+        self.assertEqual(casts, [10.0, 11])
+        self.assertTrue(check(CountingVariables(), {}))
+        # only the variable's value, once
+        self.assertEqual(casts, [10.0, 11, 10])
+
+    def test_compile_invalid_value(self):
+        conditions = {'name': 'ten', 'operator': 'greater_than', 'value': 'x'}
+        with self.assertRaisesRegex(AssertionError,
+                                    'x is not a valid numeric type'):
+            compile_conditions(conditions, SomeVariables)
+
+    def test_compile_empty_all_and_any(self):
+        with self.assertRaises(AssertionError):
+            compile_conditions({'all': []}, SomeVariables)
+        with self.assertRaises(AssertionError):
+            compile_conditions({'any': []}, SomeVariables)
+        with self.assertRaises(AssertionError):
+            compile_conditions({'all': [], 'any': []}, SomeVariables)
+
+    def test_run_cache_variables(self):
+        rules = RULES + [
+            {'conditions': {'all': [
+                {'name': 'foo', 'operator': 'non_empty', 'value': ''},
+                {'name': 'ten', 'operator': 'equal_to', 'value': 1}]},
+             'actions': []}]
+        compiled = compile_rules(rules, SomeVariables, SomeActions)
+
+        variables = SomeVariables(ten=1)
+        compiled.run(variables, SomeActions())
+        self.assertEqual(variables.calls, {'foo': 2, 'ten': 3})
+
+        variables = SomeVariables(ten=1)
+        self.assertTrue(compiled.run(variables, SomeActions(),
+                                     cache_variables=True))
+        self.assertEqual(variables.calls, {'foo': 2, 'ten': 1})
+
+
+class CampaignVariables(BaseVariables):
+
+    def __init__(self, business_unit='', job_title='', tags=(), age=30):
+        self._business_unit = business_unit
+        self._job_title = job_title
+        self._tags = list(tags)
+        self._age = age
+
+    @string_rule_variable
+    def business_unit(self):
+        return self._business_unit
+
+    @string_rule_variable(cache=False)
+    def job_title(self):
+        return self._job_title
+
+    @select_rule_variable()
+    def tags(self):
+        return self._tags
+
+    @numeric_rule_variable
+    def age(self):
+        return self._age
+
+
+class CampaignActions(BaseActions):
+
+    def __init__(self):
+        self.campaigns = []
+
+    @rule_action(params={'campaign_id': FIELD_TEXT})
+    def send_email(self, campaign_id):
+        self.campaigns.append(campaign_id)
+
+
+def _campaign(conditions, campaign_id):
+    return {'conditions': conditions,
+            'actions': [{'name': 'send_email',
+                         'params': {'campaign_id': campaign_id}}]}
+
+
+CAMPAIGNS = [
+    _campaign({'all': [
+        {'name': 'business_unit', 'operator': 'equal_to',
+         'value': 'Marketing'},
+        {'name': 'age', 'operator': 'greater_than', 'value': 40}]}, 0),
+    _campaign({'any': [
+        {'name': 'age', 'operator': 'less_than', 'value': 25}]}, 1),
+    _campaign({'name': 'business_unit', 'operator': 'equal_to',
+               'value': 'Sales'}, 2),
+    _campaign({'all': [
+        {'any': [{'name': 'age', 'operator': 'less_than', 'value': 25}]},
+        {'name': 'business_unit', 'operator': 'equal_to_case_insensitive',
+         'value': 'marketing'}]}, 3),
+    _campaign({'all': [
+        {'name': 'job_title', 'operator': 'equal_to', 'value': 'CEO'},
+        {'name': 'business_unit', 'operator': 'starts_with',
+         'value': 'Mark'}]}, 4),
+    _campaign({'name': 'business_unit', 'operator': 'starts_with',
+               'value': 'Sal'}, 5),
+    _campaign({'name': 'business_unit', 'operator': 'starts_with',
+               'value': ''}, 6),
+    _campaign({'name': 'tags', 'operator': 'contains', 'value': 'Golf'}, 7),
+    _campaign({'name': 'tags', 'operator': 'contains', 'value': 3}, 8),
+    _campaign({'name': 'job_title', 'operator': 'equal_to',
+               'value': 'CEO'}, 9),
+    _campaign({'name': 'business_unit', 'operator': 'non_empty',
+               'value': ''}, 10),
+]
+
+
+class RuleIndexTests(TestCase):
+
+    def test_candidate_positions(self):
+        index = RuleIndex(CAMPAIGNS, CampaignVariables)
+        # any, first condition an any, first condition on a cache=False
+        # variable, cache=False variable, non-indexable operator
+        self.assertEqual(index.unindexed, [1, 3, 4, 9, 10])
+        self.assertEqual(
+            index.candidate_positions(CampaignVariables('Marketing')),
+            [0, 1, 3, 4, 6, 9, 10])
+        self.assertEqual(
+            index.candidate_positions(CampaignVariables('Sales',
+                                                        tags=['GOLF', 3])),
+            [1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
+        self.assertEqual(index.candidate_positions(CampaignVariables(
+            'Sa', tags=[[1], 'tennis'])), [1, 3, 4, 6, 9, 10])
+
+    def test_run_with_index_matches_run_all(self):
+        compiled = compile_rules(CAMPAIGNS, CampaignVariables,
+                                 CampaignActions, use_index=True)
+        self.assertTrue(compiled.index is not None)
+        for args in [('Marketing', 'CEO', [], 50), ('Sales', '', ['golf']),
+                     ('marketing', '', [3], 20), ('', 'CEO'),
+                     ('Marketing', '', [], 20)]:
+            for stop_on_first_trigger in [False, True]:
+                compiled_actions = CampaignActions()
+                actions = CampaignActions()
+                self.assertEqual(
+                    compiled.run(CampaignVariables(*args), compiled_actions,
+                                 stop_on_first_trigger=stop_on_first_trigger,
+                                 cache_variables=True),
+                    run_all(CAMPAIGNS, CampaignVariables(*args), actions,
+                            stop_on_first_trigger=stop_on_first_trigger))
+                self.assertEqual(compiled_actions.campaigns,
+                                 actions.campaigns)
+
+    def test_guarded_and_failing_variables(self):
+        class AddressVariables(BaseVariables):
+            def __init__(self, record):
+                self.record = record
+
+            @boolean_rule_variable
+            def has_address(self):
+                return 'address' in self.record
+
+            @string_rule_variable
+            def city(self):
+                return self.record['address']['city']
+
+        rules = [
+            _campaign({'name': 'has_address', 'operator': 'is_false',
+                       'value': ''}, 0),
+            _campaign({'all': [
+                {'name': 'has_address', 'operator': 'is_true', 'value': ''},
+                {'name': 'city', 'operator': 'equal_to', 'value': 'Paris'}]},
+                1),
+            _campaign({'name': 'city', 'operator': 'equal_to',
+                       'value': 'Paris'}, 2),
+        ]
+        compiled = compile_rules(rules[1:2], AddressVariables,
+                                 CampaignActions, use_index=True)
+        self.assertEqual(compiled.index.unindexed, [0])
+        self.assertFalse(compiled.run(AddressVariables({}), CampaignActions()))
+
+        compiled = compile_rules(rules, AddressVariables, CampaignActions,
+                                 use_index=True)
+        # city raises, but rule 2 is never reached
+        actions = CampaignActions()
+        self.assertTrue(compiled.run(AddressVariables({}), actions,
+                                     stop_on_first_trigger=True))
+        self.assertEqual(actions.campaigns, [0])
+        self.assertEqual(compiled.index.candidate_positions(
+            AddressVariables({})), [0, 1, 2])
+        with self.assertRaises(KeyError):
+            compiled.run(AddressVariables({}), CampaignActions())
+
+    def test_overridden_operators_are_not_indexed(self):
+        class LooseStringType(StringType):
+            @type_operator(FIELD_TEXT)
+            def equal_to(self, other_string):
+                return self.value.strip() == other_string.strip()
+
+        class LooseVariables(BaseVariables):
+            @rule_variable(LooseStringType)
+            def business_unit(self):
+                return ' Sales '
+
+        rules = [_campaign({'name': 'business_unit', 'operator': 'equal_to',
+                            'value': 'Sales'}, 0)]
+        index = RuleIndex(rules, LooseVariables)
+        self.assertEqual(index.unindexed, [0])
+
+    def test_unhashable_rule_values_are_not_indexed(self):
+        rules = [_campaign({'name': 'tags', 'operator': 'contains',
+                            'value': ['a']}, 0)]
+        index = RuleIndex(rules, CampaignVariables)
+        self.assertEqual(index.unindexed, [0])
+
+    def test_one_fetch_per_variable(self):
+        class CountingVariables(CampaignVariables):
+            calls = 0
+
+            @string_rule_variable
+            def business_unit(self):
+                self.calls += 1
+                return self._business_unit
+
+        index = RuleIndex(CAMPAIGNS, CountingVariables)
+        # equal_to, starts_with and equal_to_case_insensitive lookups
+        variables = CountingVariables('Marketing')
+        index.candidate_positions(variables)
+        self.assertEqual(variables.calls, 1)
+
+    def test_prefix_lengths(self):
+        rules = [_campaign({'name': 'business_unit', 'operator': 'starts_with',
+                            'value': prefix}, number)
+                 for number, prefix in enumerate(['Sal', 'S', 'Sales', 'Mar'])]
+        index = RuleIndex(rules, CampaignVariables)
+        self.assertEqual(
+            index.candidate_positions(CampaignVariables('Sales')), [0, 1, 2])
+        rules.append(_campaign({'name': 'business_unit',
+                                'operator': 'starts_with', 'value': 'Sa'}, 4))
+        index = RuleIndex(rules, CampaignVariables)
+        self.assertEqual(
+            index.candidate_positions(CampaignVariables('Sa')), [1, 4])
+
+    def test_triggered_rules(self):
+        compiled = compile_rules(CAMPAIGNS, CampaignVariables,
+                                 CampaignActions, use_index=True)
+        variables = CampaignVariables('Sales', tags=['golf'], age=20)
+        self.assertEqual(compiled.triggered_rules(variables),
+                         [1, 2, 5, 6, 7, 10])
+        self.assertEqual(compiled.triggered_rules(
+            variables, stop_on_first_trigger=True, cache_variables=True), [1])
+
+        compiled = compile_rules(CAMPAIGNS, CampaignVariables, CampaignActions)
+        self.assertEqual(compiled.triggered_rules(variables),
+                         [1, 2, 5, 6, 7, 10])
+
+
+class JobVariables(BaseVariables):
+
+    def __init__(self, job_title, department=''):
+        self._job_title = job_title
+        self._department = department
+        self.calls = 0
+
+    @string_rule_variable
+    def job_title(self):
+        self.calls += 1
+        return self._job_title
+
+    @string_rule_variable(cache=False)
+    def department(self):
+        return self._department
+
+
+JOB_RULES = [
+    _campaign({'name': 'job_title', 'operator': 'contains',
+               'value': 'Engineer'}, 0),
+    _campaign({'name': 'job_title', 'operator': 'contains',
+               'value': 'Eng'}, 1),
+    _campaign({'any': [
+        {'name': 'job_title', 'operator': 'starts_with', 'value': 'Senior'},
+        {'name': 'job_title', 'operator': 'ends_with', 'value': 'Manager'}]},
+        2),
+    _campaign({'all': [
+        {'name': 'job_title', 'operator': 'equal_to', 'value': 'CEO'},
+        {'name': 'department', 'operator': 'contains', 'value': 'Exec'}]}, 3),
+    _campaign({'name': 'job_title', 'operator': 'equal_to_case_insensitive',
+               'value': 'ceo'}, 4),
+    _campaign({'name': 'job_title', 'operator': 'contains', 'value': None}, 5),
+    _campaign({'name': 'job_title', 'operator': 'ends_with', 'value': 'r'}, 6),
+    _campaign({'name': 'department', 'operator': 'contains',
+               'value': 'Sales'}, 7),
+]
+
+
+class PatternMatcherTests(TestCase):
+
+    def test_groups(self):
+        patterns = PatternMatcher(JOB_RULES, JobVariables)
+        # department is declared with cache=False
+        self.assertEqual(list(patterns.groups), ['job_title'])
+        group = patterns.groups['job_title']
+        self.assertEqual(group.scan('Senior Engineering Manager'), set([
+            ('contains', 'Engineer'), ('contains', 'Eng'), ('contains', ''),
+            ('starts_with', 'Senior'), ('ends_with', 'Manager'),
+            ('ends_with', 'r')]))
+        self.assertEqual(group.scan('CEO'), set([('contains', ''),
+                                                 ('equal_to', 'CEO')]))
+        self.assertEqual(group.scan(''), set([('contains', '')]))
+
+    def test_automaton(self):
+        automaton = _Automaton(['he', 'she', 'his', 'hers', 'is'])
+        self.assertEqual(automaton.search('ushers'),
+                         set(['she', 'he', 'hers']))
+        self.assertEqual(automaton.search('ahishe'),
+                         set(['his', 'is', 'she', 'he']))
+        self.assertEqual(automaton.search('xyz'), set())
+
+        automaton = _Automaton(['abcd', 'bce', 'cx'])
+        self.assertEqual(automaton.search('abcx'), set(['cx']))
+        self.assertEqual(automaton.search('abce'), set(['bce']))
+        self.assertEqual(automaton.search('abcd'), set(['abcd']))
+
+    def test_run_matches_run_all(self):
+        compiled = compile_rules(JOB_RULES, JobVariables, CampaignActions,
+                                 group_patterns=True)
+        for args in [('Senior Engineering Manager',), ('CEO', 'Executive'),
+                     ('ceo', 'Sales'), ('Engine',), ('',), ('Designer',)]:
+            for cache_variables in [False, True]:
+                compiled_actions = CampaignActions()
+                actions = CampaignActions()
+                self.assertEqual(
+                    compiled.run(JobVariables(*args), compiled_actions,
+                                 cache_variables=cache_variables),
+                    run_all(JOB_RULES, JobVariables(*args), actions))
+                self.assertEqual(compiled_actions.campaigns,
+                                 actions.campaigns)
+
+    def test_one_scan_per_run(self):
+        compiled = compile_rules(JOB_RULES, JobVariables, CampaignActions,
+                                 group_patterns=True)
+        values = {}
+        variables = JobVariables('Senior Engineer')
+        self.assertEqual(
+            [rule.check(variables, values) for rule in compiled],
+            [True, True, True, False, False, True, True, False])
+        self.assertEqual(variables.calls, 1)
+        self.assertEqual(values[('patterns', 'job_title')],
+                         set([('contains', 'Engineer'), ('contains', 'Eng'),
+                              ('contains', ''), ('starts_with', 'Senior'),
+                              ('ends_with', 'r')]))
+
+    def test_single_conditions_and_overridden_operators_are_not_grouped(self):
+        class LooseStringType(StringType):
+            @type_operator(FIELD_TEXT)
+            def contains(self, other_string):
+                return other_string.lower() in self.value.lower()
+
+        class LooseVariables(BaseVariables):
+            @rule_variable(LooseStringType)
+            def job_title(self):
+                return 'Engineer'
+
+        self.assertEqual(PatternMatcher(JOB_RULES[:1], JobVariables).groups,
+                         {})
+        patterns = PatternMatcher(JOB_RULES[:3], LooseVariables)
+        self.assertEqual(patterns.groups['job_title'].keys,
+                         frozenset([('starts_with', 'Senior'),
+                                    ('ends_with', 'Manager')]))
+        compiled = compile_rules(JOB_RULES[:3], LooseVariables,
+                                 CampaignActions, group_patterns=True)
+        self.assertEqual(compiled.triggered_rules(LooseVariables(),
+                                                  cache_variables=True),
+                         [0, 1])
+
+
+class OrderVariables(BaseVariables):
+
+    def __init__(self, total, items=1):
+        self._total = total
+        self._items = items
+        self.calls = 0
+
+    @numeric_rule_variable
+    def total(self):
+        self.calls += 1
+        return self._total
+
+    @numeric_rule_variable(cache=False)
+    def items(self):
+        return self._items
+
+
+def _tier(low, high, campaign_id):
+    return _campaign({'all': [
+        {'name': 'total', 'operator': 'greater_than_or_equal_to',
+         'value': low},
+        {'name': 'total', 'operator': 'less_than', 'value': high}]},
+        campaign_id)
+
+
+TIER_RULES = [_tier(0, 10, 0), _tier(10, 50, 1), _tier(50, 100.5, 2),
+              _campaign({'name': 'total', 'operator': 'equal_to',
+                         'value': 50}, 3),
+              _campaign({'name': 'total', 'operator': 'greater_than',
+                         'value': 100.5}, 4),
+              _campaign({'name': 'total', 'operator': 'less_than_or_equal_to',
+                         'value': Decimal('-1')}, 5),
+              _campaign({'name': 'items', 'operator': 'greater_than',
+                         'value': 3}, 6)]
+
+
+class RangeMatcherTests(TestCase):
+
+    def test_groups(self):
+        matcher = RangeMatcher(TIER_RULES, OrderVariables)
+        # items is declared with cache=False
+        self.assertEqual(list(matcher.groups), ['total'])
+        group = matcher.groups['total']
+        self.assertEqual(group.bounds, [Decimal(-1), Decimal(0), Decimal(10),
+                                        Decimal(50), Decimal('100.5')])
+        self.assertEqual(group.locate(Decimal(50)), (3, 4))
+        self.assertEqual(group.locate(Decimal(20)), (3, 3))
+        self.assertEqual(group.locate(Decimal(-5)), (0, 0))
+
+    def test_run_matches_run_all(self):
+        compiled = compile_rules(TIER_RULES, OrderVariables, CampaignActions,
+                                 group_ranges=True)
+        epsilon = NumericType.EPSILON
+        totals = [-2, -1, 0, 5, 10, 49.9999, 50, 75, 100.5, 101,
+                  Decimal(10) - epsilon, Decimal(10) - epsilon / 2,
+                  Decimal(50) + epsilon / 2, Decimal(50) + 2 * epsilon,
+                  Decimal(-1) + epsilon, Decimal('100.5') + epsilon]
+        for total in totals:
+            for cache_variables in [False, True]:
+                compiled_actions = CampaignActions()
+                actions = CampaignActions()
+                self.assertEqual(
+                    compiled.run(OrderVariables(total, 5), compiled_actions,
+                                 cache_variables=cache_variables),
+                    run_all(TIER_RULES, OrderVariables(total, 5), actions))
+                self.assertEqual(compiled_actions.campaigns,
+                                 actions.campaigns, total)
+
+    def test_one_lookup_per_run(self):
+        compiled = compile_rules(TIER_RULES, OrderVariables, CampaignActions,
+                                 group_ranges=True)
+        values = {}
+        variables = OrderVariables(50)
+        self.assertEqual(
+            [rule.check(variables, values) for rule in compiled],
+            [False, False, True, True, False, False, False])
+        self.assertEqual(variables.calls, 1)
+        self.assertEqual(values[('ranges', 'total')], (3, 4))
+
+    def test_float_numbers(self):
+        for group_ranges in [False, True]:
+            compiled = compile_rules(TIER_RULES, OrderVariables,
+                                     CampaignActions,
+                                     group_ranges=group_ranges,
+                                     float_numbers=True)
+            for total in [-2, -1, 0, 5, 10, 49.99, 50, Decimal('75.5'), 100.5,
+                          101, 10 - 1e-7, 50 + 2e-6]:
+                for cache_variables in [False, True]:
+                    compiled_actions = CampaignActions()
+                    actions = CampaignActions()
+                    self.assertEqual(
+                        compiled.run(OrderVariables(total, 5),
+                                     compiled_actions,
+                                     cache_variables=cache_variables),
+                        run_all(TIER_RULES, OrderVariables(total, 5), actions))
+                    self.assertEqual(compiled_actions.campaigns,
+                                     actions.campaigns, total)
+
+        values = {}
+        compiled.rules[2].check(OrderVariables(Decimal('75.5')), values)
+        self.assertEqual(values['total'], 75.5)
+        self.assertTrue(isinstance(values['total'], float))
+
+    def test_conditions_outside_the_groups(self):
+        class PriceType(NumericType):
+            @type_operator(FIELD_NO_INPUT)
+            def is_free(self):
+                return self.value == 0
+
+        class PriceVariables(BaseVariables):
+            @rule_variable(PriceType)
+            def total(self):
+                return 0
+
+        rules = [_tier(0, 10, 0),
+                 _campaign({'name': 'total', 'operator': 'is_free',
+                            'value': None}, 1)]
+        matcher = RangeMatcher(rules, PriceVariables)
+        check = compile_conditions(rules[1]['conditions'], PriceVariables,
+                                   [matcher])
+        self.assertTrue(check(PriceVariables(), {}))
+        # not one of the conditions the matcher was built from
+        check = compile_conditions({'name': 'total', 'operator': 'less_than',
+                                    'value': 7}, PriceVariables, [matcher])
+        self.assertTrue(check(PriceVariables(), {}))
+
+
+class RulesetCacheTests(TestCase):
+
+    def test_fingerprint_ignores_key_order_and_whitespace(self):
+        text = json.dumps(RULES)
+        reloaded = json.loads(json.dumps(json.loads(text), indent=4))
+        reordered = [dict(reversed(list(rule.items()))) for rule in RULES]
+        self.assertEqual(ruleset_fingerprint(reloaded),
+                         ruleset_fingerprint(RULES))
+        self.assertEqual(ruleset_fingerprint(reordered),
+                         ruleset_fingerprint(RULES))
+        self.assertEqual(ruleset_fingerprint(iter(RULES)),
+                         ruleset_fingerprint(RULES))
+        self.assertEqual(len(ruleset_fingerprint(RULES)), 64)
+
+    def test_fingerprint_depends_on_content(self):
+        changed = json.loads(json.dumps(RULES))
+        changed[0]['actions'][0]['params']['bar'] = 'other'
+        self.assertNotEqual(ruleset_fingerprint(changed),
+                            ruleset_fingerprint(RULES))
+        self.assertNotEqual(ruleset_fingerprint(RULES[::-1]),
+                            ruleset_fingerprint(RULES))
+        # values json can't encode are tagged with their type
+        self.assertNotEqual(
+            ruleset_fingerprint([{'value': Decimal('1.5')}]),
+            ruleset_fingerprint([{'value': '1.5'}]))
+        self.assertNotEqual(
+            ruleset_fingerprint([{'value': Decimal('1.5')}]),
+            ruleset_fingerprint([{'value': 1.5}]))
+        self.assertEqual(
+            ruleset_fingerprint([{'value': Decimal('1.5')}]),
+            ruleset_fingerprint([{'value': Decimal('1.5')}]))
+        self.assertEqual(
+            ruleset_fingerprint([{'value': set(['b', 'a', 3])}]),
+            ruleset_fingerprint([{'value': set([3, 'a', 'b'])}]))
+        self.assertNotEqual(
+            ruleset_fingerprint([{'value': set(['3'])}]),
+            ruleset_fingerprint([{'value': set([3])}]))
+
+    def test_compile_is_cached(self):
+        cache = RulesetCache(maxsize=2)
+        ruleset = cache.compile(RULES, SomeVariables, SomeActions)
+        reloaded = json.loads(json.dumps(RULES, indent=2))
+        self.assertIs(cache.compile(reloaded, SomeVariables, SomeActions),
+                      ruleset)
+        self.assertEqual(cache.info(), RulesetCacheInfo(1, 1, 0, 2, 1))
+        self.assertEqual(cache.hit_rate(), 0.5)
+
+        actions = SomeActions()
+        self.assertTrue(ruleset.run(SomeVariables(), actions))
+        self.assertTrue(actions.calls)
+
+    def test_key_includes_classes_and_options(self):
+        cache = RulesetCache()
+        ruleset = cache.compile(RULES, SomeVariables, SomeActions)
+        indexed = cache.compile(RULES, SomeVariables, SomeActions,
+                                use_index=True)
+        self.assertIsNot(indexed, ruleset)
+        self.assertIsNotNone(indexed.index)
+
+        class OtherActions(SomeActions):
+            pass
+        self.assertIsNot(cache.compile(RULES, SomeVariables, OtherActions),
+                         ruleset)
+        network = cache.compile(RULES, SomeVariables, SomeActions,
+                                compiler=compile_network)
+        self.assertIsInstance(network, RuleNetwork)
+        self.assertEqual(cache.info().misses, 4)
+        self.assertIs(cache.compile(RULES, SomeVariables, SomeActions,
+                                    use_index=True), indexed)
+
+    def test_known_fingerprint(self):
+        cache = RulesetCache()
+        ruleset = cache.compile(RULES, SomeVariables, SomeActions,
+                                fingerprint='v1')
+        self.assertIs(cache.compile([], SomeVariables, SomeActions,
+                                    fingerprint='v1'), ruleset)
+
+    def test_evictions(self):
+        cache = RulesetCache(maxsize=2)
+        first = cache.compile(RULES[:1], SomeVariables, SomeActions)
+        cache.compile(RULES[1:], SomeVariables, SomeActions)
+        # first is now the most recently used
+        cache.compile(RULES[:1], SomeVariables, SomeActions)
+        cache.compile(RULES, SomeVariables, SomeActions)
+        self.assertEqual(cache.info(), RulesetCacheInfo(1, 3, 1, 2, 2))
+        self.assertIs(cache.compile(RULES[:1], SomeVariables, SomeActions),
+                      first)
+        cache.clear()
+        self.assertEqual(cache.info(), RulesetCacheInfo(0, 0, 0, 2, 0))
+        self.assertEqual(cache.hit_rate(), 0.0)
+
+    def test_invalid_rules_are_not_cached(self):
+        cache = RulesetCache()
+        rules = [{'conditions': {'name': 'missing', 'operator': 'equal_to',
+                                 'value': 1},
+                  'actions': []}]
+        for _ in range(2):
+            with self.assertRaisesRegex(AssertionError,
+                                        'Variable missing is not defined'):
+                cache.compile(rules, SomeVariables, SomeActions)
+        self.assertEqual(cache.info(), RulesetCacheInfo(0, 0, 0, 32, 0))
@@ -0,0 +1,123 @@
+from business_rules import compile_rules, run_all
+from business_rules.actions import BaseActions, rule_action
+from business_rules.deferred import ActionBuffer, BatchActionSink
+from business_rules.fields import FIELD_TEXT
+from business_rules.variables import BaseVariables, string_rule_variable
+
+from unittest import TestCase
+
+
+class ProfileVariables(BaseVariables):
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    @string_rule_variable
+    def job_title(self):
+        return self.profile['job_title']
+
+
+class EmailActions(BaseActions):
+
+    def __init__(self):
+        self.calls = []
+
+    @rule_action(params={'recipient_email': FIELD_TEXT,
+                         'campaign_id': FIELD_TEXT})
+    def send_email(self, recipient_email, campaign_id):
+        self.calls.append(('send_email', recipient_email, campaign_id))
+
+    def send_email_batch(self, list_of_params):
+        self.calls.append(('send_email_batch', list_of_params))
+
+    @rule_action(params={'note': FIELD_TEXT})
+    def log_match(self, note):
+        self.calls.append(('log_match', note))
+
+
+RULES = [
+    {'conditions': {'name': 'job_title', 'operator': 'contains',
+                    'value': 'Engineer'},
+     'actions': [{'name': 'send_email',
+                  'params': {'recipient_email': 'eng@example.com',
+                             'campaign_id': 'eng'}},
+                 {'name': 'log_match', 'params': {'note': 'engineer'}}]},
+    {'conditions': {'name': 'job_title', 'operator': 'equal_to',
+                    'value': 'CEO'},
+     'actions': [{'name': 'send_email',
+                  'params': {'recipient_email': 'ceo@example.com',
+                             'campaign_id': 'exec'}}]},
+]
+
+PROFILES = [{'id': 1, 'job_title': 'Engineer'},
+            {'id': 2, 'job_title': 'CEO'},
+            {'id': 3, 'job_title': 'Designer'},
+            {'id': 4, 'job_title': 'Engineer'}]
+
+
+class ActionBufferTests(TestCase):
+
+    def test_run_all_defers_actions(self):
+        batches = []
+        with ActionBuffer(batches.append, batch_size=3) as buffer:
+            for profile in PROFILES:
+                self.assertEqual(
+                    run_all(RULES, ProfileVariables(profile),
+                            buffer.actions_for(profile['id'])),
+                    profile['job_title'] != 'Designer')
+            self.assertEqual(len(batches), 1)
+        self.assertEqual(batches, [
+            [('send_email', {'recipient_email': 'eng@example.com',
+                             'campaign_id': 'eng'}, 1),
+             ('log_match', {'note': 'engineer'}, 1),
+             ('send_email', {'recipient_email': 'ceo@example.com',
+                             'campaign_id': 'exec'}, 2)],
+            [('send_email', {'recipient_email': 'eng@example.com',
+                             'campaign_id': 'eng'}, 4),
+             ('log_match', {'note': 'engineer'}, 4)]])
+
+    def test_compiled_ruleset_defers_actions(self):
+        ruleset = compile_rules(RULES, ProfileVariables, EmailActions)
+        expected, batches = [], []
+        with ActionBuffer(expected.append) as buffer:
+            for profile in PROFILES:
+                run_all(RULES, ProfileVariables(profile),
+                        buffer.actions_for(profile['id']))
+        with ActionBuffer(batches.append) as buffer:
+            for profile in PROFILES:
+                ruleset.run(ProfileVariables(profile),
+                            buffer.actions_for(profile['id']))
+        self.assertEqual(batches, expected)
+
+    def test_batch_action_sink(self):
+        actions = EmailActions()
+        with ActionBuffer(BatchActionSink(actions)) as buffer:
+            for profile in PROFILES:
+                run_all(RULES, ProfileVariables(profile),
+                        buffer.actions_for(profile['id']))
+            self.assertEqual(actions.calls, [])
+        self.assertEqual(actions.calls, [
+            ('send_email_batch', [
+                {'recipient_email': 'eng@example.com', 'campaign_id': 'eng'},
+                {'recipient_email': 'ceo@example.com', 'campaign_id': 'exec'},
+                {'recipient_email': 'eng@example.com', 'campaign_id': 'eng'}]),
+            ('log_match', 'engineer'),
+            ('log_match', 'engineer')])
+
+    def test_not_flushed_on_error(self):
+        batches = []
+        with self.assertRaises(ValueError):
+            with ActionBuffer(batches.append) as buffer:
+                buffer.actions_for(1).log_match(note='x')
+                raise ValueError()
+        self.assertEqual(batches, [])
+        self.assertEqual(len(buffer.entries), 1)
+
+    def test_unknown_actions(self):
+        buffer = ActionBuffer([].append, actions_cls=EmailActions)
+        err_string = 'Action fakeone is not defined in class EmailActions'
+        with self.assertRaisesRegex(AssertionError, err_string):
+            run_all([dict(RULES[0], actions=[{'name': 'fakeone'}])],
+                    ProfileVariables(PROFILES[0]), buffer.actions_for(1))
+        with self.assertRaises(AttributeError):
+            buffer.actions_for(1)._private
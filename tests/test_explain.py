@@ -0,0 +1,174 @@
+import json
+
+from business_rules.actions import BaseActions, rule_action
+from business_rules.engine import run
+from business_rules.explain import Explanation
+from business_rules.fields import FIELD_NUMERIC
+from business_rules.profiling import Profiler
+from business_rules.variables import (BaseVariables, numeric_rule_variable,
+                                      string_rule_variable)
+
+from unittest import TestCase
+
+
+class OrderVariables(BaseVariables):
+
+    def __init__(self, order):
+        self.order = order
+
+    @numeric_rule_variable
+    def total(self):
+        return self.order['total']
+
+    @string_rule_variable
+    def country(self):
+        return self.order['country']
+
+
+class OrderActions(BaseActions):
+
+    def __init__(self):
+        self.discounts = []
+
+    @rule_action(params={'percent': FIELD_NUMERIC})
+    def discount(self, percent):
+        self.discounts.append(percent)
+
+
+LOCAL = {'name': 'country', 'operator': 'equal_to', 'value': 'FR'}
+SMALL = {'name': 'total', 'operator': 'less_than', 'value': 10}
+RULE = {'name': 'big local order',
+        'conditions': {'all': [
+            {'name': 'total', 'operator': 'greater_than', 'value': 100},
+            {'any': [LOCAL, SMALL]}]},
+        'actions': [{'name': 'discount', 'params': {'percent': 10}}]}
+
+
+class ExplainTests(TestCase):
+
+    def test_triggered(self):
+        actions = OrderActions()
+        explanation = run(RULE,
+                          OrderVariables({'total': 150, 'country': 'FR'}),
+                          actions, explain=True)
+        self.assertIsInstance(explanation, Explanation)
+        self.assertTrue(explanation)
+        self.assertEqual(actions.discounts, [10])
+        self.assertEqual(explanation.to_dict(), {
+            'triggered': True,
+            'conditions': {'all': [
+                {'name': 'total', 'operator': 'greater_than', 'value': 100,
+                 'variable_value': 150, 'result': True},
+                {'any': [
+                    {'name': 'country', 'operator': 'equal_to', 'value': 'FR',
+                     'variable_value': 'FR', 'result': True},
+                    {'skipped': SMALL}],
+                 'result': True}],
+                'result': True}})
+        self.assertEqual(explanation.failed_conditions(), [])
+
+    def test_not_triggered(self):
+        actions = OrderActions()
+        explanation = run(RULE, OrderVariables({'total': 50, 'country': 'FR'}),
+                          actions, explain=True)
+        self.assertFalse(explanation)
+        self.assertFalse(explanation.triggered)
+        self.assertEqual(actions.discounts, [])
+        self.assertEqual(explanation.conditions['all'][1],
+                         {'skipped': RULE['conditions']['all'][1]})
+        self.assertEqual(explanation.failed_conditions(), [
+            {'name': 'total', 'operator': 'greater_than', 'value': 100,
+             'variable_value': 50, 'result': False}])
+
+    def test_every_any_failed(self):
+        explanation = run(RULE,
+                          OrderVariables({'total': 150, 'country': 'US'}),
+                          OrderActions(), explain=True)
+        self.assertFalse(explanation)
+        any_node = explanation.conditions['all'][1]
+        self.assertFalse(any_node['result'])
+        self.assertEqual([node['name'] for node
+                          in explanation.failed_conditions()],
+                         ['country', 'total'])
+        self.assertIs(explanation.rule, RULE)
+
+    def test_str(self):
+        explanation = run(RULE, OrderVariables({'total': 50, 'country': 'FR'}),
+                          OrderActions(), explain=True)
+        self.assertEqual(str(explanation), '\n'.join([
+            'big local order: not triggered',
+            '  all -> False',
+            '    total greater_than 100, variable was 50 -> False',
+            '    skipped any of 2 conditions']))
+        explanation = run({'conditions': SMALL, 'actions': []},
+                          OrderVariables({'total': 5}), OrderActions(),
+                          explain=True)
+        self.assertEqual(str(explanation), '\n'.join([
+            'rule: triggered',
+            "  total less_than 10, variable was 5 -> True"]))
+
+    def test_explain_with_tracer(self):
+        profiler = Profiler()
+        explanation = run(RULE,
+                          OrderVariables({'total': 150, 'country': 'FR'}),
+                          OrderActions(), tracer=profiler, explain=True)
+        self.assertTrue(explanation.triggered)
+        self.assertEqual(profiler.variables['country'].calls, 1)
+
+    def test_without_explain(self):
+        self.assertIs(run(RULE, OrderVariables({'total': 5, 'country': 'FR'}),
+                          OrderActions()), False)
+        self.assertIs(run(RULE,
+                          OrderVariables({'total': 150, 'country': 'FR'}),
+                          OrderActions(), tracer=Profiler()), True)
+
+
+class CodeVariables(BaseVariables):
+
+    def __init__(self, code, number):
+        self._code = code
+        self._number = number
+
+    @string_rule_variable
+    def code(self):
+        return self._code
+
+    @numeric_rule_variable
+    def number(self):
+        return self._number
+
+
+class RegexResultTests(TestCase):
+    """ matches_regex returns a match object or None, not a bool. """
+
+    def check(self, conditions, code, expected):
+        rule = {'conditions': conditions,
+                'actions': [{'name': 'discount', 'params': {'percent': 1}}]}
+        for options in [{}, {'tracer': Profiler()}, {'explain': True}]:
+            actions = OrderActions()
+            result = run(rule, CodeVariables(code, 5), actions, **options)
+            self.assertIs(bool(result), expected, options)
+            self.assertEqual(actions.discounts, [1] if expected else [])
+            if options.get('explain'):
+                self.assertIs(result.triggered, expected)
+                json.dumps(result.to_dict(), default=str)
+
+    def test_all(self):
+        conditions = {'all': [
+            {'name': 'code', 'operator': 'matches_regex', 'value': '^A'},
+            {'name': 'number', 'operator': 'equal_to', 'value': 5}]}
+        self.check(conditions, 'B1', False)
+        self.check(conditions, 'A1', True)
+
+    def test_any(self):
+        conditions = {'any': [
+            {'name': 'code', 'operator': 'matches_regex', 'value': '^A'},
+            {'name': 'number', 'operator': 'equal_to', 'value': 6}]}
+        self.check(conditions, 'B1', False)
+        self.check(conditions, 'A1', True)
+
+    def test_single_condition(self):
+        conditions = {'name': 'code', 'operator': 'matches_regex',
+                      'value': '^A'}
+        self.check(conditions, 'B1', False)
+        self.check(conditions, 'A1', True)
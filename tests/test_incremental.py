@@ -0,0 +1,167 @@
+from business_rules import run_all
+from business_rules.actions import BaseActions, rule_action
+from business_rules.fields import FIELD_TEXT
+from business_rules.incremental import compile_incremental
+from business_rules.variables import (BaseVariables, numeric_rule_variable,
+                                      string_rule_variable)
+
+from unittest import TestCase
+
+
+class ProfileVariables(BaseVariables):
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.calls = []
+
+    @string_rule_variable
+    def job_title(self):
+        self.calls.append('job_title')
+        return self.profile['job_title']
+
+    @numeric_rule_variable
+    def age(self):
+        self.calls.append('age')
+        return self.profile['age']
+
+    @string_rule_variable
+    def country(self):
+        self.calls.append('country')
+        return self.profile['country']
+
+
+class ProfileActions(BaseActions):
+
+    def __init__(self):
+        self.campaigns = []
+
+    @rule_action(params={'campaign_id': FIELD_TEXT})
+    def send_email(self, campaign_id):
+        self.campaigns.append(campaign_id)
+
+
+CTO = {'name': 'job_title', 'operator': 'equal_to', 'value': 'CTO'}
+OVER_40 = {'name': 'age', 'operator': 'greater_than', 'value': 40}
+FRANCE = {'name': 'country', 'operator': 'equal_to', 'value': 'FR'}
+
+
+def _rule(conditions, campaign_id):
+    return {'conditions': conditions,
+            'actions': [{'name': 'send_email',
+                         'params': {'campaign_id': campaign_id}}]}
+
+
+SENIOR_CTO = _rule({'all': [CTO, OVER_40]}, 'senior-cto')
+FRENCH = _rule(FRANCE, 'french')
+CTO_OR_FRENCH = _rule({'any': [CTO, {'all': [FRANCE, OVER_40]}]},
+                      'cto-or-french')
+RULES = [SENIOR_CTO, FRENCH, CTO_OR_FRENCH]
+
+
+class IncrementalEvaluatorTests(TestCase):
+
+    def setUp(self):
+        self.evaluator = compile_incremental(RULES, ProfileVariables,
+                                             ProfileActions)
+        self.profile = {'job_title': 'CEO', 'age': 45, 'country': 'US'}
+
+    def update(self, changed=None, key=1, actions=None):
+        variables = ProfileVariables(self.profile)
+        flipped = self.evaluator.update(key, variables, changed, actions)
+        return [rule['actions'][0]['params']['campaign_id']
+                for rule, _ in flipped], \
+            [triggered for _, triggered in flipped], variables.calls
+
+    def test_first_update_evaluates_everything(self):
+        self.profile['country'] = 'FR'
+        names, triggered, calls = self.update()
+        self.assertEqual(names, ['french', 'cto-or-french'])
+        self.assertEqual(triggered, [True, True])
+        self.assertEqual(self.evaluator.triggered_rules(1),
+                         [FRENCH, CTO_OR_FRENCH])
+        self.assertEqual(len(self.evaluator), 1)
+
+    def test_only_dependent_conditions_are_rechecked(self):
+        self.update()
+        self.profile['job_title'] = 'CTO'
+        names, triggered, calls = self.update(['job_title'])
+        self.assertEqual(names, ['senior-cto', 'cto-or-french'])
+        self.assertEqual(triggered, [True, True])
+        # age was skipped by the first update
+        self.assertEqual(calls, ['job_title', 'age'])
+
+        self.profile['job_title'] = 'CFO'
+        names, triggered, calls = self.update(['job_title'])
+        self.assertEqual(names, ['senior-cto', 'cto-or-french'])
+        self.assertEqual(triggered, [False, False])
+        # the outcome of country is remembered
+        self.assertEqual(calls, ['job_title'])
+
+    def test_unchanged_outcome_reports_nothing(self):
+        self.profile['job_title'] = 'CTO'
+        self.update()
+        self.profile['age'] = 50
+        names, _, calls = self.update(['age'])
+        self.assertEqual(names, [])
+        self.assertEqual(calls, ['age'])
+        names, _, calls = self.update(['country'])
+        self.assertEqual(names, [])
+        # fetched once for french, cto-or-french short-circuits before it
+        self.assertEqual(calls, ['country'])
+
+    def test_runs_actions_of_newly_triggered_rules(self):
+        actions = ProfileActions()
+        self.update(actions=actions)
+        self.profile['country'] = 'FR'
+        self.update(['country'], actions=actions)
+        self.profile['country'] = 'US'
+        self.update(['country'], actions=actions)
+        self.assertEqual(actions.campaigns, ['french', 'cto-or-french'])
+
+    def test_records_are_independent(self):
+        self.update(key=1)
+        self.profile['job_title'] = 'CTO'
+        self.assertEqual(self.update(key=2)[0],
+                         ['senior-cto', 'cto-or-french'])
+        self.assertEqual(self.evaluator.triggered_rules(1), [])
+        self.evaluator.forget(2)
+        self.assertEqual(self.evaluator.triggered_rules(2), [])
+        self.assertEqual(len(self.evaluator), 1)
+
+    def test_changed_none_reevaluates_everything(self):
+        self.update()
+        self.profile.update(job_title='CTO', country='FR')
+        names, _, _ = self.update(None)
+        self.assertEqual(names, ['senior-cto', 'french', 'cto-or-french'])
+
+    def test_unknown_variable(self):
+        self.update()
+        with self.assertRaisesRegex(AssertionError,
+                                    'Variable salary is not defined'):
+            self.update(['salary'])
+
+    def test_error_drops_the_state(self):
+        self.update()
+        del self.profile['age']
+        self.profile['job_title'] = 'CTO'
+        with self.assertRaises(KeyError):
+            self.update(['job_title', 'age'])
+        self.assertEqual(len(self.evaluator), 0)
+        self.profile['age'] = 45
+        self.assertEqual(self.update(['job_title'])[0],
+                         ['senior-cto', 'cto-or-french'])
+
+    def test_matches_run_all(self):
+        changes = [('job_title', 'CTO'), ('age', 30), ('country', 'FR'),
+                   ('age', 41), ('job_title', 'CEO'), ('country', 'US'),
+                   ('age', 39), ('job_title', 'CTO')]
+        self.update()
+        for name, value in changes:
+            self.profile[name] = value
+            self.update([name])
+            actions = ProfileActions()
+            run_all(RULES, ProfileVariables(self.profile), actions)
+            self.assertEqual(
+                [rule['actions'][0]['params']['campaign_id']
+                 for rule in self.evaluator.triggered_rules(1)],
+                actions.campaigns)
@@ -1,4 +1,4 @@
-from business_rules.engine import check_condition
+from business_rules.engine import check_condition, run, run_all
 from business_rules import export_rule_data
 from business_rules.actions import rule_action, BaseActions
 from business_rules.variables import BaseVariables, string_rule_variable, numeric_rule_variable, boolean_rule_variable
@@ -171,3 +171,67 @@ class IntegrationTests(TestCase):
                             {'input_type': 'text', 'label': 'Matches Regex', 'name': 'matches_regex'},
                             {'input_type': 'none', 'label': 'Non Empty', 'name': 'non_empty'},
                             {'input_type': 'text', 'label': 'Starts With', 'name': 'starts_with'}]})
+
+
+class CountingVariables(BaseVariables):
+
+    def __init__(self):
+        self.calls = {'ten': 0, 'volatile': 0}
+
+    @numeric_rule_variable
+    def ten(self):
+        self.calls['ten'] += 1
+        return 10
+
+    @numeric_rule_variable(cache=False)
+    def volatile(self):
+        self.calls['volatile'] += 1
+        return 1
+
+
+class VariableCacheTests(TestCase):
+    """ Tests for run_all(..., cache_variables=True).
+    """
+    rules = [
+        {'conditions': {'all': [
+            {'name': 'ten', 'operator': 'greater_than', 'value': 5},
+            {'name': 'volatile', 'operator': 'equal_to', 'value': 1}]},
+         'actions': []},
+        {'conditions': {'any': [
+            {'name': 'volatile', 'operator': 'less_than', 'value': 0},
+            {'name': 'ten', 'operator': 'equal_to', 'value': 10}]},
+         'actions': []},
+    ]
+
+    def test_variables_not_cached_by_default(self):
+        variables = CountingVariables()
+        self.assertTrue(run_all(self.rules, variables, SomeActions()))
+        self.assertEqual(variables.calls, {'ten': 2, 'volatile': 2})
+
+    def test_cache_variables(self):
+        variables = CountingVariables()
+        self.assertTrue(run_all(self.rules, variables, SomeActions(),
+                                cache_variables=True))
+        self.assertEqual(variables.calls, {'ten': 1, 'volatile': 2})
+
+    def test_cache_is_per_run_all_call(self):
+        variables = CountingVariables()
+        run_all(self.rules, variables, SomeActions(), cache_variables=True)
+        run_all(self.rules, variables, SomeActions(), cache_variables=True)
+        self.assertEqual(variables.calls, {'ten': 2, 'volatile': 4})
+
+    def test_run_shares_values(self):
+        variables, values = CountingVariables(), {}
+        for rule in self.rules:
+            run(rule, variables, SomeActions(), values=values)
+        self.assertEqual(variables.calls, {'ten': 1, 'volatile': 2})
+        self.assertEqual(list(values), ['ten'])
+
+    def test_errors_are_unchanged(self):
+        condition = {'name': 'food', 'operator': 'equal_to', 'value': 'm'}
+        err_string = 'Variable food is not defined in class CountingVariables'
+        with self.assertRaisesRegex(AssertionError, err_string):
+            check_condition(condition, CountingVariables(), {})
+        with self.assertRaisesRegex(AssertionError, err_string):
+            run_all([{'conditions': condition, 'actions': []}],
+                    CountingVariables(), SomeActions(), cache_variables=True)
@@ -0,0 +1,122 @@
+from business_rules import run_all
+from business_rules.actions import BaseActions, rule_action
+from business_rules.fields import FIELD_TEXT
+from business_rules.network import compile_network
+from business_rules.variables import (BaseVariables, numeric_rule_variable,
+                                      select_multiple_rule_variable,
+                                      string_rule_variable)
+
+from unittest import TestCase
+
+
+class ProfileVariables(BaseVariables):
+
+    def __init__(self, business_unit='Marketing', age=30, tags=()):
+        self._business_unit = business_unit
+        self._age = age
+        self._tags = list(tags)
+        self.calls = 0
+
+    @string_rule_variable
+    def business_unit(self):
+        self.calls += 1
+        return self._business_unit
+
+    @numeric_rule_variable
+    def age(self):
+        self.calls += 1
+        return self._age
+
+    @select_multiple_rule_variable()
+    def tags(self):
+        self.calls += 1
+        return self._tags
+
+
+class ProfileActions(BaseActions):
+
+    def __init__(self):
+        self.campaigns = []
+
+    @rule_action(params={'campaign_id': FIELD_TEXT})
+    def send_email(self, campaign_id):
+        self.campaigns.append(campaign_id)
+
+
+MARKETING = {'name': 'business_unit', 'operator': 'equal_to',
+             'value': 'Marketing'}
+OVER_40 = {'name': 'age', 'operator': 'greater_than', 'value': 40}
+UNDER_25 = {'name': 'age', 'operator': 'less_than', 'value': 25}
+TAGGED = {'name': 'tags', 'operator': 'shares_at_least_one_element_with',
+          'value': ['golf', 'tennis']}
+
+
+def _rule(conditions, campaign_id):
+    return {'conditions': conditions,
+            'actions': [{'name': 'send_email',
+                         'params': {'campaign_id': campaign_id}}]}
+
+
+RULES = [
+    _rule({'all': [MARKETING, OVER_40]}, 'marketing-senior'),
+    _rule({'all': [MARKETING, UNDER_25]}, 'marketing-junior'),
+    _rule({'all': [dict(MARKETING), {'any': [OVER_40, TAGGED]}]},
+          'marketing-golf'),
+    _rule({'any': [UNDER_25, dict(TAGGED, value=['golf', 'tennis'])]},
+          'junior-or-golf'),
+    _rule({'all': [MARKETING, OVER_40]}, 'marketing-senior-again'),
+]
+
+
+class RuleNetworkTests(TestCase):
+
+    def test_shares_identical_nodes(self):
+        network = compile_network(RULES, ProfileVariables, ProfileActions)
+        self.assertEqual(network.condition_count, 4)
+        # 4 conditions, 2 'all' nodes shared by rules 1 and 5, the 'any' and
+        # 'all' of rule 3, and the 'any' of rule 4
+        self.assertEqual(network.node_count, 9)
+
+    def test_run_matches_run_all(self):
+        network = compile_network(RULES, ProfileVariables, ProfileActions)
+        for kwargs in [{}, {'age': 50}, {'age': 20},
+                       {'business_unit': 'Sales', 'age': 50},
+                       {'tags': ['Golf']}, {'age': 50, 'tags': ['tennis']}]:
+            for stop_on_first_trigger in [False, True]:
+                network_actions, actions = ProfileActions(), ProfileActions()
+                self.assertEqual(
+                    network.run(ProfileVariables(**kwargs), network_actions,
+                                stop_on_first_trigger=stop_on_first_trigger),
+                    run_all(RULES, ProfileVariables(**kwargs), actions,
+                            stop_on_first_trigger=stop_on_first_trigger))
+                self.assertEqual(network_actions.campaigns, actions.campaigns)
+
+    def test_conditions_evaluated_once_per_record(self):
+        network = compile_network(RULES, ProfileVariables, ProfileActions)
+        variables = ProfileVariables(age=50, tags=['golf'])
+        network.run(variables, ProfileActions())
+        # MARKETING, OVER_40, UNDER_25 and TAGGED once each
+        self.assertEqual(variables.calls, 4)
+
+        variables = ProfileVariables(age=50, tags=['golf'])
+        run_all(RULES, variables, ProfileActions())
+        self.assertEqual(variables.calls, 10)
+
+    def test_cache_variables(self):
+        network = compile_network(RULES, ProfileVariables, ProfileActions)
+        variables = ProfileVariables(age=50, tags=['golf'])
+        network.run(variables, ProfileActions(), cache_variables=True)
+        self.assertEqual(variables.calls, 3)
+
+    def test_invalid_rules(self):
+        with self.assertRaises(AssertionError):
+            compile_network([_rule({'all': []}, 'x')],
+                            ProfileVariables, ProfileActions)
+        with self.assertRaises(AssertionError):
+            compile_network([_rule({'all': [], 'any': []}, 'x')],
+                            ProfileVariables, ProfileActions)
+        err_string = 'Action fakeone is not defined in class ProfileActions'
+        with self.assertRaisesRegex(AssertionError, err_string):
+            compile_network([{'conditions': MARKETING,
+                              'actions': [{'name': 'fakeone'}]}],
+                            ProfileVariables, ProfileActions)
@@ -1,9 +1,15 @@
 from business_rules.operators import (StringType,
-                                      NumericType, BooleanType, SelectType,
-                                      SelectMultipleType)
+                                      NumericType, FloatNumericType,
+                                      BooleanType, SelectType,
+                                      SelectMultipleType, FoldedSet,
+                                      VALUE_TYPES, fold_items,
+                                      get_value_operator)
+from business_rules.fields import FIELD_NO_INPUT
+from business_rules.utils import RegexCache, RegexCacheInfo
 
 from unittest import TestCase
 from decimal import Decimal
+import re
 import sys
 
 class StringOperatorTests(TestCase):
@@ -11,6 +17,16 @@ class StringOperatorTests(TestCase):
     def test_operator_decorator(self):
         self.assertTrue(StringType("foo").equal_to.is_operator)
 
+    def test_raw_operator(self):
+        equal_to = StringType.equal_to
+        self.assertTrue(equal_to.cast_arguments)
+        self.assertTrue(equal_to.raw_operator(StringType("foo"), "foo"))
+        self.assertFalse(equal_to.raw_operator(StringType(None), None))
+        self.assertTrue(equal_to(StringType(None), None))
+        self.assertFalse(SelectType.contains.cast_arguments)
+        self.assertTrue(
+            SelectType.contains.raw_operator is SelectType.contains)
+
     def test_string_equal_to(self):
         self.assertTrue(StringType("foo").equal_to("foo"))
         self.assertFalse(StringType("foo").equal_to("Foo"))
@@ -41,6 +57,36 @@ class StringOperatorTests(TestCase):
         self.assertTrue(StringType("hello").matches_regex(r"^h"))
         self.assertFalse(StringType("hello").matches_regex(r"^sh"))
 
+    def test_regex_cache(self):
+        cache = RegexCache(maxsize=2)
+        self.assertEqual(cache.hit_rate(), 0.0)
+        first = cache.compile(r"^a")
+        self.assertIs(cache.compile(r"^a"), first)
+        self.assertIsNot(cache.compile(r"^a", re.I), first)
+        cache.compile(r"^a")
+        # ^a was used again, so ^b evicts the oldest unused pattern,
+        # (^a, re.I)
+        cache.compile(r"^b")
+        self.assertEqual(cache.info(), RegexCacheInfo(2, 3, 2, 2))
+        self.assertIs(cache.compile(r"^a"), first)
+        cache.compile(r"^a", re.I)
+        self.assertEqual(cache.info(), RegexCacheInfo(3, 4, 2, 2))
+        self.assertEqual(cache.hit_rate(), 3.0 / 7)
+
+        cache.clear()
+        self.assertEqual(cache.info(), RegexCacheInfo(0, 0, 2, 0))
+
+    def test_regex_cache_hits_dont_lock(self):
+        class NoLock(object):
+            def __enter__(self):
+                raise AssertionError("a hit took the lock")
+
+        cache = RegexCache()
+        first = cache.compile(r"^a")
+        cache._lock = NoLock()
+        self.assertIs(cache.compile(r"^a"), first)
+        self.assertEqual(cache.info().hits, 1)
+
     def test_non_empty(self):
         self.assertTrue(StringType("hello").non_empty())
         self.assertFalse(StringType("").non_empty())
@@ -81,6 +127,21 @@ class NumericOperatorTests(TestCase):
         self.assertFalse(NumericType(10).equal_to(10.00001))
         self.assertFalse(NumericType(10).equal_to(11))
 
+    def test_float_numeric_type(self):
+        self.assertEqual(FloatNumericType(10).value, 10)
+        self.assertTrue(isinstance(FloatNumericType(10).value, int))
+        self.assertTrue(isinstance(FloatNumericType(Decimal('1.5')).value,
+                                   float))
+        self.assertTrue(FloatNumericType(10).equal_to(Decimal('10.0000005')))
+        self.assertFalse(FloatNumericType(10).equal_to(10.00001))
+        self.assertTrue(FloatNumericType(10).greater_than(9.9))
+        self.assertFalse(FloatNumericType(10).greater_than(10.0000005))
+        self.assertTrue(FloatNumericType(10).less_than_or_equal_to(10.0000005))
+        self.assertFalse(FloatNumericType(10).less_than(10))
+        with self.assertRaisesRegex(AssertionError,
+                                    "10 is not a valid numeric type"):
+            FloatNumericType(10).equal_to("10")
+
     def test_other_value_not_numeric(self):
         error_string = "10 is not a valid numeric type"
         with self.assertRaisesRegex(AssertionError, error_string):
@@ -146,6 +207,26 @@ class SelectOperatorTests(TestCase):
         self.assertFalse(SelectType([1, 2]).does_not_contain(2))
         self.assertFalse(SelectType([1, 2, "a"]).does_not_contain("A"))
 
+    def test_unhashable_items(self):
+        self.assertTrue(SelectType([[1], "a"]).contains("A"))
+        self.assertTrue(SelectType([[1], "a"]).contains([1]))
+        self.assertFalse(SelectType([[1], "a"]).contains([2]))
+        self.assertTrue(SelectType([1, "a"]).does_not_contain([1]))
+
+    def test_folded_once(self):
+        select = SelectType(["A", "b"])
+        self.assertTrue(select.contains("a"))
+        self.assertEqual(select._folded, frozenset(["a", "b"]))
+        select.value = []
+        self.assertTrue(select.contains("B"))
+
+    def test_fold_items(self):
+        folded = fold_items(["A", 1, "b"])
+        self.assertEqual(folded, frozenset(["a", 1, "b"]))
+        self.assertTrue(isinstance(folded, FoldedSet))
+        self.assertTrue(fold_items(folded) is folded)
+        self.assertEqual(fold_items([[1]]), None)
+
 
 class SelectMultipleOperatorTests(TestCase):
 
@@ -190,3 +271,76 @@ class SelectMultipleOperatorTests(TestCase):
                          shares_no_elements_with([2, 3]))
         self.assertFalse(SelectMultipleType([1, 2, "a"]).
                          shares_no_elements_with([4, "A"]))
+
+    def test_repeated_items(self):
+        self.assertFalse(SelectMultipleType([1, "a"]).
+                         shares_exactly_one_element_with(["a", "A"]))
+        self.assertTrue(SelectMultipleType([1, "a", "A"]).
+                        shares_exactly_one_element_with(["a", 2]))
+
+    def test_unhashable_items(self):
+        select = SelectMultipleType([[1], "a", 2])
+        self.assertTrue(select.contains_all(["A", [1]]))
+        self.assertFalse(select.contains_all([[2], "a"]))
+        self.assertTrue(select.is_contained_by([[1], 2, "A", 3]))
+        self.assertFalse(select.is_contained_by(["a", 2]))
+        self.assertTrue(SelectMultipleType(["a", 2]).
+                        is_contained_by([[1], 2, "A"]))
+        self.assertTrue(select.shares_at_least_one_element_with([[1]]))
+        self.assertFalse(select.shares_at_least_one_element_with([3, [2]]))
+        self.assertTrue(select.shares_exactly_one_element_with([3, [1]]))
+        self.assertTrue(select.shares_no_elements_with([[2], "b"]))
+
+    def test_folded_sets(self):
+        select = SelectMultipleType(["A", "b", 3])
+        self.assertTrue(select.contains_all(fold_items(["a", "B"])))
+        self.assertTrue(select.is_contained_by(fold_items(["a", "B", 3, 4])))
+        self.assertTrue(select.shares_at_least_one_element_with(
+            fold_items(["c", 3])))
+
+
+class ValueOperatorTests(TestCase):
+
+    SAMPLES = {
+        StringType: ["", "hello", "Hello World", "wor"],
+        NumericType: [0, 1, 10, 10.0000005, 10.000001, Decimal("-2.5")],
+        FloatNumericType: [0, 1, 10, 10.0000005, 10.00001, Decimal("-2.5")],
+        BooleanType: [True, False],
+    }
+
+    def test_value_operators_match_the_operators(self):
+        for field_type in VALUE_TYPES:
+            samples = self.SAMPLES[field_type]
+            for operator in field_type.get_all_operators():
+                name = operator['name']
+                function = get_value_operator(field_type, name)
+                method = getattr(field_type, name)
+                for value in samples:
+                    instance = field_type(value)
+                    cast_value = instance.value
+                    if operator['input_type'] == FIELD_NO_INPUT:
+                        self.assertEqual(bool(function(cast_value)),
+                                         bool(method(instance)), name)
+                        continue
+                    for other in samples:
+                        other = field_type(other).value
+                        if function.prepare is not None:
+                            prepared = function.prepare(other)
+                        else:
+                            prepared = other
+                        self.assertEqual(
+                            bool(function(cast_value, prepared)),
+                            bool(method(instance, other)),
+                            (field_type, name, value, other))
+
+    def test_subclasses_have_no_value_operators(self):
+        class MyStringType(StringType):
+            pass
+        self.assertEqual(get_value_operator(MyStringType, 'equal_to'), None)
+
+    def test_slots(self):
+        for field_type, value in [(StringType, "a"), (NumericType, 1),
+                                  (BooleanType, True), (SelectType, [1]),
+                                  (SelectMultipleType, [1])]:
+            instance = field_type(value)
+            self.assertFalse(hasattr(instance, '__dict__'), field_type)
@@ -0,0 +1,166 @@
+from business_rules import run_all
+from business_rules.actions import BaseActions
+from business_rules.optimizer import (ConditionStats, optimize_conditions,
+                                      optimize_rules)
+from business_rules.variables import (BaseVariables, boolean_rule_variable,
+                                      numeric_rule_variable, rule_variable,
+                                      string_rule_variable)
+from business_rules.operators import StringType
+
+from unittest import TestCase
+
+
+class ProfileVariables(BaseVariables):
+
+    def __init__(self, country='US', lifetime_value=0, vip=False):
+        self._country = country
+        self._lifetime_value = lifetime_value
+        self._vip = vip
+        self.calls = []
+
+    @string_rule_variable
+    def country(self):
+        self.calls.append('country')
+        return self._country
+
+    @numeric_rule_variable(cost=100)
+    def lifetime_value(self):
+        self.calls.append('lifetime_value')
+        return self._lifetime_value
+
+    @boolean_rule_variable(cost=2)
+    def vip(self):
+        self.calls.append('vip')
+        return self._vip
+
+
+EXPENSIVE = {'name': 'lifetime_value', 'operator': 'greater_than',
+             'value': 1000}
+IN_FRANCE = {'name': 'country', 'operator': 'equal_to', 'value': 'FR'}
+IS_VIP = {'name': 'vip', 'operator': 'is_true', 'value': ''}
+
+
+class OptimizerTests(TestCase):
+
+    def test_rule_variable_cost(self):
+        self.assertEqual(ProfileVariables.country.cost, 1)
+        self.assertEqual(ProfileVariables.lifetime_value.cost, 100)
+        with self.assertRaisesRegex(AssertionError,
+                                    "0 is not a valid cost for rule_variable"):
+            @rule_variable(StringType, cost=0)
+            def free(self): pass
+
+    def test_cheap_conditions_first(self):
+        conditions = {'all': [EXPENSIVE, IS_VIP, IN_FRANCE]}
+        self.assertEqual(optimize_conditions(conditions, ProfileVariables),
+                         {'all': [IN_FRANCE, IS_VIP, EXPENSIVE]})
+        # the original is left untouched
+        self.assertEqual(conditions, {'all': [EXPENSIVE, IS_VIP, IN_FRANCE]})
+
+    def test_ties_keep_their_order(self):
+        other = {'name': 'country', 'operator': 'equal_to', 'value': 'DE'}
+        conditions = {'any': [other, IN_FRANCE]}
+        self.assertEqual(optimize_conditions(conditions, ProfileVariables),
+                         conditions)
+
+    def test_nested_conditions_use_expected_cost(self):
+        conditions = {'any': [{'all': [EXPENSIVE, IN_FRANCE]}, IS_VIP]}
+        self.assertEqual(optimize_conditions(conditions, ProfileVariables),
+                         {'any': [IS_VIP, {'all': [IN_FRANCE, EXPENSIVE]}]})
+
+    def test_selectivity_from_stats(self):
+        stats = ConditionStats()
+        # Being a VIP is rare, being in France is common
+        for country, vip in [('FR', False)] * 8 + [('US', True)] * 2:
+            stats.observe([{'conditions': {'all': [IN_FRANCE, IS_VIP]}},
+                           {'conditions': IN_FRANCE}],
+                          ProfileVariables(country=country, vip=vip))
+        self.assertEqual(stats.counts[('country', 'equal_to', 'FR')], [10, 8])
+        self.assertAlmostEqual(stats.probability(IS_VIP), 0.25)
+        self.assertAlmostEqual(stats.probability(EXPENSIVE), 0.5)
+
+        # VIP is twice as expensive but much more likely to fail
+        self.assertEqual(
+            optimize_conditions({'all': [IN_FRANCE, IS_VIP]},
+                                ProfileVariables, stats),
+            {'all': [IS_VIP, IN_FRANCE]})
+        # ...and much less likely to hold
+        self.assertEqual(
+            optimize_conditions({'any': [IS_VIP, IN_FRANCE]},
+                                ProfileVariables, stats),
+            {'any': [IN_FRANCE, IS_VIP]})
+
+    def test_extreme_stats(self):
+        stats = ConditionStats()
+        stats.counts[('country', 'equal_to', 'FR')] = [10 ** 9, 10 ** 9]
+        stats.counts[('vip', 'is_true', '')] = [10 ** 9, 0]
+        self.assertEqual(
+            optimize_conditions({'all': [IN_FRANCE, IS_VIP]},
+                                ProfileVariables, stats),
+            {'all': [IS_VIP, IN_FRANCE]})
+
+    def test_results_are_identical(self):
+        rules = [
+            {'conditions': {'all': [EXPENSIVE, IS_VIP, IN_FRANCE]},
+             'actions': []},
+            {'conditions': {'any': [{'all': [EXPENSIVE, IN_FRANCE]}, IS_VIP]},
+             'actions': []},
+        ]
+        optimized = optimize_rules(rules, ProfileVariables)
+        for args in [('FR', 2000, True), ('FR', 0, True), ('US', 2000, False),
+                     ('FR', 2000, False), ('US', 0, True)]:
+            for rule, optimized_rule in zip(rules, optimized):
+                self.assertEqual(
+                    run_all([rule], ProfileVariables(*args), BaseActions()),
+                    run_all([optimized_rule], ProfileVariables(*args),
+                            BaseActions()))
+
+        variables = ProfileVariables('US', 2000, False)
+        run_all(optimized[:1], variables, BaseActions())
+        self.assertEqual(variables.calls, ['country'])
+
+    def test_guarded_conditions_keep_their_place(self):
+        class AddressVariables(ProfileVariables):
+            def __init__(self, city=None, **kwargs):
+                super(AddressVariables, self).__init__(**kwargs)
+                self.address = {'city': city} if city else None
+
+            @boolean_rule_variable(cost=5)
+            def has_address(self):
+                return self.address is not None
+
+            @string_rule_variable
+            def city(self):
+                return self.address['city']
+
+        has_address = {'name': 'has_address', 'operator': 'is_true',
+                       'value': ''}
+        in_paris = {'name': 'city', 'operator': 'equal_to', 'value': 'Paris'}
+        rules = [{'conditions': {'all': [has_address, IS_VIP, in_paris,
+                                         IN_FRANCE]},
+                  'actions': []}]
+        stats = ConditionStats()
+        for city in ['Lyon'] * 5 + [None] * 5:
+            stats.observe(rules, AddressVariables(city))
+        self.assertTrue(stats.raised(in_paris))
+        self.assertFalse(stats.raised(has_address))
+        self.assertEqual(stats.counts[('city', 'equal_to', 'Paris')], [5, 0])
+
+        optimized = optimize_rules(rules, AddressVariables, stats)
+        self.assertEqual(optimized[0]['conditions'],
+                         {'all': [IS_VIP, has_address, in_paris, IN_FRANCE]})
+        for city in ['Paris', 'Lyon', None]:
+            self.assertEqual(
+                run_all(rules, AddressVariables(city, vip=True),
+                        BaseActions()),
+                run_all(optimized, AddressVariables(city, vip=True),
+                        BaseActions()))
+
+    def test_invalid_conditions(self):
+        with self.assertRaises(AssertionError):
+            optimize_conditions({'all': []}, ProfileVariables)
+        with self.assertRaises(AssertionError):
+            optimize_conditions({'all': [], 'any': []}, ProfileVariables)
+        with self.assertRaises(AssertionError):
+            optimize_conditions({'name': 'food', 'operator': 'equal_to',
+                                 'value': ''}, ProfileVariables)
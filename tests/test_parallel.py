@@ -0,0 +1,100 @@
+from business_rules import run_batch
+from business_rules.actions import BaseActions, rule_action
+from business_rules.fields import FIELD_TEXT
+from business_rules.parallel import (_init_worker, _run_chunk,
+                                     _run_chunk_with_actions, run_parallel)
+from business_rules.variables import (BaseVariables, numeric_rule_variable,
+                                      string_rule_variable)
+
+from unittest import TestCase
+
+
+class ProfileVariables(BaseVariables):
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    @string_rule_variable
+    def job_title(self):
+        return self.profile['job_title']
+
+    @numeric_rule_variable
+    def age(self):
+        return self.profile['age']
+
+
+class ProfileActions(BaseActions):
+
+    sent = []
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    @rule_action(params={'campaign_id': FIELD_TEXT})
+    def send_email(self, campaign_id):
+        self.sent.append((self.profile['id'], campaign_id))
+
+
+RULES = [
+    {'conditions': {'name': 'job_title', 'operator': 'contains',
+                    'value': 'Engineer'},
+     'actions': [{'name': 'send_email', 'params': {'campaign_id': 'eng'}}]},
+    {'conditions': {'name': 'age', 'operator': 'greater_than', 'value': 40},
+     'actions': [{'name': 'send_email', 'params': {'campaign_id': 'senior'}}]},
+]
+
+PROFILES = [{'id': i,
+             'job_title': 'Engineer' if i % 3 == 0 else 'Designer',
+             'age': 20 + i}
+            for i in range(50)]
+
+
+class RunParallelTests(TestCase):
+
+    def setUp(self):
+        ProfileActions.sent = []
+
+    def expected(self, **kwargs):
+        results = list(run_batch(RULES, PROFILES,
+                                 ProfileVariables, ProfileActions, **kwargs))
+        sent, ProfileActions.sent = ProfileActions.sent, []
+        return results, sent
+
+    def test_actions_on_parent(self):
+        expected_results, expected_sent = self.expected()
+        results = list(run_parallel(RULES, iter(PROFILES),
+                                    ProfileVariables, ProfileActions,
+                                    workers=2, chunk_size=3))
+        self.assertEqual(results, expected_results)
+        self.assertEqual(ProfileActions.sent, expected_sent)
+
+    def test_actions_on_workers(self):
+        expected_results, _ = self.expected(stop_on_first_trigger=True)
+        results = list(run_parallel(RULES, PROFILES,
+                                    ProfileVariables, ProfileActions,
+                                    workers=2, chunk_size=7,
+                                    actions_on_workers=True,
+                                    stop_on_first_trigger=True))
+        self.assertEqual(results, expected_results)
+        # the actions ran in the worker processes
+        self.assertEqual(ProfileActions.sent, [])
+
+    def test_no_records(self):
+        self.assertEqual(list(run_parallel(RULES, [], ProfileVariables,
+                                           ProfileActions)), [])
+
+    def test_invalid_rules_fail_before_starting_workers(self):
+        rules = [{'conditions': {'name': 'food', 'operator': 'equal_to',
+                                 'value': 'm'},
+                  'actions': []}]
+        err_string = 'Variable food is not defined in class ProfileVariables'
+        with self.assertRaisesRegex(AssertionError, err_string):
+            next(run_parallel(rules, PROFILES, ProfileVariables,
+                              ProfileActions))
+
+    def test_worker_chunks(self):
+        _init_worker(RULES, ProfileVariables, ProfileActions,
+                     ProfileVariables, ProfileActions, False, True)
+        self.assertEqual(_run_chunk(PROFILES[:3]), [[0], [], []])
+        self.assertEqual(_run_chunk_with_actions(PROFILES[21:22]), [True])
+        self.assertEqual(ProfileActions.sent, [(21, 'eng'), (21, 'senior')])
@@ -0,0 +1,183 @@
+from business_rules import run_all
+from business_rules.actions import BaseActions, rule_action
+from business_rules.engine import run
+from business_rules.fields import FIELD_NUMERIC
+from business_rules.profiling import Profiler, RuleStats, Timing, Tracer
+from business_rules.variables import (BaseVariables, numeric_rule_variable,
+                                      string_rule_variable)
+
+from unittest import TestCase
+
+
+class OrderVariables(BaseVariables):
+
+    def __init__(self, order):
+        self.order = order
+        self.calls = 0
+
+    @numeric_rule_variable
+    def total(self):
+        self.calls += 1
+        return self.order['total']
+
+    @string_rule_variable
+    def country(self):
+        return self.order['country']
+
+
+class OrderActions(BaseActions):
+
+    def __init__(self):
+        self.discounts = []
+
+    @rule_action(params={'percent': FIELD_NUMERIC})
+    def discount(self, percent):
+        self.discounts.append(percent)
+
+
+BIG_ORDER = {'name': 'big order',
+             'conditions': {'all': [
+                 {'name': 'total', 'operator': 'greater_than', 'value': 100},
+                 {'name': 'country', 'operator': 'equal_to', 'value': 'FR'}]},
+             'actions': [{'name': 'discount', 'params': {'percent': 10}}]}
+ANY_ORDER = {'conditions': {'any': [
+                 {'name': 'total', 'operator': 'greater_than', 'value': 0},
+                 {'name': 'country', 'operator': 'non_empty', 'value': None}]},
+             'actions': []}
+
+
+class RecordingTracer(Tracer):
+
+    def __init__(self):
+        self.events = []
+
+    def variable_fetched(self, name, value, seconds):
+        self.events.append(('variable', name, value))
+
+    def condition_checked(self, condition, result, seconds):
+        self.events.append(('condition', condition['operator'], result))
+
+    def action_run(self, name, params, seconds):
+        self.events.append(('action', name, params))
+
+    def rule_checked(self, rule, triggered, seconds):
+        self.events.append(('rule', rule.get('name'), triggered))
+
+
+class TracerTests(TestCase):
+
+    def test_run_reports_every_step(self):
+        tracer = RecordingTracer()
+        actions = OrderActions()
+        result = run(BIG_ORDER,
+                     OrderVariables({'total': 150, 'country': 'FR'}),
+                     actions, tracer)
+        self.assertTrue(result)
+        self.assertEqual(actions.discounts, [10])
+        self.assertEqual(tracer.events, [
+            ('variable', 'total', 150),
+            ('condition', 'greater_than', True),
+            ('variable', 'country', 'FR'),
+            ('condition', 'equal_to', True),
+            ('action', 'discount', {'percent': 10}),
+            ('rule', 'big order', True)])
+
+    def test_short_circuits_like_run(self):
+        tracer = RecordingTracer()
+        variables = OrderVariables({'total': 50, 'country': 'FR'})
+        self.assertFalse(run(BIG_ORDER, variables, OrderActions(), tracer))
+        self.assertTrue(run(ANY_ORDER, variables, OrderActions(), tracer))
+        self.assertEqual(tracer.events, [
+            ('variable', 'total', 50),
+            ('condition', 'greater_than', False),
+            ('rule', 'big order', False),
+            ('variable', 'total', 50),
+            ('condition', 'greater_than', True),
+            ('rule', None, True)])
+
+    def test_base_tracer_does_nothing(self):
+        actions = OrderActions()
+        self.assertTrue(run_all([BIG_ORDER],
+                                OrderVariables({'total': 150,
+                                                'country': 'FR'}),
+                                actions, tracer=Tracer()))
+        self.assertEqual(actions.discounts, [10])
+
+    def test_errors_are_unchanged(self):
+        rule = {'conditions': {'name': 'missing', 'operator': 'equal_to',
+                               'value': 1},
+                'actions': []}
+        with self.assertRaisesRegex(AssertionError, 'Variable missing'):
+            run(rule, OrderVariables({}), OrderActions(), Tracer())
+
+    def test_cached_variables_are_traced(self):
+        tracer = RecordingTracer()
+        variables = OrderVariables({'total': 150, 'country': 'FR'})
+        run_all([BIG_ORDER, ANY_ORDER], variables, OrderActions(),
+                cache_variables=True, tracer=tracer)
+        self.assertEqual(variables.calls, 1)
+        self.assertEqual([event for event in tracer.events
+                          if event[0] == 'variable'],
+                         [('variable', 'total', 150),
+                          ('variable', 'country', 'FR'),
+                          ('variable', 'total', 150)])
+
+
+class ProfilerTests(TestCase):
+
+    def setUp(self):
+        self.profiler = Profiler()
+        for order in [{'total': 150, 'country': 'FR'},
+                      {'total': 150, 'country': 'US'},
+                      {'total': 50, 'country': 'FR'},
+                      {'total': 500, 'country': 'FR'}]:
+            run_all([BIG_ORDER, ANY_ORDER], OrderVariables(order),
+                    OrderActions(), tracer=self.profiler)
+
+    def test_aggregates(self):
+        self.assertEqual(self.profiler.variables['total'].calls, 8)
+        self.assertEqual(self.profiler.variables['country'].calls, 3)
+        self.assertEqual(self.profiler.operators['greater_than'].calls, 8)
+        self.assertEqual(self.profiler.operators['equal_to'].calls, 3)
+        self.assertEqual(self.profiler.actions['discount'].calls, 2)
+
+    def test_hottest_variables_and_slowest_operators(self):
+        self.profiler.variables['country'].seconds += 10
+        self.assertEqual([name for name, timing
+                          in self.profiler.hottest_variables()],
+                         ['country', 'total'])
+        self.assertEqual(len(self.profiler.hottest_variables(1)), 1)
+        self.profiler.operators['equal_to'].seconds += 10
+        self.assertEqual(self.profiler.slowest_operators(1)[0][0], 'equal_to')
+
+    def test_rule_hit_ratios(self):
+        self.assertEqual(self.profiler.rule_hit_ratios(),
+                         [(BIG_ORDER, 0.5), (ANY_ORDER, 1.0)])
+        rule, stats = self.profiler.rules[0]
+        self.assertIs(rule, BIG_ORDER)
+        self.assertEqual((stats.calls, stats.hits), (4, 2))
+
+    def test_report(self):
+        report = self.profiler.report()
+        self.assertIn('Hottest variables:', report)
+        self.assertIn('greater_than', report)
+        self.assertIn('big order', report)
+        self.assertIn('rule #1', report)
+        self.assertIn('hit ratio 50.0%', report)
+
+    def test_reset(self):
+        self.profiler.reset()
+        self.assertEqual(self.profiler.variables, {})
+        self.assertEqual(self.profiler.rules, [])
+
+
+class TimingTests(TestCase):
+
+    def test_mean_and_ratio(self):
+        timing = Timing()
+        self.assertEqual(timing.mean, 0.0)
+        timing.add(1.0)
+        timing.add(3.0)
+        self.assertEqual(timing.mean, 2.0)
+        self.assertEqual(repr(timing), 'Timing(calls=2, seconds=4.0)')
+        self.assertEqual(RuleStats().hit_ratio, 0.0)
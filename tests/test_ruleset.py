@@ -0,0 +1,160 @@
+import threading
+
+from business_rules import compile_rules
+from business_rules.actions import BaseActions, rule_action
+from business_rules.compiler import RulesetCache
+from business_rules.fields import FIELD_TEXT
+from business_rules.network import RuleNetwork, compile_network
+from business_rules.ruleset import RuleSet, RuleSetVersion
+from business_rules.variables import BaseVariables, numeric_rule_variable
+
+from unittest import TestCase
+
+
+class OrderVariables(BaseVariables):
+
+    def __init__(self, total):
+        self._total = total
+
+    @numeric_rule_variable
+    def total(self):
+        return self._total
+
+
+class OrderActions(BaseActions):
+
+    def __init__(self):
+        self.tiers = []
+
+    @rule_action(params={'tier': FIELD_TEXT})
+    def set_tier(self, tier):
+        self.tiers.append(tier)
+
+
+def _rules(threshold, tier):
+    return [{'conditions': {'name': 'total', 'operator': 'greater_than',
+                            'value': threshold},
+             'actions': [{'name': 'set_tier', 'params': {'tier': tier}}]}]
+
+
+def _tiers(ruleset, total):
+    actions = OrderActions()
+    ruleset.run(OrderVariables(total), actions)
+    return actions.tiers
+
+
+class RuleSetTests(TestCase):
+
+    def test_run_and_reload(self):
+        ruleset = RuleSet(_rules(100, 'gold'), OrderVariables, OrderActions,
+                          cache=None)
+        self.assertEqual(ruleset.version, 1)
+        self.assertEqual(_tiers(ruleset, 150), ['gold'])
+
+        version = ruleset.reload(_rules(200, 'platinum'))
+        self.assertIsInstance(version, RuleSetVersion)
+        self.assertIs(version, ruleset.current)
+        self.assertEqual(ruleset.version, 2)
+        self.assertEqual(version.rule_list, _rules(200, 'platinum'))
+        self.assertEqual(_tiers(ruleset, 150), [])
+        self.assertEqual(_tiers(ruleset, 250), ['platinum'])
+
+    def test_unchanged_reload_keeps_the_version(self):
+        ruleset = RuleSet(_rules(100, 'gold'), OrderVariables, OrderActions)
+        current = ruleset.current
+        self.assertIs(ruleset.reload(_rules(100, 'gold')), current)
+        self.assertEqual(ruleset.version, 1)
+        self.assertEqual(len(ruleset.fingerprint), 64)
+
+    def test_invalid_reload_keeps_the_version(self):
+        ruleset = RuleSet(_rules(100, 'gold'), OrderVariables, OrderActions)
+        with self.assertRaisesRegex(AssertionError, 'Action missing'):
+            ruleset.reload(_rules(100, 'gold') +
+                           [{'conditions': _rules(1, '')[0]['conditions'],
+                             'actions': [{'name': 'missing'}]}])
+        self.assertEqual(ruleset.version, 1)
+        self.assertEqual(_tiers(ruleset, 150), ['gold'])
+        with self.assertRaises(AssertionError):
+            RuleSet([{'conditions': {'all': []}, 'actions': []}],
+                    OrderVariables, OrderActions)
+
+    def test_options_and_cache(self):
+        cache = RulesetCache()
+        ruleset = RuleSet(_rules(100, 'gold'), OrderVariables, OrderActions,
+                          cache=cache, use_index=True)
+        self.assertIsNotNone(ruleset.current.compiled.index)
+        ruleset.reload(_rules(200, 'platinum'))
+        ruleset.reload(_rules(100, 'gold'))
+        self.assertEqual(ruleset.version, 3)
+        self.assertEqual(cache.info().hits, 1)
+        self.assertEqual(cache.info().misses, 2)
+
+        network = RuleSet(_rules(100, 'gold'), OrderVariables, OrderActions,
+                          compiler=compile_network, cache=cache)
+        self.assertIsInstance(network.current.compiled, RuleNetwork)
+        self.assertEqual(_tiers(network, 150), ['gold'])
+
+    def test_reload_in_background(self):
+        ruleset = RuleSet(_rules(100, 'gold'), OrderVariables, OrderActions)
+        ruleset.reload_in_background(_rules(200, 'platinum')).join()
+        self.assertEqual(ruleset.version, 2)
+
+        errors = []
+        ruleset.reload_in_background([{'conditions': {'any': []},
+                                       'actions': []}],
+                                     on_error=errors.append).join()
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], AssertionError)
+        self.assertEqual(ruleset.version, 2)
+        # without on_error, the error is swallowed by the thread
+        ruleset.reload_in_background([{'conditions': {'any': []},
+                                       'actions': []}]).join()
+        self.assertEqual(ruleset.version, 2)
+
+    def test_last_requested_reload_wins(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def slow_compile(rule_list, variables_cls, actions_cls):
+            if rule_list[0]['actions'][0]['params']['tier'] == 'slow':
+                started.set()
+                release.wait()
+            return compile_rules(rule_list, variables_cls, actions_cls)
+
+        ruleset = RuleSet(_rules(100, 'gold'), OrderVariables, OrderActions,
+                          compiler=slow_compile, cache=None)
+        slow = ruleset.reload_in_background(_rules(10, 'slow'))
+        started.wait()
+        # requested later, but finishes first
+        ruleset.reload(_rules(300, 'fast'))
+        # back to the first version, while the slow one is still compiling
+        ruleset.reload(_rules(100, 'gold'))
+        release.set()
+        slow.join()
+        self.assertEqual(ruleset.version, 3)
+        self.assertEqual(_tiers(ruleset, 150), ['gold'])
+
+    def test_runs_during_reloads(self):
+        ruleset = RuleSet(_rules(0, 'v0'), OrderVariables, OrderActions,
+                          cache=None)
+        stop = threading.Event()
+        seen = []
+
+        def run():
+            while not stop.is_set():
+                tiers = _tiers(ruleset, 1000)
+                assert len(tiers) == 1, tiers
+                seen.append(tiers[0])
+        readers = [threading.Thread(target=run) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        try:
+            for number in range(1, 30):
+                ruleset.reload(_rules(number, 'v{0}'.format(number)))
+        finally:
+            stop.set()
+            for reader in readers:
+                reader.join()
+        self.assertEqual(ruleset.version, 30)
+        self.assertTrue(seen)
+        self.assertTrue(all(tier.startswith('v') for tier in seen))
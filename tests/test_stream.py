@@ -0,0 +1,162 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from business_rules.actions import BaseActions, rule_action
+from business_rules.fields import FIELD_NUMERIC, FIELD_TEXT
+from business_rules.stream import main, read_ndjson, run_ndjson
+from business_rules.variables import (BaseVariables, numeric_rule_variable,
+                                      string_rule_variable)
+
+from unittest import TestCase
+
+
+class ProfileVariables(BaseVariables):
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    @string_rule_variable
+    def job_title(self):
+        return self.profile.get('job_title')
+
+    @numeric_rule_variable
+    def age(self):
+        return self.profile.get('age', 0)
+
+
+class ProfileActions(BaseActions):
+
+    @rule_action(params={'campaign_id': FIELD_TEXT})
+    def send_email(self, campaign_id):
+        raise AssertionError('actions are recorded, not run')
+
+    @rule_action(params={'points': FIELD_NUMERIC})
+    def add_points(self, points):
+        raise AssertionError('actions are recorded, not run')
+
+
+RULES = [
+    {'conditions': {'name': 'job_title', 'operator': 'equal_to',
+                    'value': 'CTO'},
+     'actions': [{'name': 'send_email', 'params': {'campaign_id': 'cto'}}]},
+    {'conditions': {'name': 'age', 'operator': 'greater_than', 'value': 40},
+     'actions': [{'name': 'add_points', 'params': {'points': 1.5}}]},
+]
+
+INPUT = u'\n'.join([
+    json.dumps({'id': 'a', 'job_title': 'CTO', 'age': 45}),
+    json.dumps({'id': 'b', 'job_title': 'CEO', 'age': 30}),
+    u'',
+    json.dumps({'id': 'c', 'job_title': 'CTO', 'age': 20}),
+]) + u'\n'
+
+
+def _lines(output):
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+class StreamTests(TestCase):
+
+    def test_read_ndjson(self):
+        self.assertEqual([record['id'] for record
+                          in read_ndjson(io.StringIO(INPUT))],
+                         ['a', 'b', 'c'])
+        with self.assertRaisesRegex(ValueError, 'Invalid JSON on line 2'):
+            list(read_ndjson([u'{}', u'{"id": ']))
+
+    def test_read_ndjson_is_lazy(self):
+        def lines():
+            yield u'{"id": 1}'
+            raise AssertionError('read too far')
+        self.assertEqual(next(read_ndjson(lines())), {'id': 1})
+
+    def test_run_ndjson(self):
+        output = io.StringIO()
+        count = run_ndjson(RULES, io.StringIO(INPUT), output,
+                           ProfileVariables, ProfileActions)
+        self.assertEqual(count, 3)
+        self.assertEqual(_lines(output), [
+            {'key': 1, 'triggered': True, 'actions': [
+                {'name': 'send_email', 'params': {'campaign_id': 'cto'}},
+                {'name': 'add_points', 'params': {'points': 1.5}}]},
+            {'key': 2, 'triggered': False, 'actions': []},
+            {'key': 4, 'triggered': True, 'actions': [
+                {'name': 'send_email', 'params': {'campaign_id': 'cto'}}]}])
+
+    def test_options(self):
+        output = io.StringIO()
+        run_ndjson(RULES, io.StringIO(INPUT), output, ProfileVariables,
+                   ProfileActions, record_key=lambda record: record['id'],
+                   only_triggered=True, stop_on_first_trigger=True,
+                   cache_variables=True)
+        self.assertEqual(_lines(output), [
+            {'key': 'a', 'triggered': True, 'actions': [
+                {'name': 'send_email', 'params': {'campaign_id': 'cto'}}]},
+            {'key': 'c', 'triggered': True, 'actions': [
+                {'name': 'send_email', 'params': {'campaign_id': 'cto'}}]}])
+
+    def test_streams_one_record_at_a_time(self):
+        written = []
+
+        class Output(object):
+            def write(self, text):
+                written.append(text)
+
+            def flush(self):
+                pass
+
+        def lines():
+            for line in INPUT.splitlines():
+                # every result is written before the next line is read
+                self.assertEqual(len(written), 2 * lines.read)
+                lines.read += 1 if line else 0
+                yield line
+        lines.read = 0
+        run_ndjson(RULES, lines(), Output(), ProfileVariables, ProfileActions)
+        self.assertEqual(len(written), 6)
+
+    def test_invalid_rule(self):
+        rules = [{'conditions': RULES[0]['conditions'],
+                  'actions': [{'name': 'unknown'}]}]
+        with self.assertRaisesRegex(AssertionError,
+                                    'Action unknown is not defined'):
+            run_ndjson(rules, io.StringIO(INPUT), io.StringIO(),
+                       ProfileVariables, ProfileActions)
+
+
+class MainTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.rules = os.path.join(self.directory, 'rules.json')
+        with open(self.rules, 'w') as f:
+            json.dump(RULES, f)
+        self.arguments = ['--rules', self.rules,
+                          '--variables', 'tests.test_stream:ProfileVariables',
+                          '--actions', 'tests.test_stream:ProfileActions']
+
+    def test_stdin_to_stdout(self):
+        output = io.StringIO()
+        count = main(self.arguments + ['--key', 'id', '--only-triggered'],
+                     stdin=io.StringIO(INPUT), stdout=output)
+        self.assertEqual(count, 3)
+        self.assertEqual([line['key'] for line in _lines(output)], ['a', 'c'])
+
+    def test_files(self):
+        input_path = os.path.join(self.directory, 'in.ndjson')
+        output_path = os.path.join(self.directory, 'out.ndjson')
+        with io.open(input_path, 'w', encoding='utf-8') as f:
+            f.write(INPUT)
+        main(self.arguments + ['--input', input_path, '--output', output_path])
+        with io.open(output_path, encoding='utf-8') as f:
+            self.assertEqual([json.loads(line)['key'] for line in f],
+                             [1, 2, 4])
+
+    def test_invalid_class_path(self):
+        with self.assertRaisesRegex(AssertionError, 'package.module:name'):
+            main(['--rules', self.rules, '--variables', 'tests',
+                  '--actions', 'tests.test_stream:ProfileActions'])
@@ -41,6 +41,20 @@ class RuleVariableTests(TestCase):
         self.assertEqual(func.label, 'Foo Name')
         self.assertEqual(func.field_type, StringType)
         self.assertEqual(func.options, ['op1', 'op2'])
+        self.assertTrue(func.cache)
+
+    def test_rule_variable_cache_flag(self):
+        @rule_variable(StringType, cache=False)
+        def some_test_function(self): pass
+        self.assertFalse(some_test_function.cache)
+
+        @numeric_rule_variable(cache=False)
+        def some_numeric_function(self): pass
+        self.assertFalse(some_numeric_function.cache)
+
+        @select_multiple_rule_variable(cache=False)
+        def some_select_multiple_function(self): pass
+        self.assertFalse(some_select_multiple_function.cache)
 
     def test_rule_variable_works_as_decorator(self):
         @rule_variable(StringType, 'Blah')
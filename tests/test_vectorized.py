@@ -0,0 +1,196 @@
+from business_rules.engine import check_conditions_recursively
+from business_rules.fields import FIELD_TEXT
+from business_rules.operators import StringType, type_operator
+from business_rules.variables import (BaseVariables, boolean_rule_variable,
+                                      numeric_rule_variable, rule_variable,
+                                      select_rule_variable,
+                                      string_rule_variable)
+
+from unittest import TestCase, skipIf
+
+try:
+    import numpy as np
+    from business_rules.vectorized import compile_vectorized
+except ImportError:  # pragma: no cover
+    np = None
+
+
+class ProductVariables(BaseVariables):
+    """ Row at a time variables, to compare against.
+    """
+    def __init__(self, product):
+        self.product = product
+
+    @numeric_rule_variable
+    def price(self):
+        return self.product['price']
+
+    @string_rule_variable
+    def sku(self):
+        return self.product['sku']
+
+    @boolean_rule_variable
+    def on_sale(self):
+        return self.product['on_sale']
+
+    @select_rule_variable()
+    def tags(self):
+        return self.product['tags']
+
+
+class ProductColumns(ProductVariables):
+    """ The same variables, returning one column for all products.
+    """
+    def __init__(self, products):
+        self.products = products
+
+    def _column(self, name):
+        return [product[name] for product in self.products]
+
+    @numeric_rule_variable
+    def price(self):
+        return np.array(self._column('price'))
+
+    @string_rule_variable
+    def sku(self):
+        return np.array(self._column('sku'), dtype=object)
+
+    @boolean_rule_variable
+    def on_sale(self):
+        return np.array(self._column('on_sale'))
+
+
+PRODUCTS = [
+    {'price': 10, 'sku': 'AB-100', 'on_sale': True, 'tags': []},
+    {'price': 10.000001, 'sku': 'ab-200', 'on_sale': False, 'tags': []},
+    {'price': 10.000002, 'sku': None, 'on_sale': False, 'tags': []},
+    {'price': 99.5, 'sku': 'XY-100', 'on_sale': True, 'tags': []},
+    {'price': 0, 'sku': '', 'on_sale': False, 'tags': []},
+]
+
+CONDITIONS = [
+    {'name': 'price', 'operator': operator, 'value': value}
+    for operator in ['equal_to', 'greater_than', 'greater_than_or_equal_to',
+                     'less_than', 'less_than_or_equal_to']
+    for value in [10, 10.000001, 99.5, 0]
+] + [
+    {'name': 'sku', 'operator': operator, 'value': value}
+    for operator in ['equal_to', 'equal_to_case_insensitive', 'starts_with',
+                     'ends_with', 'contains']
+    for value in ['AB-100', 'ab', '100', '']
+] + [
+    {'name': 'sku', 'operator': 'matches_regex', 'value': r'^[A-Z]{2}-\d'},
+    {'name': 'sku', 'operator': 'non_empty', 'value': ''},
+    {'name': 'on_sale', 'operator': 'is_true', 'value': ''},
+    {'name': 'on_sale', 'operator': 'is_false', 'value': ''},
+]
+
+
+@skipIf(np is None, "numpy is not installed")
+class VectorizedTests(TestCase):
+
+    def assert_matches_engine(self, conditions_list):
+        rules = [{'conditions': conditions, 'actions': []}
+                 for conditions in conditions_list]
+        masks = compile_vectorized(rules, ProductColumns).evaluate(
+            ProductColumns(PRODUCTS))
+        self.assertEqual(masks.shape, (len(rules), len(PRODUCTS)))
+        for conditions, mask in zip(conditions_list, masks):
+            expected = [bool(check_conditions_recursively(
+                            conditions, ProductVariables(product)))
+                        for product in PRODUCTS]
+            self.assertEqual(mask.tolist(), expected, conditions)
+
+    def test_operators_match_engine(self):
+        self.assert_matches_engine(CONDITIONS)
+
+    def test_all_and_any_match_engine(self):
+        self.assert_matches_engine([
+            {'all': [CONDITIONS[0], CONDITIONS[-2]]},
+            {'all': [CONDITIONS[-1], CONDITIONS[-2]]},
+            {'any': [CONDITIONS[0], CONDITIONS[-2]]},
+            {'any': [CONDITIONS[-1], CONDITIONS[-2]]},
+            {'any': [{'all': [CONDITIONS[1], CONDITIONS[-1]]},
+                     {'all': [CONDITIONS[3], CONDITIONS[-2]]}]},
+        ])
+
+    def test_each_variable_is_fetched_once(self):
+        calls = []
+
+        class CountingColumns(ProductColumns):
+            @numeric_rule_variable
+            def price(self):
+                calls.append('price')
+                return np.array(self._column('price'))
+
+        rules = [{'conditions': condition, 'actions': []}
+                 for condition in CONDITIONS]
+        compile_vectorized(rules, CountingColumns).evaluate(
+            CountingColumns(PRODUCTS))
+        self.assertEqual(calls, ['price'])
+
+    def test_unknown_operator(self):
+        rules = [{'conditions': {'name': 'price', 'operator': 'contains',
+                                 'value': 1},
+                  'actions': []}]
+        err_string = 'Operator contains does not exist for type NumericType'
+        with self.assertRaisesRegex(AssertionError, err_string):
+            compile_vectorized(rules, ProductColumns)
+
+    def test_operator_that_cant_be_vectorized(self):
+        rules = [{'conditions': {'name': 'tags', 'operator': 'contains',
+                                 'value': 'a'},
+                  'actions': []}]
+        err_string = ("Operator contains for type SelectType can't be "
+                      "vectorized")
+        with self.assertRaisesRegex(AssertionError, err_string):
+            compile_vectorized(rules, ProductColumns)
+
+    def test_overridden_operators_cant_be_vectorized(self):
+        class LooseStringType(StringType):
+            @type_operator(FIELD_TEXT)
+            def equal_to(self, other_string):
+                return self.value.lower() == other_string.lower()
+
+        class LooseColumns(ProductColumns):
+            @rule_variable(LooseStringType)
+            def sku(self):
+                return np.array(self._column('sku'), dtype=object)
+
+        rules = [{'conditions': {'name': 'sku', 'operator': 'equal_to',
+                                 'value': 'ab-100'},
+                  'actions': []}]
+        err_string = ("Operator equal_to for type LooseStringType can't be "
+                      "vectorized")
+        with self.assertRaisesRegex(AssertionError, err_string):
+            compile_vectorized(rules, LooseColumns)
+
+        # operators it doesn't override still are
+        rules[0]['conditions'] = {'name': 'sku', 'operator': 'starts_with',
+                                  'value': 'ab'}
+        masks = compile_vectorized(rules, LooseColumns).evaluate(
+            LooseColumns(PRODUCTS))
+        self.assertEqual(masks.tolist(),
+                         [[False, True, False, False, False]])
+
+    def test_empty_batch(self):
+        rules = [{'conditions': condition, 'actions': []}
+                 for condition in CONDITIONS]
+        masks = compile_vectorized(rules, ProductColumns).evaluate(
+            ProductColumns([]))
+        self.assertEqual(masks.shape, (len(rules), 0))
+
+        class ListColumns(ProductColumns):
+            @string_rule_variable
+            def sku(self):
+                return self._column('sku')
+
+        masks = compile_vectorized(rules, ListColumns).evaluate(
+            ListColumns([]))
+        self.assertEqual(masks.shape, (len(rules), 0))
+
+    def test_invalid_conditions(self):
+        for conditions in [{'all': []}, {'any': []}, {'all': [], 'any': []}]:
+            with self.assertRaises(AssertionError):
+                compile_vectorized([{'conditions': conditions, 'actions': []}],
+                                   ProductColumns)